@@ -24,30 +24,41 @@
 
 
 import numpy
+from scipy import sparse
 
 class AuthorRank:
 	matriz = None
 	vectorRank = None
+	iteracoes = None # numero de iteracoes realizadas
+	convergiu = None # a tolerancia foi atingida antes do numero maximo de iteracoes?
 
-	def __init__(self, matriz, iteracoes):
-		self.matriz = matriz
-		self.vectorRank = numpy.ones(matriz.shape[0], dtype=numpy.float32)
+	def __init__(self, matriz, iteracoes, tolerancia=1e-7):
+		# iteracoes: numero maximo de iteracoes
+		# tolerancia: o processo termina quando a maior diferenca entre dois vetores consecutivos for menor
+		self.matriz = sparse.csr_matrix(matriz)
+		self.matrizTransposta = self.matriz.transpose().tocsr()
+		self.vectorRank = numpy.ones(self.matriz.shape[0], dtype=numpy.float64)
+		self.iteracoes = 0
+		self.convergiu = False
 
 		print "[CALCULANDO AUTHOR-RANK (PROCESSO ITERATIVO)]"
 		for index in range(0,iteracoes):
-			self.vectorRank = self.calcularRanks(self.vectorRank)
-			print str(index) + " ",
+			vectorRankNovo = self.calcularRanks(self.vectorRank)
+			self.iteracoes += 1
+			diferenca = numpy.abs(vectorRankNovo - self.vectorRank).max() if len(vectorRankNovo)>0 else 0
+			self.vectorRank = vectorRankNovo
+			if diferenca<tolerancia:
+				self.convergiu = True
+				break
+		if self.convergiu:
+			print "- Convergencia em " + str(self.iteracoes) + " iteracoes"
+		else:
+			print "[AVISO] sem convergencia apos " + str(self.iteracoes) + " iteracoes"
+		self.vectorRank = self.vectorRank.astype(numpy.float32)
 
 
 	def calcularRanks(self, vectorRank):
-		vectorRankNovo = numpy.zeros( len(vectorRank), dtype=numpy.float32)
 		d = 0.85 # dumping factor (fator de amortecimento)
 
-		for i in range(0, len(vectorRank)):
-			soma = 0
-			for j in range(0, len(vectorRank)):
-				soma += vectorRank[j] * self.matriz[j , i]
-			vectorRankNovo[i] = (1-d) + d*soma
-
-		return vectorRankNovo
-
+		# vectorRankNovo[i] = (1-d) + d * soma_j( vectorRank[j] * matriz[j,i] )
+		return (1-d) + d*self.matrizTransposta.dot(vectorRank)
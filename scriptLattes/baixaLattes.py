@@ -22,6 +22,7 @@
 #
 
 import sys, time, random, re, os
+import threading
 
 try:
 	import mechanize
@@ -46,6 +47,23 @@ HEADERS =  [('Accept-Language', 'en-us,en;q=0.5'),
 ]
 
 
+# intervalo global entre requisicoes ao servidor do Lattes (compartilhado por todas as threads de download)
+__lock_intervalo = threading.Lock()
+__proxima_requisicao = [0.0]
+
+
+def __aguardar_intervalo():
+	# 0.5 a 1.5 segs entre o inicio de duas requisicoes, nao altere esse tempo para não ser barrado do servidor do lattes
+	__lock_intervalo.acquire()
+	try:
+		espera = __proxima_requisicao[0] - time.time()
+		if espera > 0:
+			time.sleep(espera)
+		__proxima_requisicao[0] = time.time() + random.random() + 0.5
+	finally:
+		__lock_intervalo.release()
+
+
 def __self_update():
 	import inspect
 	try:
@@ -104,8 +122,8 @@ def baixaCVLattes(id_lattes, debug=True):
 	tries = 5
 	while tries > 0:
 		try:
+			__aguardar_intervalo()
 			data = __get_data(id_lattes)
-			time.sleep(random.random()+0.5) #0.5 a 1.5 segs de espera, nao altere esse tempo para não ser barrado do servidor do lattes
 			if 'infpessoa' not in data:
 				tries -= 1
 			else:
@@ -25,13 +25,170 @@
 
 import urllib2    
 import re
+import os
+import time
+import threading
+import Queue
+import cPickle
+import unicodedata
+
+INTERVALO_ENTRE_CONSULTAS = 0.2 # segs entre o inicio de duas consultas ao Google (compartilhado por todas as threads)
+ARQUIVO_DE_CENTROIDES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'centroidesDeMunicipios.txt')
+
+
+def normalizarNome(nome):
+	if isinstance(nome, str):
+		nome = nome.decode('utf8', 'ignore')
+	return unicodedata.normalize('NFKD', nome).encode('ascii', 'ignore').lower().strip()
+
+
+def carregarCentroides(arquivo=ARQUIVO_DE_CENTROIDES):
+	# (uf, municipio) -> (lat, lon)
+	centroides = {}
+	for linha in open(arquivo):
+		campos = linha.rstrip('\n').split('\t')
+		if len(campos)==4 and not linha.startswith('#'):
+			centroides[(campos[0], campos[1])] = (campos[2], campos[3])
+	return centroides
+
+
+class CacheDeGeolocalizacao:
+	# coordenadas já obtidas, indexadas pela chave (pais, UF, cidade, CEP) de Geolocalizador.obterChave;
+	# armazenadas entre execuções quando é indicado um arquivo (ver carregar)
+	def __init__(self):
+		self.coordenadas = {}       # chave normalizada -> (lat, lon)
+		self.centroides = None
+		self.arquivo = None
+		self.consultarOnline = True
+		self.consultas = 0
+		self.acertos = 0
+		self.lock = threading.Lock()
+		self.proximaConsulta = 0.0
+
+
+	def carregar(self, arquivo):
+		self.arquivo = arquivo
+		if os.path.exists(arquivo):
+			try:
+				f = open(arquivo, 'rb')
+				self.coordenadas.update(cPickle.load(f))
+				f.close()
+			except Exception, e:
+				print "[AVISO] Nao foi possivel ler o cache de geolocalizacao: "+str(e)
+
+
+	def salvar(self):
+		if self.arquivo is None:
+			return
+		temporario = self.arquivo+'.tmp'
+		f = open(temporario, 'wb')
+		cPickle.dump(self.coordenadas, f, cPickle.HIGHEST_PROTOCOL)
+		f.close()
+		os.rename(temporario, self.arquivo)
+
+
+	def aguardarIntervalo(self):
+		self.lock.acquire()
+		try:
+			agora = time.time()
+			inicio = max(agora, self.proximaConsulta)
+			self.proximaConsulta = inicio + INTERVALO_ENTRE_CONSULTAS
+		finally:
+			self.lock.release()
+		if inicio > agora:
+			time.sleep(inicio - agora)
+
+
+	def consultarGoogle(self, chave):
+		self.aguardarIntervalo()
+		query = "http://maps.googleapis.com/maps/api/geocode/xml?address="+chave.encode('utf8')+"&sensor=false"
+		try:
+			req = urllib2.Request(query)
+			res = urllib2.urlopen(req).read()
+		except Exception, e:
+			print "[AVISO] Nao foi possivel consultar a geolocalizacao de: "+chave.encode('utf8')+" ("+str(e)+")"
+			return None
+		res = res.replace("\r","")
+		res = res.replace("\n","")
+		res = re.findall(r'<location>(.+?)</location>', res)
+
+		if len(res)>0:
+			lat = re.findall(r'<lat>(.*)</lat>', res[0])
+			lon = re.findall(r'<lng>(.*)</lng>', res[0])
+			return (lat[0], lon[0])
+		return None
+
+
+	def obterCentroide(self, uf, cidade):
+		if self.centroides is None:
+			self.centroides = carregarCentroides()
+		return self.centroides.get((uf, normalizarNome(cidade)))
+
+
+	def obter(self, chave):
+		self.consultas += 1
+		chaveNormalizada = chave.lower()
+		coordenadas = self.coordenadas.get(chaveNormalizada)
+		if coordenadas is not None:
+			self.acertos += 1
+			return coordenadas
+		if self.consultarOnline:
+			coordenadas = self.consultarGoogle(chave)
+			if coordenadas is not None:
+				self.coordenadas[chaveNormalizada] = coordenadas
+				return coordenadas
+		return None
+
+
+	def resolverEmLote(self, enderecos, numeroDeThreads):
+		# as chaves que não estão no cache são consultadas em paralelo (respeitando INTERVALO_ENTRE_CONSULTAS)
+		if not self.consultarOnline:
+			return
+		fila = Queue.Queue()
+		chaves = set([])
+		for endereco in enderecos:
+			geo = Geolocalizador(endereco, resolver=False)
+			chaveNormalizada = geo.chave.lower()
+			if not chaveNormalizada in self.coordenadas and not chaveNormalizada in chaves:
+				chaves.add(chaveNormalizada)
+				fila.put(geo.chave)
+		if fila.qsize()==0:
+			return
+		print "- Consultando a geolocalizacao de "+str(fila.qsize())+" enderecos"
+
+		def trabalhador():
+			while True:
+				try:
+					chave = fila.get_nowait()
+				except Queue.Empty:
+					return
+				coordenadas = self.consultarGoogle(chave)
+				if coordenadas is not None:
+					self.coordenadas[chave.lower()] = coordenadas
+
+		threads = [threading.Thread(target=trabalhador) for i in range(0, min(numeroDeThreads, fila.qsize()))]
+		for t in threads:
+			t.daemon = True
+			t.start()
+		for t in threads:
+			t.join()
+
+
+	def imprimirEstatisticas(self):
+		print "- Geolocalizacao: "+str(self.acertos)+" de "+str(self.consultas)+" enderecos encontrados no cache"
+
+cacheDeGeolocalizacao = CacheDeGeolocalizacao()
+
 
 class Geolocalizador:
 	endereco = None
+	chave = ''
+	uf = ''
+	cidade = ''
 	lat = "0"
 	lon = "0"
 
-	def __init__(self, endereco):
+	def __init__(self, endereco, resolver=True):
 		self.endereco = endereco
 
 		aux = re.findall(r'(.*) URL.*', self.endereco)
@@ -40,10 +197,23 @@ class Geolocalizador:
 		aux = re.findall(r'(.*) Telefone.*', self.endereco)
 		if len(aux)>0:
 			self.endereco = aux[0]
-		self.obterCoordenadas()
+		self.obterChave()
+		if resolver:
+			self.obterCoordenadas()
 
 
 	def obterCoordenadas(self):
+		coordenadas = cacheDeGeolocalizacao.obter(self.chave)
+		if coordenadas is None and not self.uf=='':
+			# sem consulta online: centro do municipio (se constar da tabela) ou da capital do estado
+			coordenadas = cacheDeGeolocalizacao.obterCentroide(self.uf, self.cidade)
+			if coordenadas is None:
+				coordenadas = cacheDeGeolocalizacao.obterCentroide(self.uf, self.obterNomeCapital(self.uf))
+		if coordenadas is not None:
+			(self.lat, self.lon) = coordenadas
+
+
+	def obterChave(self):
 		#print "\n[ENDEREÇO] " + self.endereco.encode('utf8')
 
 		cidade = ''
@@ -62,6 +232,8 @@ class Geolocalizador:
 		
 			if cep=='':
 				cep = self.obterNomeCapital(uf)
+			self.uf = uf.lower().strip()
+			self.cidade = cidade
 			if not uf=='':
 				#uf = 'brazil ' +self.obterNomeUF(uf)
 				uf = self.obterNomeUF(uf)
@@ -80,21 +252,7 @@ class Geolocalizador:
 
 		cep   = self.corrigirCEP(cep)
 		chave = pais+" "+uf+" "+ cidade+" "+ cep
-		chave = re.sub('\s+','+', chave)
-		query = "http://maps.googleapis.com/maps/api/geocode/xml?address="+chave.encode('utf8')+"&sensor=false"
-
-		req = urllib2.Request(query)
-		res = urllib2.urlopen(req).read()
-		res = res.replace("\r","")
-		res = res.replace("\n","")
-		res = re.findall(r'<location>(.+?)</location>', res)
-
-		if len(res)>0:
-			lat = re.findall(r'<lat>(.*)</lat>', res[0])
-			lon = re.findall(r'<lng>(.*)</lng>', res[0])
-			self.lat = lat[0]
-			self.lon = lon[0]
-			#print "  .Verif. = http://www.gorissen.info/Pierre/maps/googleMapLocation.php?lat="+self.lat+"&lon="+self.lon+"&setLatLon=Set"
+		self.chave = re.sub('\s+','+', chave)
 
 
 	def obterNomeUF(self, uf):
@@ -196,7 +354,7 @@ class Geolocalizador:
 		if uf=='pr':
 			nome = 'curitiba'
 		if uf=='pe':
-			nome = 'recibe'
+			nome = 'recife'
 		if uf=='pi':
 			nome = 'teresina'
 		if uf=='rj':
@@ -23,10 +23,87 @@
 #
 
 
+import os
+import shutil
+import tempfile
+import subprocess
 import pygraphviz
+from scipy import sparse
 #import Image
 from PIL import Image
 
+# ---------------------------------------------------------------------------- #
+# Cada grafo é desenhado por uma única execução do Graphviz: o layout é feito
+# uma vez e dele saem o DOT (com as posições), o PNG e o mapa de imagem (CMAPX).
+# Os três grafos são desenhados ao mesmo tempo (um processo do Graphviz para
+# cada grafo). No modo automático o programa de layout depende do número de
+# nós: 'dot' para grupos pequenos, 'neato' e 'sfdp' (mais rápidos) para os maiores.
+# Qualquer outro valor é usado como o nome do programa do Graphviz.
+# ---------------------------------------------------------------------------- #
+
+MAXIMO_DE_NOS_PARA_DOT = 150
+MAXIMO_DE_NOS_PARA_NEATO = 1000
+
+
+def escolherProgramaDeLayout(numeroDeNos, programa='automatico'):
+	# obterParametro devolve 1 ou 0 para 'sim' ou 'nao': esses valores também selecionam o modo automático
+	if isinstance(programa, basestring) and not programa.strip() in ['automatico', '']:
+		return programa.strip()
+	if numeroDeNos<=MAXIMO_DE_NOS_PARA_DOT:
+		return 'dot'
+	if numeroDeNos<=MAXIMO_DE_NOS_PARA_NEATO:
+		return 'neato'
+	return 'sfdp'
+
+
+def desenharGrafos(tarefas):
+	# tarefas: [(grafo, programa, caminho sem extensão)]; devolve o CMAPX de cada grafo (na mesma ordem)
+	diretorioTemporario = tempfile.mkdtemp()
+	try:
+		processos = []
+		for indice, (grafo, programa, caminho) in enumerate(tarefas):
+			entrada = os.path.join(diretorioTemporario, str(indice)+'.gv')
+			cmapx = os.path.join(diretorioTemporario, str(indice)+'.cmapx')
+			arquivo = open(entrada, 'w')
+			arquivo.write(grafo.string())
+			arquivo.close()
+			comando = [programa, '-Tdot', '-o'+caminho+'.dot', '-Tpng', '-o'+caminho+'.png', '-Tcmapx', '-o'+cmapx, entrada]
+			try:
+				processo = subprocess.Popen(comando, stderr=subprocess.PIPE)
+			except OSError, e:
+				print "[AVISO] Programa do Graphviz nao encontrado: "+programa+" ("+str(e)+")"
+				processo = None
+			processos.append((processo, programa, caminho, cmapx))
+
+		mapas = []
+		for (processo, programa, caminho, cmapx) in processos:
+			if processo is None:
+				mapas.append('')
+				continue
+			erros = processo.communicate()[1]
+			if processo.returncode==0 and os.path.exists(cmapx):
+				arquivo = open(cmapx)
+				mapas.append(arquivo.read())
+				arquivo.close()
+			else:
+				print "[AVISO] Nao foi possivel desenhar o grafo "+caminho+" ("+programa+"): "+erros.strip()
+				mapas.append('')
+		return mapas
+	finally:
+		shutil.rmtree(diretorioTemporario, True)
+
+
+def elementosNaoNulos(matriz):
+	# (i, j, valor) dos elementos armazenados na matriz esparsa, na ordem das linhas e das
+	# colunas (a mesma da varredura de todos os pares i, j); o custo depende apenas do número de arestas
+	matriz = sparse.csr_matrix(matriz, copy=True)
+	matriz.sum_duplicates()
+	matriz.sort_indices()
+	for i in xrange(matriz.shape[0]):
+		for k in xrange(matriz.indptr[i], matriz.indptr[i+1]):
+			yield (i, int(matriz.indices[k]), matriz.data[k])
+
+
 class GrafoDeColaboracoes:
 	grupo = None
 	cores = None
@@ -55,19 +132,17 @@ class GrafoDeColaboracoes:
 			membro.rotuloCorBG = corDoNoBG
 		
 		self.grafoDeCoAutoriaSemPesos = self.criarGrafoDeCoAutoriaSemPesos()
-		self.grafoDeCoAutoriaSemPesos.draw(path=diretorioDeSaida+'/grafoDeColaboracoesSemPesos.png', format='png')
-		self.grafoDeCoAutoriaSemPesos.draw(path=diretorioDeSaida+'/grafoDeColaboracoesSemPesos.dot', format='dot')
-		self.grafoDeCoAutoriaSemPesosCMAPX = self.grafoDeCoAutoriaSemPesos.draw(format='cmapx')
-
 		self.grafoDeCoAutoriaComPesos = self.criarGrafoDeCoAutoriaComPesos()
-		self.grafoDeCoAutoriaComPesos.draw(path=diretorioDeSaida+'/grafoDeColaboracoesComPesos.png', format='png')
-		self.grafoDeCoAutoriaComPesos.draw(path=diretorioDeSaida+'/grafoDeColaboracoesComPesos.dot', format='dot')
-		self.grafoDeCoAutoriaComPesosCMAPX = self.grafoDeCoAutoriaComPesos.draw(format='cmapx')
-
 		self.grafoDeCoAutoriaNormalizado = self.criarGrafoDeCoAutoriaNormalizada()
-		self.grafoDeCoAutoriaNormalizado.draw(path=diretorioDeSaida+'/grafoDeColaboracoesNormalizado.png', format='png')
-		self.grafoDeCoAutoriaNormalizado.draw(path=diretorioDeSaida+'/grafoDeColaboracoesNormalizado.dot', format='dot')
-		self.grafoDeCoAutoriaNormalizadoCMAPX = self.grafoDeCoAutoriaNormalizado.draw(format='cmapx')
+
+		programa = escolherProgramaDeLayout(len(self.grafoDeCoAutoriaSemPesos), self.grupo.obterParametro('grafo-programa_de_layout'))
+		print "\n[DESENHANDO GRAFOS DE COLABORACOES: "+programa+", "+str(len(self.grafoDeCoAutoriaSemPesos))+" NOS]"
+		[self.grafoDeCoAutoriaSemPesosCMAPX,
+		 self.grafoDeCoAutoriaComPesosCMAPX,
+		 self.grafoDeCoAutoriaNormalizadoCMAPX] = desenharGrafos([
+			(self.grafoDeCoAutoriaSemPesos, programa, diretorioDeSaida+'/grafoDeColaboracoesSemPesos'),
+			(self.grafoDeCoAutoriaComPesos, programa, diretorioDeSaida+'/grafoDeColaboracoesComPesos'),
+			(self.grafoDeCoAutoriaNormalizado, programa, diretorioDeSaida+'/grafoDeColaboracoesNormalizado')])
 
 #		self.grafoDeCoAutoriaCompleta = self.criarGrafoDeCoAutoriaCompleta()
 #		self.grafoDeCoAutoriaCompleta.draw(path='grafoDeColaboracoesCompleto.png', format='png')
@@ -75,9 +150,10 @@ class GrafoDeColaboracoes:
 #		self.grafoDeCoAutoriaCompletaCMAPX = self.grafoDeCoAutoriaCompleta.draw(format='cmapx')
 
 		# Criamos um thumbnail do grafo sem pesos
-		im = Image.open(diretorioDeSaida+'/grafoDeColaboracoesSemPesos.png')
-		im.thumbnail((400,400))
-		im.save(diretorioDeSaida+'/grafoDeColaboracoesSemPesos-t.png')
+		if os.path.exists(diretorioDeSaida+'/grafoDeColaboracoesSemPesos.png'):
+			im = Image.open(diretorioDeSaida+'/grafoDeColaboracoesSemPesos.png')
+			im.thumbnail((400,400))
+			im.save(diretorioDeSaida+'/grafoDeColaboracoesSemPesos-t.png')
 
 
 	def criarGrafoDeCoAutoriaSemPesos(self):
@@ -98,13 +174,12 @@ class GrafoDeColaboracoes:
 				except:
 					grafo.add_node(membro.idMembro, label=nome.encode('utf8'), fontcolor=membro.rotuloCorFG, color=membro.rotuloCorBG, height="0.2", URL=membro.url)
 
-		# Inserimos as arestas
-		for i in range(0, self.grupo.numeroDeMembros()-1):
-			for j in range(i, self.grupo.numeroDeMembros()):
-				if self.grupo.matrizDeAdjacencia[i,j]>0:
-					grafo.add_edge(i, j)
+		# Inserimos as arestas (triangular superior, exceto o último elemento da diagonal)
+		ultimo = self.grupo.numeroDeMembros()-1
+		for (i, j, valor) in elementosNaoNulos(self.grupo.matrizDeAdjacencia):
+			if i<=j and i<ultimo and valor>0:
+				grafo.add_edge(i, j)
 
-		grafo.layout('dot')    # circo dot neato
 		return grafo
 
 
@@ -126,13 +201,12 @@ class GrafoDeColaboracoes:
 				except:
 					grafo.add_node(membro.idMembro, label=nome.encode('utf8'), fontcolor=membro.rotuloCorFG, color=membro.rotuloCorBG, height="0.2", URL=membro.url)
 
-		# Inserimos as arestas
-		for i in range(0, self.grupo.numeroDeMembros()-1):
-			for j in range(i, self.grupo.numeroDeMembros()):
-				if self.grupo.matrizDeAdjacencia[i,j]>0:
-					grafo.add_edge(i, j, label=str(self.grupo.matrizDeAdjacencia[i,j]), fontsize='8')
+		# Inserimos as arestas (triangular superior, exceto o último elemento da diagonal)
+		ultimo = self.grupo.numeroDeMembros()-1
+		for (i, j, valor) in elementosNaoNulos(self.grupo.matrizDeAdjacencia):
+			if i<=j and i<ultimo and valor>0:
+				grafo.add_edge(i, j, label=str(valor), fontsize='8')
 
-		grafo.layout('dot')    # circo dot neato
 		return grafo
 
 
@@ -155,17 +229,15 @@ class GrafoDeColaboracoes:
 					grafo.add_node(membro.idMembro, label=nome.encode('utf8'), fontcolor=membro.rotuloCorFG, color=membro.rotuloCorBG, height="0.2", URL=membro.url)
 
 		# Inserimos as arestas
-		for i in range(0, self.grupo.numeroDeMembros()):
-			for j in range(0, self.grupo.numeroDeMembros()):
-				valor = round(self.grupo.matrizDeFrequenciaNormalizada[i,j],2)
-				if valor>0:
-					if self.grupo.obterParametro('grafo-mostrar_aresta_proporcional_ao_numero_de_colaboracoes'):
-						grossura = str(0.5+3*valor)
-					else:
-						grossura = '1'
-					grafo.add_edge(i, j, label=str(valor), fontsize='8', penwidth=grossura, arrowhead='normal', arrowsize='0.75')
-
-		grafo.layout('dot') # dot
+		for (i, j, valor) in elementosNaoNulos(self.grupo.matrizDeFrequenciaNormalizada):
+			valor = round(valor,2)
+			if valor>0:
+				if self.grupo.obterParametro('grafo-mostrar_aresta_proporcional_ao_numero_de_colaboracoes'):
+					grossura = str(0.5+3*valor)
+				else:
+					grossura = '1'
+				grafo.add_edge(i, j, label=str(valor), fontsize='8', penwidth=grossura, arrowhead='normal', arrowsize='0.75')
+
 		return grafo
 
 
@@ -178,6 +250,8 @@ class GrafoDeColaboracoes:
 		grafo.node_attr['fontsize']='8'
 		grafo.node_attr['style']='filled'
 
+		membrosPorIdLattes = dict((membro.idLattes, membro) for membro in self.grupo.listaDeMembros)
+
 		# Inserimos os nos
 		for m in range(0,self.grupo.numeroDeMembros()):
 			membro = self.grupo.listaDeMembros[m]
@@ -197,20 +271,15 @@ class GrafoDeColaboracoes:
 				grafo.add_node(membro.idMembro, label=nome, fontcolor=corDoNoFG, color=corDoNoBG, height="0.2", URL=membro.url, root='True')
 
 				for idColaborador in membro.listaIDLattesColaboradoresUnica:
-					inserir = 1
-					for mtmp in self.grupo.listaDeMembros:
-						if idColaborador==mtmp.idLattes:
-							inserir = 0
-
-					if inserir:
+					if not idColaborador in membrosPorIdLattes:
 						grafo.add_node(idColaborador, fontcolor='white', color='black', height="0.2", shape="point")
 						grafo.add_edge(idColaborador, membro.idMembro)
 
-		# Inserimos as arestas
-		for i in range(0, self.grupo.numeroDeMembros()-1):
-			for j in range(i, self.grupo.numeroDeMembros()):
-				if self.grupo.matrizDeFrequenciaNormalizada[i,j]>0:
-					grafo.add_edge(i, j)
+		# Inserimos as arestas (triangular superior, exceto o último elemento da diagonal)
+		ultimo = self.grupo.numeroDeMembros()-1
+		for (i, j, valor) in elementosNaoNulos(self.grupo.matrizDeFrequenciaNormalizada):
+			if i<=j and i<ultimo and valor>0:
+				grafo.add_edge(i, j)
 
 		#grafo.layout('twopi')
 		grafo.layout('circo')
@@ -32,7 +32,14 @@ class MapaDeGeolocalizacao:
 		self.grupo = grupo
 
 		print "\n[CRIANDO MAPA DE GEOLOCALIZAÇÃO] (Esta operação pode demorar)"
+		# as coordenadas ficam armazenadas no cache de CVs (se houver) e são reaproveitadas entre execuções
+		if not self.grupo.diretorioCache=='':
+			cacheDeGeolocalizacao.carregar(os.path.join(self.grupo.diretorioCache, 'geolocalizacao.pickle'))
+		cacheDeGeolocalizacao.consultarOnline = self.grupo.obterParametro('mapa-consultar_geolocalizacao_online')
+		self.numeroDeConsultas = int(self.grupo.obterParametro('global-numero_de_downloads_simultaneos') or 1)
 		self.gerarMapa()
+		cacheDeGeolocalizacao.imprimirEstatisticas()
+		cacheDeGeolocalizacao.salvar()
 
 
 	def gerarMapa(self):
@@ -77,8 +84,10 @@ class MapaDeGeolocalizacao:
  \n'
       
 		cvsProcessados = set([])
+		perfis = self.carregarPerfisDosAlunos()
 
 		if self.grupo.obterParametro('mapa-incluir_membros_do_grupo'):
+			cacheDeGeolocalizacao.resolverEmLote([membro.enderecoProfissional for membro in self.grupo.listaDeMembros], self.numeroDeConsultas)
 			for membro in self.grupo.listaDeMembros:
 				cvsProcessados.add(membro.idLattes)
 				membro.obterCoordenadasDeGeolocalizacao()
@@ -95,9 +104,8 @@ class MapaDeGeolocalizacao:
 				for aluno in self.grupo.compilador.listaCompletaOCSupervisaoDePosDoutorado[ano]:
 					idOrientando = aluno.idOrientando
 
-					if len(idOrientando)==16 and cvsProcessados.isdisjoint([idOrientando]):
-						membro = Membro('', idOrientando, '', '', '', '', '', self.grupo.diretorioCache)
-						membro.carregarDadosCVLattes()
+					if idOrientando in perfis and cvsProcessados.isdisjoint([idOrientando]):
+						membro = perfis[idOrientando]
 						membro.obterCoordenadasDeGeolocalizacao()
 						nomeCompleto = unicodedata.normalize('NFKD', membro.nomeCompleto).encode('ASCII', 'ignore')
 						if not membro.enderecoProfissionalLat=='0' and not membro.enderecoProfissionalLon=='0':
@@ -113,9 +121,8 @@ class MapaDeGeolocalizacao:
 				for aluno in self.grupo.compilador.listaCompletaOCTeseDeDoutorado[ano]:
 					idOrientando = aluno.idOrientando
 
-					if len(idOrientando)==16 and cvsProcessados.isdisjoint([idOrientando]):
-						membro = Membro('', idOrientando, '', '', '', '', '', self.grupo.diretorioCache)
-						membro.carregarDadosCVLattes()
+					if idOrientando in perfis and cvsProcessados.isdisjoint([idOrientando]):
+						membro = perfis[idOrientando]
 						membro.obterCoordenadasDeGeolocalizacao()
 						nomeCompleto = unicodedata.normalize('NFKD', membro.nomeCompleto).encode('ASCII', 'ignore')
 						if not membro.enderecoProfissionalLat=='0' and not membro.enderecoProfissionalLon=='0':
@@ -131,9 +138,8 @@ class MapaDeGeolocalizacao:
 				for aluno in self.grupo.compilador.listaCompletaOCDissertacaoDeMestrado[ano]:
 					idOrientando = aluno.idOrientando
 
-					if len(idOrientando)==16 and cvsProcessados.isdisjoint([idOrientando]):
-						membro = Membro('', idOrientando, '', '', '', '', '', self.grupo.diretorioCache)
-						membro.carregarDadosCVLattes()
+					if idOrientando in perfis and cvsProcessados.isdisjoint([idOrientando]):
+						membro = perfis[idOrientando]
 						membro.obterCoordenadasDeGeolocalizacao()
 						nomeCompleto = unicodedata.normalize('NFKD', membro.nomeCompleto).encode('ASCII', 'ignore')
 						if not membro.enderecoProfissionalLat=='0' and not membro.enderecoProfissionalLon=='0':
@@ -155,6 +161,26 @@ class MapaDeGeolocalizacao:
 		print "\n[MAPA DE GEOLOCALIZACAO CRIADO]"
 
 
+	def carregarPerfisDosAlunos(self):
+		# os perfis dos ex-alunos (CVs fora do grupo) são carregados de uma só vez e os seus
+		# endereços são geolocalizados em lote, antes da geração dos marcadores
+		listas = [('mapa-incluir_alunos_de_pos_doutorado', self.grupo.compilador.listaCompletaOCSupervisaoDePosDoutorado),
+		          ('mapa-incluir_alunos_de_doutorado', self.grupo.compilador.listaCompletaOCTeseDeDoutorado),
+		          ('mapa-incluir_alunos_de_mestrado', self.grupo.compilador.listaCompletaOCDissertacaoDeMestrado)]
+		membrosDoGrupo = set([membro.idLattes for membro in self.grupo.listaDeMembros]) if self.grupo.obterParametro('mapa-incluir_membros_do_grupo') else set([])
+		listaDeIds = []
+		for (parametro, listaCompleta) in listas:
+			if self.grupo.obterParametro(parametro):
+				for ano in listaCompleta.keys():
+					for aluno in listaCompleta[ano]:
+						if len(aluno.idOrientando)==16 and not aluno.idOrientando in membrosDoGrupo:
+							listaDeIds.append(aluno.idOrientando)
+
+		perfis = self.grupo.carregarPerfisCVLattes(listaDeIds)
+		cacheDeGeolocalizacao.resolverEmLote([perfis[idLattes].enderecoProfissional for idLattes in listaDeIds if idLattes in perfis], self.numeroDeConsultas)
+		return perfis
+
+
 	def obterNomesDosOrientadores(self, aluno, listaDeMembros):
 		lista = list(aluno.idMembro)
 		if len(lista)==1:
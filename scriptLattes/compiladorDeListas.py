@@ -26,7 +26,48 @@
 import operator
 import re
 from scipy import sparse
-#import numpy
+import numpy
+
+from membro import ATRIBUTOS_DO_CV
+from indiceDeSimilaridade import *
+
+# atributo comparado (com compararCadeias) por compararCom em cada tipo de item; o padrão é 'titulo'
+# None: compararCom não utiliza compararCadeias, os items são comparados sem índice
+ATRIBUTO_DE_COMPARACAO = {
+	'OrientacaoEmAndamento': 'nome',
+	'OrientacaoConcluida': 'nome',
+	'ProjetoDePesquisa': 'nome',
+	'ParticipacaoEmEvento': 'item',
+	'OrganizacaoDeEvento': 'nomeDoEvento',
+	'PremioOuTitulo': None,
+}
+
+# parametros do grafo e matrizes de colaboracao correspondentes (criadas em criarMatrizesDeColaboracao)
+MATRIZES_DE_COLABORACAO = [
+	('grafo-incluir_artigo_em_periodico', 'matrizesArtigoEmPeriodico'),
+	('grafo-incluir_livro_publicado', 'matrizesLivroPublicado'),
+	('grafo-incluir_capitulo_de_livro_publicado', 'matrizesCapituloDeLivroPublicado'),
+	('grafo-incluir_texto_em_jornal_de_noticia', 'matrizesTextoEmJornalDeNoticia'),
+	('grafo-incluir_trabalho_completo_em_congresso', 'matrizesTrabalhoCompletoEmCongresso'),
+	('grafo-incluir_resumo_expandido_em_congresso', 'matrizesResumoExpandidoEmCongresso'),
+	('grafo-incluir_resumo_em_congresso', 'matrizesResumoEmCongresso'),
+	('grafo-incluir_artigo_aceito_para_publicacao', 'matrizesArtigoAceito'),
+	('grafo-incluir_apresentacao_de_trabalho', 'matrizesApresentacaoDeTrabalho'),
+	('grafo-incluir_outro_tipo_de_producao_bibliografica', 'matrizesOutroTipoDeProducaoBibliografica'),
+
+	('grafo-incluir_software_com_patente', 'matrizesSoftwareComPatente'),
+	('grafo-incluir_software_sem_patente', 'matrizesSoftwareSemPatente'),
+	('grafo-incluir_produto_tecnologico', 'matrizesProdutoTecnologico'),
+	('grafo-incluir_processo_ou_tecnica', 'matrizesProcessoOuTecnica'),
+	('grafo-incluir_trabalho_tecnico', 'matrizesTrabalhoTecnico'),
+	('grafo-incluir_outro_tipo_de_producao_tecnica', 'matrizesOutroTipoDeProducaoTecnica'),
+
+	('grafo-incluir_patente', 'matrizesPatente'),
+	('grafo-incluir_programa_computador', 'matrizesProgramaComputador'),
+	('grafo-incluir_desenho_industrial', 'matrizesDesenhoIndustrial'),
+
+	('grafo-incluir_producao_artistica', 'matrizesProducaoArtistica'),
+]
 
 class CompiladorDeListas:
 	grupo = None
@@ -108,6 +149,14 @@ class CompiladorDeListas:
 		self.listaCompletaParticipacaoEmEvento = {}
 		self.listaCompletaOrganizacaoDeEvento = {}
 
+		# índices de similaridade usados por compilarLista (um por lista completa e por ano)
+		self.indicesDeSimilaridade = {}
+		self.frequenciaDeTrigramas = {}
+		for membro in grupo.listaDeMembros:
+			for atributo in ATRIBUTOS_DO_CV:
+				if atributo.startswith('lista') and not atributo=='listaIDLattesColaboradores':
+					contarTrigramas([self.chaveDeComparacao(item) for item in getattr(membro, atributo)], self.frequenciaDeTrigramas)
+
 
 		# compilamos as producoes de todos os membros (separados por tipos)
 		for membro in grupo.listaDeMembros:
@@ -296,14 +345,29 @@ class CompiladorDeListas:
 		return False
 
 
+	def chaveDeComparacao(self, pub):
+		atributo = ATRIBUTO_DE_COMPARACAO.get(pub.__class__.__name__, 'titulo')
+		return getattr(pub, atributo, None) if atributo is not None else None
+
 	def compilarLista(self, listaDoMembro, listaCompleta):
+		indices = self.indicesDeSimilaridade.setdefault(id(listaCompleta), {})
+
 		for pub in listaDoMembro: # adicionar 'pub'  em  'listaCompleta'
 			if pub == None or listaCompleta.get(pub.ano)==None:   # Se o ano nao existe no listaCompleta (lista total)
 				listaCompleta[pub.ano] = []        # criamos uma nova entrada vazia
 				listaCompleta[pub.ano].append(pub)
+				indices[pub.ano] = IndiceDeSimilaridade(self.frequenciaDeTrigramas)
+				indices[pub.ano].adicionar(self.chaveDeComparacao(pub))
 			else:
 				inserir = 1
-				for i in range(0, len(listaCompleta[pub.ano])):
+				indice = indices[pub.ano]
+				if ATRIBUTO_DE_COMPARACAO.get(pub.__class__.__name__, 'titulo') is None:
+					candidatos = range(0, len(listaCompleta[pub.ano]))
+				else:
+					# apenas os items que podem ser similares (segundo compararCadeias) são comparados
+					candidatos = indice.candidatos(self.chaveDeComparacao(pub))
+
+				for i in candidatos:
 					item = pub.compararCom( listaCompleta[pub.ano][i] ) # comparamos: pub com listaCompleta[pub.ano][i]
 					if not item==None: # sao similares
 						print "\n[AVISO] PRODUÇÕES SIMILARES",
@@ -313,10 +377,12 @@ class CompiladorDeListas:
 						# print "Membro " + str(listaCompleta[pub.ano][i].idMembro) + ": " + listaCompleta[pub.ano][i].titulo.encode('utf8')
 
 						listaCompleta[pub.ano][i] = item
+						indice.atualizar(i, self.chaveDeComparacao(item))
 						inserir = 0
 						break
 				if inserir: # se pub for difererente a todos os elementos do listaCompleta
 					listaCompleta[pub.ano].append(pub)
+					indice.adicionar(self.chaveDeComparacao(pub))
 		return listaCompleta
 
 	# Para projetos não é feita a busca de projetos similares (NÃO MAIS UTILIZADA)
@@ -385,11 +451,13 @@ class CompiladorDeListas:
 	# Criamos as matrizes de: 
 	#  - (1) adjacência
 	#  - (2) frequencia
+	# Os pares de co-autores são acumulados em listas (formato COO: linha, coluna, valor)
+	# e as matrizes são construídas uma única vez (valores repetidos são somados).
 	def criarMatrizes(self, listaCompleta):
-		# matriz1 = numpy.zeros((self.grupo.numeroDeMembros(), self.grupo.numeroDeMembros()), dtype=numpy.int32)
-		# matriz2 = numpy.zeros((self.grupo.numeroDeMembros(), self.grupo.numeroDeMembros()), dtype=numpy.float32)
-		matriz1 = sparse.lil_matrix((self.grupo.numeroDeMembros(), self.grupo.numeroDeMembros()))
-		matriz2 = sparse.lil_matrix((self.grupo.numeroDeMembros(), self.grupo.numeroDeMembros()))
+		N = self.grupo.numeroDeMembros()
+		linhas = []
+		colunas = []
+		frequencias = []
 
 		keys = listaCompleta.keys()
 		keys.sort(reverse=True)
@@ -403,12 +471,14 @@ class CompiladorDeListas:
 					# (2) incrementamos a 'frequencia' de colaboracao
 					combinacoes = self.calcularCombinacoes(pub.idMembro)
 					for c in combinacoes:
-						matriz1[c[0] , c[1]] += 1
-						matriz1[c[1] , c[0]] += 1
-
-						matriz2[c[0] , c[1]] += 1.0/(numeroDeCoAutores-1)
-						matriz2[c[1] , c[0]] += 1.0/(numeroDeCoAutores-1)
-
+						linhas.extend([c[0], c[1]])
+						colunas.extend([c[1], c[0]])
+					frequencias.extend([1.0/(numeroDeCoAutores-1)]*(2*len(combinacoes)))
+
+		linhas = numpy.array(linhas, dtype=numpy.int32)
+		colunas = numpy.array(colunas, dtype=numpy.int32)
+		matriz1 = sparse.coo_matrix((numpy.ones(len(linhas)), (linhas, colunas)), shape=(N, N)).tocsr()
+		matriz2 = sparse.coo_matrix((numpy.array(frequencias, dtype=numpy.float64), (linhas, colunas)), shape=(N, N)).tocsr()
 		return [matriz1, matriz2]
 
 
@@ -427,78 +497,29 @@ class CompiladorDeListas:
 
 
 	def uniaoDeMatrizesDeColaboracao(self):
-		##matriz1 = numpy.zeros((self.grupo.numeroDeMembros(), self.grupo.numeroDeMembros()), dtype=numpy.int32)
-		##matriz2 = numpy.zeros((self.grupo.numeroDeMembros(), self.grupo.numeroDeMembros()), dtype=numpy.float32)
-		matriz1 = sparse.lil_matrix((self.grupo.numeroDeMembros(), self.grupo.numeroDeMembros()))
-		matriz2 = sparse.lil_matrix((self.grupo.numeroDeMembros(), self.grupo.numeroDeMembros()))
-
-		if self.grupo.obterParametro('grafo-incluir_artigo_em_periodico'):
-			matriz1 += self.matrizesArtigoEmPeriodico[0]
-			matriz2 += self.matrizesArtigoEmPeriodico[1]
-		if self.grupo.obterParametro('grafo-incluir_livro_publicado'): 	
-			matriz1 += self.matrizesLivroPublicado[0]
-			matriz2 += self.matrizesLivroPublicado[1]
-		if self.grupo.obterParametro('grafo-incluir_capitulo_de_livro_publicado'):
-			matriz1 += self.matrizesCapituloDeLivroPublicado[0]
-			matriz2 += self.matrizesCapituloDeLivroPublicado[1]
-		if self.grupo.obterParametro('grafo-incluir_texto_em_jornal_de_noticia'):
-			matriz1 += self.matrizesTextoEmJornalDeNoticia[0]
-			matriz2 += self.matrizesTextoEmJornalDeNoticia[1]
-		if self.grupo.obterParametro('grafo-incluir_trabalho_completo_em_congresso'):
-			matriz1 += self.matrizesTrabalhoCompletoEmCongresso[0]
-			matriz2 += self.matrizesTrabalhoCompletoEmCongresso[1]
-		if self.grupo.obterParametro('grafo-incluir_resumo_expandido_em_congresso'): 
-			matriz1 += self.matrizesResumoExpandidoEmCongresso[0]
-			matriz2 += self.matrizesResumoExpandidoEmCongresso[1]
-		if self.grupo.obterParametro('grafo-incluir_resumo_em_congresso'): 
-			matriz1 += self.matrizesResumoEmCongresso[0]
-			matriz2 += self.matrizesResumoEmCongresso[1]
-		if self.grupo.obterParametro('grafo-incluir_artigo_aceito_para_publicacao'):
-			matriz1 += self.matrizesArtigoAceito[0]
-			matriz2 += self.matrizesArtigoAceito[1]
-		if self.grupo.obterParametro('grafo-incluir_apresentacao_de_trabalho'):
-			matriz1 += self.matrizesApresentacaoDeTrabalho[0]
-			matriz2 += self.matrizesApresentacaoDeTrabalho[1]
-		if self.grupo.obterParametro('grafo-incluir_outro_tipo_de_producao_bibliografica'): 
-			matriz1 += self.matrizesOutroTipoDeProducaoBibliografica[0]
-			matriz2 += self.matrizesOutroTipoDeProducaoBibliografica[1]
-
-		if self.grupo.obterParametro('grafo-incluir_software_com_patente'):
-			matriz1 += self.matrizesSoftwareComPatente[0]
-			matriz2 += self.matrizesSoftwareComPatente[1]
-		if self.grupo.obterParametro('grafo-incluir_software_sem_patente'):
-			matriz1 += self.matrizesSoftwareSemPatente[0]
-			matriz2 += self.matrizesSoftwareSemPatente[1]
-		if self.grupo.obterParametro('grafo-incluir_produto_tecnologico'): 
-			matriz1 += self.matrizesProdutoTecnologico[0]
-			matriz2 += self.matrizesProdutoTecnologico[1]
-		if self.grupo.obterParametro('grafo-incluir_processo_ou_tecnica'): 
-			matriz1 += self.matrizesProcessoOuTecnica[0]
-			matriz2 += self.matrizesProcessoOuTecnica[1]
-		if self.grupo.obterParametro('grafo-incluir_trabalho_tecnico'):
-			matriz1 += self.matrizesTrabalhoTecnico[0]
-			matriz2 += self.matrizesTrabalhoTecnico[1]
-		if self.grupo.obterParametro('grafo-incluir_outro_tipo_de_producao_tecnica'):
-			matriz1 += self.matrizesOutroTipoDeProducaoTecnica[0]
-			matriz2 += self.matrizesOutroTipoDeProducaoTecnica[1]
-
-		if self.grupo.obterParametro('grafo-incluir_patente'):
-			matriz1 += self.matrizesPatente[0]
-			matriz2 += self.matrizesPatente[1]
-
-		if self.grupo.obterParametro('grafo-incluir_programa_computador'):
-			matriz1 += self.matrizesProgramaComputador[0]
-			matriz2 += self.matrizesProgramaComputador[1]
-
-		if self.grupo.obterParametro('grafo-incluir_desenho_industrial'):
-			matriz1 += self.matrizesDesenhoIndustrial[0]
-			matriz2 += self.matrizesDesenhoIndustrial[1]
-			
-		if self.grupo.obterParametro('grafo-incluir_producao_artistica'):
-			matriz1 += self.matrizesProducaoArtistica[0]
-			matriz2 += self.matrizesProducaoArtistica[1]
-
-		return [matriz1, matriz2]
+		# somamos as matrizes dos tipos de produção incluídos no grafo
+		matrizes1 = []
+		matrizes2 = []
+		for (parametro, atributo) in MATRIZES_DE_COLABORACAO:
+			if self.grupo.obterParametro(parametro):
+				matrizes1.append(getattr(self, atributo)[0])
+				matrizes2.append(getattr(self, atributo)[1])
+
+		return [self.somarMatrizes(matrizes1), self.somarMatrizes(matrizes2)]
+
+
+	# soma de matrizes esparsas em uma única passada: os elementos não nulos de todas
+	# as matrizes são concatenados (formato COO) e a matriz resultante é construída uma vez
+	def somarMatrizes(self, matrizes):
+		N = self.grupo.numeroDeMembros()
+		if len(matrizes)==0:
+			return sparse.csr_matrix((N, N))
+
+		matrizes = [m.tocoo() for m in matrizes]
+		linhas = numpy.concatenate([m.row for m in matrizes])
+		colunas = numpy.concatenate([m.col for m in matrizes])
+		valores = numpy.concatenate([m.data for m in matrizes])
+		return sparse.coo_matrix((valores, (linhas, colunas)), shape=(N, N)).tocsr()
 
 
 
@@ -24,6 +24,7 @@
 
 
 import datetime
+import os
 import re
 import math
 import unicodedata
@@ -31,12 +32,17 @@ from charts.graficoDeInternacionalizacao import *
 from qualis import * # Qualis
 from highcharts import * # highcharts
 
+# data de processamento (paginaBottom): desconsiderada na comparação das páginas no modo incremental
+padraoDaDataDeProcessamento = re.compile('Data de processamento: [0-9/: ]*')
+
 class GeradorDePaginasWeb:
 	grupo = None
 	dir = None
 	version = None
 	extensaoPagina = None
 	arquivoRis = None
+	paginasAlteradas = 0
+	paginasSemAlteracao = 0
 
 	def __init__(self, grupo):
 		self.grupo = grupo
@@ -90,6 +96,9 @@ class GeradorDePaginasWeb:
 		if self.grupo.obterParametro('relatorio-salvar_publicacoes_em_formato_ris'): 
 			self.arquivoRis.close()
 
+		if self.grupo.obterParametro('global-modo_incremental'):
+			print "\n[MODO INCREMENTAL] Paginas reescritas: "+str(self.paginasAlteradas)+", sem alteracao: "+str(self.paginasSemAlteracao)
+
 
 	def gerarPaginaPrincipal(self):
 		nomeGrupo = self.grupo.obterParametro('global-nome_do_grupo').decode("utf8")
@@ -957,9 +966,22 @@ class GeradorDePaginasWeb:
 
 
 	def salvarPagina(self, nome, conteudo):
-		file = open(self.dir+"/"+nome, 'w')
-		file.write(conteudo.encode('utf8','replace'))
+		conteudo = conteudo.encode('utf8','replace')
+		arquivo = self.dir+"/"+nome
+
+		# no modo incremental as paginas sem alteracao nao sao reescritas
+		if self.grupo.obterParametro('global-modo_incremental') and os.path.exists(arquivo):
+			file = open(arquivo)
+			anterior = file.read()
+			file.close()
+			if padraoDaDataDeProcessamento.sub('', anterior)==padraoDaDataDeProcessamento.sub('', conteudo):
+				self.paginasSemAlteracao += 1
+				return
+
+		file = open(arquivo, 'w')
+		file.write(conteudo)
 		file.close()
+		self.paginasAlteradas += 1
 
 
 	def salvarPublicacaoEmFormatoRIS(self, pub):
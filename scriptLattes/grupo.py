@@ -27,6 +27,11 @@ import fileinput
 import sets
 import operator
 import os
+import threading
+import Queue
+import multiprocessing
+import numpy
+from scipy import sparse
 
 from membro import *
 from compiladorDeListas import *
@@ -151,7 +156,7 @@ class Grupo:
 				###### self.listaDeMembros.append(Membro(idSequencial, '', nome, periodo, rotulo, self.itemsDesdeOAno, self.itemsAteOAno, xml=identificador))
 				###	self.listaDeMembros.append(Membro(idSequencial, identificador, nome, periodo, rotulo, self.itemsDesdeOAno, self.itemsAteOAno, diretorioCache))
 				###else:
-				self.listaDeMembros.append(Membro(idSequencial, identificador, nome, periodo, rotulo, self.itemsDesdeOAno, self.itemsAteOAno, self.diretorioCache))
+				self.listaDeMembros.append(Membro(idSequencial, identificador, nome, periodo, rotulo, self.itemsDesdeOAno, self.itemsAteOAno, self.diretorioCache, self.obterParametro('global-processar_cvs_com_tidy')))
 
 				self.listaDeRotulos.append(rotulo)
 				idSequencial+=1
@@ -280,10 +285,9 @@ class Grupo:
 		matriz = self.matrizDeAdjacencia
 
 		string += "\nedgedef> node1 VARCHAR, node2 VARCHAR, weight DOUBLE"
-		for i in range(0,N):
-			for j in range(i+1,N):
-				if (i!=j) and (matriz[i,j]>0):
-					string +='\n'+str(i)+','+str(j)+','+str(matriz[i,j])
+		for (i, j, valor) in elementosNaoNulos(matriz):
+			if i<j and valor>0:
+				string +='\n'+str(i)+','+str(j)+','+str(valor)
 
 
 		# gerando o arquivo GDF
@@ -339,14 +343,140 @@ class Grupo:
 
 
 	def carregarDadosCVLattes(self):
+		modoIncremental = self.obterParametro('global-modo_incremental')
+		if modoIncremental and self.diretorioCache=='':
+			print "[AVISO] O modo incremental requer o parametro 'global-diretorio_de_armazenamento_de_cvs' (modo desconsiderado)"
+			modoIncremental = 0
+
+		numeroDeDownloads = int(self.obterParametro('global-numero_de_downloads_simultaneos') or 1)
+		if numeroDeDownloads>1 or modoIncremental:
+			# no modo incremental todos os CVs do cache são baixados novamente; os CVs que não
+			# mudaram são recuperados do cache de CVs processados (sem novo processamento), mas
+			# as listas e matrizes do grupo são compiladas novamente a partir de todos os membros
+			self.baixarCVsLattes(max(numeroDeDownloads, 1), atualizar=modoIncremental)
+
+		numeroDeProcessos = int(self.obterParametro('global-numero_de_processos') or 1)
+		dadosProcessados = {}
+		if numeroDeProcessos>1:
+			dadosProcessados = self.processarCVsLattesEmCache(numeroDeProcessos)
+
 		indice = 1
 		for membro in self.listaDeMembros:
 			print "\n[LENDO REGISTRO LATTES: " + str(indice) + "o. DA LISTA]"
 			indice += 1
-			membro.carregarDadosCVLattes()
+			if membro.idMembro in dadosProcessados:
+				membro.atribuirDadosDoCV(dadosProcessados.pop(membro.idMembro))
+			else:
+				membro.carregarDadosCVLattes()
 			membro.filtrarItemsPorPeriodo()
 			print membro
 
+	def baixarCVsLattes(self, numeroDeDownloads, atualizar=False, membros=None):
+		# os CVs são baixados em paralelo (respeitando o intervalo global entre requisições de baixaLattes);
+		# o processamento continua sequencial e na ordem do arquivo .list
+		if membros is None:
+			membros = self.listaDeMembros
+		print "\n[BAIXANDO CVs LATTES: "+str(numeroDeDownloads)+" DOWNLOADS SIMULTANEOS]"
+		fila = Queue.Queue()
+		for membro in membros:
+			fila.put(membro)
+
+		def trabalhador():
+			while True:
+				try:
+					membro = fila.get_nowait()
+				except Queue.Empty:
+					return
+				try:
+					membro.baixarCVLattes(atualizar)
+				except Exception, e:
+					# o CV será solicitado novamente (de forma sequencial) em membro.carregarDadosCVLattes
+					# (no modo incremental é utilizada a versão anterior do cache)
+					print "[AVISO] Nao foi possivel baixar o CV Lattes: "+membro.idLattes
+
+		threads = [threading.Thread(target=trabalhador) for i in range(0, min(numeroDeDownloads, len(membros)))]
+		for t in threads:
+			t.daemon = True
+			t.start()
+		for t in threads:
+			t.join()
+
+	def processarCVsLattesEmCache(self, numeroDeProcessos):
+		# os CVs (HTML) armazenados no cache são processados em paralelo; cada processo devolve
+		# o registro gerado por dadosDoCVLattes, que é atribuído ao membro na ordem do arquivo .list
+		tarefas = []
+		for membro in self.listaDeMembros:
+			cvPath = membro.diretorioCache+'/'+membro.idLattes
+			if not 'xml' in cvPath and not '0000000000000000'==membro.idLattes and os.path.exists(cvPath):
+				tarefas.append((membro.idMembro, cvPath, membro.diretorioCache, membro.usarTidy))
+
+		dadosProcessados = {}
+		if len(tarefas)<2:
+			return dadosProcessados
+
+		print "\n[PROCESSANDO "+str(len(tarefas))+" CVs LATTES DO CACHE: "+str(numeroDeProcessos)+" PROCESSOS]"
+		pool = multiprocessing.Pool(min(numeroDeProcessos, len(tarefas)))
+		try:
+			for (idMembro, dados) in pool.imap_unordered(processarCVLattesEmCache, tarefas):
+				dadosProcessados[idMembro] = dados
+			pool.close()
+		except Exception, e:
+			# em caso de erro os CVs restantes são processados sequencialmente
+			print "[AVISO] Erro no processamento paralelo dos CVs: "+str(e)
+			pool.terminate()
+		pool.join()
+		return dadosProcessados
+
+	def carregarPerfisCVLattes(self, listaDeIds):
+		# perfis (nome, endereço profissional e foto) de pessoas que não são membros do grupo (p.ex.
+		# ex-alunos no mapa de geolocalização). Os CVs ficam no mesmo cache dos membros; os downloads
+		# são simultâneos e os CVs do cache são processados em paralelo (como em carregarDadosCVLattes)
+		perfis = {}
+		membros = []
+		for idLattes in listaDeIds:
+			if not idLattes in perfis:
+				perfis[idLattes] = Membro('', idLattes, '', '', '', '', '', self.diretorioCache, self.obterParametro('global-processar_cvs_com_tidy'))
+				membros.append(perfis[idLattes])
+		if len(membros)==0:
+			return perfis
+
+		# sem diretorio de cache os CVs baixados ficam em memória (membro.cvLattesHTML)
+		numeroDeDownloads = int(self.obterParametro('global-numero_de_downloads_simultaneos') or 1)
+		if numeroDeDownloads>1:
+			self.baixarCVsLattes(numeroDeDownloads, membros=membros)
+
+		numeroDeProcessos = int(self.obterParametro('global-numero_de_processos') or 1)
+		perfisProcessados = {}
+		if numeroDeProcessos>1 and not self.diretorioCache=='':
+			tarefas = []
+			for membro in membros:
+				cvPath = self.diretorioCache+'/'+membro.idLattes
+				if os.path.exists(cvPath):
+					tarefas.append((membro.idLattes, cvPath, membro.usarTidy))
+			if len(tarefas)>1:
+				print "\n[PROCESSANDO "+str(len(tarefas))+" PERFIS DE CVs LATTES: "+str(numeroDeProcessos)+" PROCESSOS]"
+				pool = multiprocessing.Pool(min(numeroDeProcessos, len(tarefas)))
+				try:
+					for (idLattes, perfil) in pool.imap_unordered(carregarPerfilCVLattesEmCache, tarefas):
+						perfisProcessados[idLattes] = perfil
+					pool.close()
+				except Exception, e:
+					# os perfis restantes são processados sequencialmente
+					print "[AVISO] Erro no processamento paralelo dos perfis: "+str(e)
+					pool.terminate()
+				pool.join()
+
+		for membro in membros:
+			try:
+				if membro.idLattes in perfisProcessados:
+					membro.atribuirPerfilDoCV(perfisProcessados.pop(membro.idLattes))
+				else:
+					membro.carregarPerfilCVLattes()
+			except Exception, e:
+				print "[AVISO] Nao foi possivel carregar o CV Lattes: "+membro.idLattes
+				del perfis[membro.idLattes]
+		return perfis
+
 	def gerarMapaDeGeolocalizacao(self):
 		if self.obterParametro('mapa-mostrar_mapa_de_geolocalizacao'):
 			self.mapaDeGeolocalizacao = MapaDeGeolocalizacao(self)
@@ -358,17 +488,20 @@ class Grupo:
 
 	def compilarListasDeItems(self):
 		self.compilador = CompiladorDeListas(self) # compilamos todo e criamos 'listasCompletas'
+		print "\n[COMPARACAO DE CADEIAS] "+comparadorDeCadeias.estatisticas()
 
 		# Grafos de coautoria 
 		self.compilador.criarMatrizesDeColaboracao()
 
 		[self.matrizDeAdjacencia, self.matrizDeFrequencia] = self.compilador.uniaoDeMatrizesDeColaboracao()
 		self.vetorDeCoAutoria = self.matrizDeFrequencia.sum(axis=1) # suma das linhas = num. de items feitos em co-autoria (parceria) com outro membro do grupo
-		self.matrizDeFrequenciaNormalizada = self.matrizDeFrequencia.copy()
 
-		for i in range(0, self.numeroDeMembros()):
-			if not self.vetorDeCoAutoria[i]==0:
-				self.matrizDeFrequenciaNormalizada[i,:] /= float(self.vetorDeCoAutoria[i])
+		# normalizacao das linhas: matrizDeFrequenciaNormalizada = diag(1/vetorDeCoAutoria) * matrizDeFrequencia
+		somaDasLinhas = numpy.asarray(self.vetorDeCoAutoria, dtype=numpy.float64).ravel()
+		inverso = numpy.zeros(len(somaDasLinhas))
+		inverso[somaDasLinhas!=0] = 1.0/somaDasLinhas[somaDasLinhas!=0]
+		N = self.numeroDeMembros()
+		self.matrizDeFrequenciaNormalizada = (sparse.spdiags(inverso, 0, N, N) * self.matrizDeFrequencia).tocsr()
 
 		# AuthorRank
 		authorRank = AuthorRank(self.matrizDeFrequenciaNormalizada, 100)
@@ -387,9 +520,12 @@ class Grupo:
 	def identificarQualisEmPublicacoes(self):
 		if self.obterParametro('global-identificar_publicacoes_com_qualis'):
 			print "\n[IDENTIFICANDO QUALIS EM PUBLICAÇÕES]"
+			self.qualis.resolverIssns(self)
 			for membro in self.listaDeMembros:
 				self.qualis.analisarPublicacoes(membro, self) # Qualis - Adiciona Qualis as publicacoes dos membros
 			self.qualis.calcularTotaisDosQualis(self)
+			self.qualis.imprimirEstatisticasDaMemoria()
+			self.qualis.salvarMemoria()
 
 			self.separarQualisPorAno()
 
@@ -574,6 +710,7 @@ class Grupo:
 			if self.analisadorDePublicacoes.listaDoiValido is not None:
 				prefix = self.obterParametro('global-prefixo')+'-' if not self.obterParametro('global-prefixo')=='' else ''
 				self.salvarListaInternalizacaoTXT( self.analisadorDePublicacoes.listaDoiValido,prefix+'internacionalizacao.txt')
+			self.analisadorDePublicacoes.imprimirEstatisticasPorEditora()
 
 	def imprimirListasCompletas(self):
 		self.compilador.imprimirListasCompletas()
@@ -642,13 +779,20 @@ class Grupo:
 		self.listaDeParametros.append(['global-prefixo', ''])
 		self.listaDeParametros.append(['global-diretorio_de_armazenamento_de_cvs', ''])
 		self.listaDeParametros.append(['global-diretorio_de_armazenamento_de_doi', ''])
+		self.listaDeParametros.append(['global-numero_de_downloads_simultaneos', '4'])
+		self.listaDeParametros.append(['global-numero_de_processos', '1'])
+		self.listaDeParametros.append(['global-modo_incremental', 'nao'])
+		self.listaDeParametros.append(['global-processar_cvs_com_tidy', 'sim'])
 		self.listaDeParametros.append(['global-salvar_informacoes_em_formato_xml', 'nao'])
 
 		self.listaDeParametros.append(['global-identificar_publicacoes_com_qualis', 'nao'])
 		self.listaDeParametros.append(['global-extrair_qualis_online','sim'])
 		self.listaDeParametros.append(['global-arquivo_areas_qualis',''])
+		self.listaDeParametros.append(['global-arquivo_dados_qualis', 'qualis.sqlite'])
+		self.listaDeParametros.append(['global-numero_de_conexoes_qualis', '4'])
 		self.listaDeParametros.append(['global-arquivo_qualis_de_congressos', ''])
 		self.listaDeParametros.append(['global-arquivo_qualis_de_periodicos', ''])
+		self.listaDeParametros.append(['global-armazenar_memoria_qualis', 'nao'])
 
 		self.listaDeParametros.append(['relatorio-salvar_publicacoes_em_formato_ris', 'nao'])
 		self.listaDeParametros.append(['relatorio-incluir_artigo_em_periodico', 'sim'])
@@ -702,6 +846,7 @@ class Grupo:
 		self.listaDeParametros.append(['grafo-mostrar_todos_os_nos_do_grafo', 'sim'])
 		self.listaDeParametros.append(['grafo-considerar_rotulos_dos_membros_do_grupo', 'sim'])
 		self.listaDeParametros.append(['grafo-mostrar_aresta_proporcional_ao_numero_de_colaboracoes', 'sim'])
+		self.listaDeParametros.append(['grafo-programa_de_layout', 'automatico'])
 		
 		self.listaDeParametros.append(['grafo-incluir_artigo_em_periodico', 'sim'])
 		self.listaDeParametros.append(['grafo-incluir_livro_publicado', 'sim'])
@@ -733,4 +878,5 @@ class Grupo:
 		self.listaDeParametros.append(['mapa-incluir_alunos_de_pos_doutorado', 'sim'])
 		self.listaDeParametros.append(['mapa-incluir_alunos_de_doutorado', 'sim'])
 		self.listaDeParametros.append(['mapa-incluir_alunos_de_mestrado', 'nao'])
+		self.listaDeParametros.append(['mapa-consultar_geolocalizacao_online', 'sim'])
 
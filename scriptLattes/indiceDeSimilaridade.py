@@ -0,0 +1,238 @@
+#!/usr/bin/python
+# encoding: utf-8
+# filename: indiceDeSimilaridade.py
+#
+#  scriptLattes V8
+#  Copyright 2005-2013: Jesús P. Mena-Chalco e Roberto M. Cesar-Jr.
+#  http://scriptlattes.sourceforge.net/
+#
+#
+#  Este programa é um software livre; você pode redistribui-lo e/ou
+#  modifica-lo dentro dos termos da Licença Pública Geral GNU como
+#  publicada pela Fundação do Software Livre (FSF); na versão 2 da
+#  Licença, ou (na sua opinião) qualquer versão.
+#
+#  Este programa é distribuído na esperança que possa ser util,
+#  mas SEM NENHUMA GARANTIA; sem uma garantia implicita de ADEQUAÇÂO a qualquer
+#  MERCADO ou APLICAÇÃO EM PARTICULAR. Veja a
+#  Licença Pública Geral GNU para maiores detalhes.
+#
+#  Você deve ter recebido uma cópia da Licença Pública Geral GNU
+#  junto com este programa, se não, escreva para a Fundação do Software
+#  Livre(FSF) Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+# ---------------------------------------------------------------------------- #
+# Índice de trigramas usado para evitar a comparação de todos contra todos em
+# CompiladorDeListas.compilarLista. O índice devolve apenas as posições que
+# podem satisfazer util.compararCadeias (sem qualis):
+#  - distancia de Levenshtein <= 5 (ambas as cadeias com pelo menos 10 caracteres), ou
+#  - uma cadeia contida na outra (ambas com pelo menos 20 caracteres).
+# Os candidatos são um superconjunto dos pares similares, portanto o resultado
+# final (obtido com compararCom) é idêntico ao da busca exaustiva.
+#
+# Filtros utilizados (q=3, k=5):
+#  - cada edição destrói no máximo q trigramas distintos, logo duas cadeias com
+#    distancia <= k compartilham pelo menos max(D1,D2)-k*q trigramas distintos.
+#    Com uma ordem global fixa dos trigramas basta indexar os k*q+1 primeiros
+#    trigramas de cada cadeia (prefix filtering);
+#  - se a cadeia A está contida em B, todos os trigramas de A estão em B (em
+#    particular o primeiro trigrama de A na ordem global).
+# ---------------------------------------------------------------------------- #
+
+Q = 3
+DISTANCIA_MAXIMA = 5
+TAMANHO_DO_PREFIXO = DISTANCIA_MAXIMA*Q + 1
+
+
+def normalizarCadeia(cadeia):
+	return cadeia.strip().lower()
+
+def trigramas(cadeia):
+	return set([cadeia[i:i+Q] for i in range(0, len(cadeia)-Q+1)])
+
+
+class IndiceDeSimilaridade:
+	frequencia = None
+
+	def __init__(self, frequencia=None):
+		# frequencia: numero de cadeias em que aparece cada trigrama (define a ordem global;
+		# trigramas raros primeiro). Deve ser a mesma durante toda a vida do índice.
+		self.frequencia = frequencia if frequencia is not None else {}
+		self.entradas = []          # posicao -> (comprimento, numero de trigramas, primeiros trigramas) ou None
+		self.semChave = set([])     # posicoes cuja chave não é uma cadeia (sempre candidatas)
+		self.prefixos = {}          # trigrama -> posicoes com o trigrama no prefixo
+		self.primeiros = {}         # trigrama -> posicoes cujo primeiro trigrama é este
+		self.completos = {}         # trigrama -> posicoes que contêm o trigrama
+		self.curtas = {}            # comprimento -> posicoes com menos de TAMANHO_DO_PREFIXO trigramas
+
+
+	def ordenar(self, grams):
+		return sorted(grams, key=lambda g: (self.frequencia.get(g, 0), g))
+
+
+	def adicionar(self, chave):
+		posicao = len(self.entradas)
+		self.entradas.append(None)
+		self.inserir(posicao, chave)
+		return posicao
+
+
+	def atualizar(self, posicao, chave):
+		self.remover(posicao)
+		self.inserir(posicao, chave)
+
+
+	def inserir(self, posicao, chave):
+		if not isinstance(chave, basestring):
+			self.semChave.add(posicao)
+			return
+
+		cadeia = normalizarCadeia(chave)
+		if len(cadeia)<10: # nunca será similar a outra cadeia
+			return
+
+		grams = trigramas(cadeia)
+		ordem = self.ordenar(grams)
+		entrada = (len(cadeia), len(grams), ordem[:TAMANHO_DO_PREFIXO], grams)
+		self.entradas[posicao] = entrada
+
+		for g in entrada[2]:
+			self.prefixos.setdefault(g, set([])).add(posicao)
+		self.primeiros.setdefault(ordem[0], set([])).add(posicao)
+		for g in grams:
+			self.completos.setdefault(g, set([])).add(posicao)
+		if len(grams)<TAMANHO_DO_PREFIXO:
+			self.curtas.setdefault(len(cadeia), set([])).add(posicao)
+
+
+	def remover(self, posicao):
+		self.semChave.discard(posicao)
+		entrada = self.entradas[posicao]
+		if entrada is None:
+			return
+		(comprimento, numeroDeGrams, prefixo, grams) = entrada
+		for g in prefixo:
+			self.prefixos[g].discard(posicao)
+		self.primeiros[prefixo[0]].discard(posicao)
+		for g in grams:
+			self.completos[g].discard(posicao)
+		if numeroDeGrams<TAMANHO_DO_PREFIXO:
+			self.curtas[comprimento].discard(posicao)
+		self.entradas[posicao] = None
+
+
+	def candidatos(self, chave):
+		# posições (em ordem crescente) que podem ser similares a 'chave'
+		if not isinstance(chave, basestring):
+			return range(0, len(self.entradas))
+
+		cadeia = normalizarCadeia(chave)
+		if len(cadeia)<10:
+			return sorted(self.semChave)
+
+		comprimento = len(cadeia)
+		grams = trigramas(cadeia)
+		ordem = self.ordenar(grams)
+		posicoes = set(self.semChave)
+
+		# (1) distancia de Levenshtein <= 5
+		possiveis = set([])
+		for g in ordem[:TAMANHO_DO_PREFIXO]:
+			possiveis.update(self.prefixos.get(g, ()))
+		if len(grams)<TAMANHO_DO_PREFIXO: # limite inferior de trigramas comuns nao positivo
+			for c in range(comprimento-DISTANCIA_MAXIMA, comprimento+DISTANCIA_MAXIMA+1):
+				possiveis.update(self.curtas.get(c, ()))
+		for p in possiveis:
+			if abs(self.entradas[p][0]-comprimento)<=DISTANCIA_MAXIMA:
+				posicoes.add(p)
+
+		# (2) uma cadeia contida na outra
+		if comprimento>=20:
+			for p in self.completos.get(ordem[0], ()): # 'cadeia' contida na entrada
+				if self.entradas[p][0]>=comprimento:
+					posicoes.add(p)
+			for g in grams: # entrada contida em 'cadeia'
+				for p in self.primeiros.get(g, ()):
+					if 20<=self.entradas[p][0]<=comprimento:
+						posicoes.add(p)
+
+		return sorted(posicoes)
+
+
+def contarTrigramas(cadeias, frequencia=None):
+	# acumula o numero de cadeias em que aparece cada trigrama
+	if frequencia is None:
+		frequencia = {}
+	for chave in cadeias:
+		if isinstance(chave, basestring):
+			for g in trigramas(normalizarCadeia(chave)):
+				frequencia[g] = frequencia.get(g, 0) + 1
+	return frequencia
+
+
+# ---------------------------------------------------------------------------- #
+# Índice de bigramas usado por Qualis.buscaQualis. Devolve as chaves que podem
+# satisfazer util.compararCadeias(nome, chave, qualis=True):
+#  - Levenshtein.ratio >= 0.80 (ambas as cadeias com pelo menos 10 caracteres), ou
+#  - uma cadeia contida na outra (ambas com pelo menos 20 caracteres).
+#
+# ratio = 2*LCS/(l1+l2), logo ratio >= 0.80 exige LCS >= 2*(l1+l2)/5. Na
+# transformação de A em B com l1-LCS remoções (cada uma destrói no máximo 2
+# bigramas) e l2-LCS inserções (no máximo 1 bigrama), as duas cadeias mantêm
+# pelo menos (l1-1) - 2*(l1-LCS) - (l2-LCS) bigramas em comum (contados com
+# repetição). Se B está contida em A, todos os l2-1 bigramas de B estão em A.
+# ---------------------------------------------------------------------------- #
+
+def contarBigramas(cadeia):
+	bigramas = {}
+	for i in range(0, len(cadeia)-1):
+		g = cadeia[i:i+2]
+		bigramas[g] = bigramas.get(g, 0) + 1
+	return bigramas
+
+def minimoDeBigramasComuns(l1, l2):
+	lcs = (2*(l1+l2)+4)//5
+	return max((l1-1) - 2*(l1-lcs) - (l2-lcs), (l2-1) - 2*(l2-lcs) - (l1-lcs))
+
+
+class IndiceDeBigramas:
+
+	def __init__(self, chaves):
+		self.chaves = list(chaves)
+		self.comprimentos = []
+		self.bigramas = {}          # bigrama -> [(posicao, ocorrencias)]
+		for posicao in range(0, len(self.chaves)):
+			chave = self.chaves[posicao]
+			cadeia = normalizarCadeia(chave) if isinstance(chave, basestring) else u''
+			self.comprimentos.append(len(cadeia))
+			if len(cadeia)<10: # nunca será similar a outra cadeia
+				continue
+			for g, n in contarBigramas(cadeia).iteritems():
+				self.bigramas.setdefault(g, []).append((posicao, n))
+
+
+	def __len__(self):
+		return len(self.chaves)
+
+
+	def candidatos(self, nome):
+		# posições (em ordem crescente, a mesma de 'chaves') que podem ser similares a 'nome'
+		cadeia = normalizarCadeia(nome)
+		l1 = len(cadeia)
+		if l1<10:
+			return []
+
+		comuns = {}
+		for g, n in contarBigramas(cadeia).iteritems():
+			for (posicao, m) in self.bigramas.get(g, ()):
+				comuns[posicao] = comuns.get(posicao, 0) + min(n, m)
+
+		posicoes = []
+		for posicao, c in comuns.iteritems():
+			l2 = self.comprimentos[posicao]
+			if l1>=20 and l2>=20 and c>=min(l1, l2)-1:
+				posicoes.append(posicao)
+			elif 5*min(l1, l2)>=2*(l1+l2) and c>=minimoDeBigramasComuns(l1, l2):
+				posicoes.append(posicao)
+		return sorted(posicoes)
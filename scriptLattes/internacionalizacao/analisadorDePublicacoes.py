@@ -25,31 +25,75 @@
 
 import string
 import re
-import urllib2
-import cookielib
 import time
+import threading
+import Queue
+import requests
+import unicodedata
 from unicodedata import normalize
 from HTMLParserNew import HTMLParser
 from tidylib import tidy_document
 from publicacaoEinternacionalizacao import * 
-import xml.dom.minidom
 import os.path
 
-from genericParser import *
-from parser101007 import *
-from parser101590 import *
-from parser101021 import *
+from identificadorDePaises import IdentificadorDePaises
+from regrasDasEditoras import carregarRegrasDasEditoras
+
+CABECALHOS_DOI = {
+	'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:2.0) Gecko/20100101 Firefox/4.0',
+	'Accept-Language': 'en-us,en;q=0.5',
+	'Accept-Encoding': 'deflate',
+	'Cache-Control': 'max-age=0',
+}
+TEMPO_LIMITE_DOI = 60
+TENTATIVAS_POR_DOI = 3
+ESPERA_INICIAL_DOI = 2    # segs (dobrada a cada tentativa)
+ESPERA_MAXIMA_DOI = 30
+INTERVALO_POR_EDITORA = 1.0 # segs entre o inicio de duas requisicoes a uma mesma editora
+
+
+def prefixoDoDOI(urlDOI):
+	# prefixo da editora (ex.: '10.1016' em http://dx.doi.org/10.1016/j.xxx)
+	prefixo = re.search(r'10\.\d+', urlDOI)
+	if prefixo is None:
+		return urlDOI
+	return prefixo.group(0)
+
+
+class LimitadorPorEditora:
+	# intervalo mínimo entre requisições a uma mesma editora (compartilhado por todas as threads)
+	def __init__(self, intervalo):
+		self.intervalo = intervalo
+		self.lock = threading.Lock()
+		self.proximaRequisicao = {}
+
+	def aguardar(self, editora):
+		self.lock.acquire()
+		try:
+			agora = time.time()
+			inicio = max(agora, self.proximaRequisicao.get(editora, 0.0))
+			self.proximaRequisicao[editora] = inicio + self.intervalo
+		finally:
+			self.lock.release()
+		if inicio > agora:
+			time.sleep(inicio - agora)
+
+limitadorPorEditora = LimitadorPorEditora(INTERVALO_POR_EDITORA)
+
 
 class AnalisadorDePublicacoes:
 	grupo = None
 	paises = None
 	listaDePublicacoesEinternacionalizacao = None
 	listaDoiValido=[]
-	parserFile=None
+	regrasDasEditoras = None
+	identificadorDePaises = None
 	def __init__(self, grupo):
 		self.grupo = grupo
 		self.listaDePublicacoesEinternacionalizacao = {}
-		self.parserFile  = xml.dom.minidom.parse('./scriptLattes/internacionalizacao/parserFileConfig.xml') # read the file just the fist time
+		self.documentosBaixados = {} # urlDOI -> página (normalizada) baixada em baixarDOIs ou None
+		self.regrasDasEditoras = carregarRegrasDasEditoras() # prefixo do DOI -> RegraDeEditora
+		self.estatisticasPorEditora = {} # prefixo do DOI -> [DOIs, com paises, sem paises ou indisponiveis, tempo]
 		self.paises = {
 			"Abkhazia":       ["Apsny", "Abkhaziya"],
 			"Afghanistan":    ["Afghanestan"],
@@ -288,11 +332,20 @@ class AnalisadorDePublicacoes:
 			"Zambia":         [],
 			"Zimbabwe":       [],
 		}   		
+		self.identificadorDePaises = IdentificadorDePaises(self.paises) # nomes normalizados e expressões compiladas uma única vez
 
 	def analisarInternacionalizacaoNaCoautoria(self):
 		# listaCompletaPB = self.grupo.compilador.listaCompletaPB
 		listaCompletaPB = self.grupo.compilador.listaCompletaArtigoEmPeriodico
 		keys = listaCompletaPB.keys()
+
+		listaDeDOIs = []
+		for ano in keys:
+			for pub in listaCompletaPB[ano]:
+				if hasattr(pub, 'doi') and not pub.doi=="":
+					listaDeDOIs.append(pub.doi)
+		self.baixarDOIs(listaDeDOIs, int(self.grupo.obterParametro('global-numero_de_downloads_simultaneos') or 1))
+
 		for ano in keys:		
 			elementos = listaCompletaPB[ano]
 			for index in range(0, len(elementos)):
@@ -313,27 +366,23 @@ class AnalisadorDePublicacoes:
 
 	def identificarPaisesEmPublicacao(self, urlDOI, ano):
 		listaDePaisesIdentificados = None
+		inicio = time.time()
 		dataDoi = self.obterDadosAtravesDeDOI(urlDOI)
 		
 		if dataDoi:	
-			listaDePaisesIdentificados = []
-
-			for key in self.paises.keys():
-				nomeDePais = key
-				# Procuramos o nome em ingles (nome original)
-				totalInternacionais=0
-				if self.procurarPais(dataDoi, nomeDePais, urlDOI):
-					listaDePaisesIdentificados.append(nomeDePais)
-				else:
-					if len(self.paises[nomeDePais])>0:
-						# Procuramos os nomes alternativos dos países
-						for nomeAlternativoDePais in self.paises[nomeDePais]:
-							if self.procurarPais(dataDoi, nomeAlternativoDePais, urlDOI):
-								listaDePaisesIdentificados.append(nomeDePais)
-								break
+			(doihtml, regras) = self.normalizarDadosDoDOI(dataDoi)
+			listaDePaisesIdentificados = self.identificadorDePaises.identificar(doihtml, regras)
 
 		print "- Paises identificados : " + str(listaDePaisesIdentificados)
 
+		estatisticas = self.estatisticasPorEditora.setdefault(prefixoDoDOI(urlDOI), [0, 0, 0, 0.0])
+		estatisticas[0] += 1
+		if listaDePaisesIdentificados:
+			estatisticas[1] += 1
+		else:
+			estatisticas[2] += 1
+		estatisticas[3] += time.time()-inicio
+
 		# na lista de paises identificados
 		if listaDePaisesIdentificados is not None:
 			if len(listaDePaisesIdentificados)>0:
@@ -347,154 +396,68 @@ class AnalisadorDePublicacoes:
 		return listaDePaisesIdentificados
 	
 
-	def procurarPais(self, dataDoi, nomeDePais, urlDOI):
-		nomeDePais = nomeDePais.lower()
-		nomeDePais = HTMLParser().unescape(nomeDePais.decode("utf8", "ignore"))
-		nomeDePais = unicodedata.normalize('NFKD',unicode(nomeDePais)).encode('ascii','ignore')
-		if len(nomeDePais)<=0:
-			return False
+	def imprimirEstatisticasPorEditora(self):
+		if len(self.estatisticasPorEditora)==0:
+			return
+		print "\n[INTERNACIONALIZACAO]: DOIs por editora (acertos: paises identificados; falhas: nenhum pais ou DOI indisponivel)"
+		for prefixo in sorted(self.estatisticasPorEditora.keys()):
+			(dois, acertos, falhas, tempo) = self.estatisticasPorEditora[prefixo]
+			regra = self.regrasDasEditoras.get(prefixo)
+			origem = regra.origem if regra is not None else 'padrao'
+			print "- %s (%s): %d DOIs, %d acertos, %d falhas, %.2f segs" % (prefixo, origem, dois, acertos, falhas, tempo)
+
+
+	def normalizarDadosDoDOI(self, dataDoi):
+		# o documento é normalizado uma única vez; devolve (documento, [(prefixo, posfixo)])
+		doihtml = dataDoi[0]
+		doihtml = doihtml.encode('utf8','replace')
+		doihtml = doihtml.lower()
 		if len(dataDoi) == 2:
-			doihtml = dataDoi[0]
-			doihtml = doihtml.encode('utf8','replace')
-			doihtml=doihtml.lower()
 			doihtml=doihtml.replace('\\r\\n','')
 			doihtml=doihtml.replace('\\t','')
 			doihtml=doihtml.replace('\\n','')
 			prefixo = dataDoi[1][4]
 			posfixo = dataDoi[1][5]
-			idDoi = dataDoi[1][0]
-			if re.search((prefixo,'')[prefixo is None]+re.escape(nomeDePais)+(posfixo,'')[posfixo is None], doihtml):
-					# print "generic case"
-					# print idDoi+" "+(prefixo,'')[prefixo is None] +" "+(posfixo,'')[posfixo is None]
-					return True
-			else:
-					return False
-		elif len(dataDoi) == 1:
-			doihtml = dataDoi[0]
-			doihtml = doihtml.encode('utf8','replace')
-			doihtml = doihtml.lower()
-			prefixo = ",.*,\s*"
-			if re.search(prefixo+re.escape(nomeDePais)+r"\s*\n", doihtml):
-				return True
-			if re.search(prefixo+re.escape(nomeDePais)+r"\W*\n", doihtml):
-				return True
-			return False
+			return doihtml, [((prefixo,'')[prefixo is None], (posfixo,'')[posfixo is None])]
 		else:
-			return False
+			prefixo = ",.*,\s*"
+			return doihtml, [(prefixo, r"\s*\n"), (prefixo, r"\W*\n")]
 
 
 	def obterDadosAtravesDeDOI(self, urlDOI):
 		print '\nProcessando DOI: ' + urlDOI
-		txdata = None
-		txheaders = {   
-		'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:2.0) Gecko/20100101 Firefox/4.0',
-		'Accept-Language': 'en-us,en;q=0.5',
-		'Accept-Encoding': 'deflate',
-		'Keep-Alive': '115',
-		'Connection': 'keep-alive',
-		'Cache-Control': 'max-age=0',
-		}
-
-		doiNumber = urlDOI
-		doiNumber = doiNumber.replace('http://dx.doi.org/','');
-		doiNumber = doiNumber.replace('/','-');
-		doiPath   = self.grupo.diretorioDoi+'/'+doiNumber
+		doiPath = self.caminhoDoDOI(urlDOI)
 
 		if (os.path.isfile(doiPath)):
 			arquivoX   = open(doiPath)
 			rawDOIhtml = arquivoX.read()
 			arquivoX.close()
+			self.documentosBaixados.pop(urlDOI, None)
 			print "- Utilizando DOI armazenado no cache: " + doiPath
 
-		#-----------------------------------------------------------------
-		# tentamos 3 vezes baixar a página web associado ao DOI
+		elif urlDOI in self.documentosBaixados:
+			# baixado em baixarDOIs
+			rawDOIhtml = self.documentosBaixados.pop(urlDOI)
+			if rawDOIhtml is not None:
+				print "- Publicacao com DOI baixada previamente: " + urlDOI
+
 		else:
-			tentativa = 1
-			while tentativa<=1:
-				try:
-					req = urllib2.Request(urlDOI, txdata, txheaders)
-	
-					cj = cookielib.CookieJar()
-					opener = urllib2.build_opener(urllib2.HTTPCookieProcessor(cj))
-					response = opener.open(req)
-					rawDOIhtml = response.read()
-					print "- Baixando publicacao com DOI: " + urlDOI
-
-					# rawDOIhtml = HTMLParser.HTMLParser().unescape(rawDOIhtml.decode("utf8", "ignore"))
-					rawDOIhtml = HTMLParser().unescape(rawDOIhtml.decode("utf8", "ignore"))
-					rawDOIhtml = unicodedata.normalize('NFKD',unicode(rawDOIhtml)).encode('ascii','ignore')
-		
-					if not self.grupo.diretorioDoi=='':
-						print "- Armazenando DOI armazenado no cache: " + doiPath
-						filename = doiPath
-						file = open(filename, "w")
-						file.write(rawDOIhtml)
-						file.close()
-					break
-				except:
-					print '[AVISO] Tentativa '+str(tentativa)+': DOI não está disponível na internet: ', urlDOI
-					time.sleep(10)
-					rawDOIhtml = None
-					tentativa += 1
-					continue
+			rawDOIhtml = self.baixarDOI(requests.Session(), urlDOI)
+
 		dataDoi=[]
 		if rawDOIhtml is not None:
 
-			parserData = self.procurarParser(urlDOI)
-			if parserData is not None:				
-				if len(parserData)==6:
-					print "**caso -- " + parserData[0]
-					caso = genericParser(parserData)
-					try:
-						caso.feed(rawDOIhtml)  ####
-					except:
-						caso.data = ""
-					doihtml = str(caso.data)
-					dataDoi.append(doihtml)
-					dataDoi.append(parserData)
-
-			elif urlDOI.find("10.1134")>-1:
-				print "**caso - 10.1134"
-				casoUrl = parser101007()
-				try:
-					casoUrl.feed(rawDOIhtml) ###
-				except:
-					casoUrl.data = ""
-				doihtml = str(casoUrl.data)
-				parserData = ["10.1134",'','','','authoraddress=.*\+','.*&contentid']
-				dataDoi.append(doihtml)
-				dataDoi.append(parserData)
-
-		#	elif urlDOI.find("10.1007")>-1:
-		#		print "**caso - 10.1007"
-		#		casoUrl = parser101007()
-		#		casoUrl.feed(rawDOIhtml)
-		#		doihtml = str(casoUrl.data)
-		#		parserData = ["10.1007",'','','','authoraddress=.*\+','.*&contentid']
-		#		dataDoi.append(doihtml)
-		#		dataDoi.append(parserData)
-
-		#	elif urlDOI.find("10.1021")>-1:
-		#		# print "**caso -- 10.1021"
-		#		caso=parser101021()
-		#		caso.feed(rawDOIhtml)
-		#		doihtml= str(caso.data)
-		#		parserData=["10.1021",'','','',',.*,\s*','[\s*|,|;|-|\.|\'|\"]']
-		#		dataDoi.append(doihtml)
-		#		dataDoi.append(parserData)
-
-			elif urlDOI.find("10.1590")>-1:
-				print "**caso -- 10.1590"
-				caso = parser101590()
+			regra = self.regrasDasEditoras.get(prefixoDoDOI(urlDOI))
+			if regra is not None:
+				print "**caso -- " + regra.idDoi
+				caso = regra.criarParser()
 				try:
 					caso.feed(rawDOIhtml)
 				except:
 					caso.data = ""
 				doihtml = str(caso.data)
-				#print doihtml
-				parserData = ["10.1590",'','','',',.*,\s*','[\s*|,|;|-|\.|\'|\"]']
 				dataDoi.append(doihtml)
-				dataDoi.append(parserData)
+				dataDoi.append(regra.campos)
 			else:
 				print "**caso DEFAULT não esta no xml"
 				doihtml =  self.html2texto(rawDOIhtml)
@@ -505,6 +468,69 @@ class AnalisadorDePublicacoes:
 		return dataDoi
 
 
+	def caminhoDoDOI(self, urlDOI):
+		doiNumber = urlDOI
+		doiNumber = doiNumber.replace('http://dx.doi.org/','');
+		doiNumber = doiNumber.replace('/','-');
+		return self.grupo.diretorioDoi+'/'+doiNumber
+
+
+	def baixarDOIs(self, listaDeDOIs, numeroDeDownloads):
+		# os DOIs que não estão no cache são baixados em paralelo (cada thread reaproveita as conexões
+		# da sua sessão; requisições a uma mesma editora respeitam INTERVALO_POR_EDITORA)
+		fila = Queue.Queue()
+		for urlDOI in listaDeDOIs:
+			if not urlDOI in self.documentosBaixados and not os.path.isfile(self.caminhoDoDOI(urlDOI)):
+				self.documentosBaixados[urlDOI] = None
+				fila.put(urlDOI)
+		if fila.qsize()==0:
+			return
+		print "\n[BAIXANDO "+str(fila.qsize())+" DOIs: "+str(numeroDeDownloads)+" DOWNLOADS SIMULTANEOS]"
+
+		def trabalhador():
+			sessao = requests.Session()
+			while True:
+				try:
+					urlDOI = fila.get_nowait()
+				except Queue.Empty:
+					return
+				self.documentosBaixados[urlDOI] = self.baixarDOI(sessao, urlDOI)
+
+		threads = [threading.Thread(target=trabalhador) for i in range(0, min(numeroDeDownloads, fila.qsize()))]
+		for t in threads:
+			t.daemon = True
+			t.start()
+		for t in threads:
+			t.join()
+
+
+	def baixarDOI(self, sessao, urlDOI):
+		# tentamos TENTATIVAS_POR_DOI vezes baixar a página web associada ao DOI (com espera exponencial entre as tentativas)
+		for tentativa in range(1, TENTATIVAS_POR_DOI+1):
+			try:
+				limitadorPorEditora.aguardar(prefixoDoDOI(urlDOI))
+				response = sessao.get(urlDOI, headers=CABECALHOS_DOI, timeout=TEMPO_LIMITE_DOI)
+				response.raise_for_status()
+				rawDOIhtml = response.content
+				print "- Baixando publicacao com DOI: " + urlDOI
+
+				rawDOIhtml = HTMLParser().unescape(rawDOIhtml.decode("utf8", "ignore"))
+				rawDOIhtml = unicodedata.normalize('NFKD',unicode(rawDOIhtml)).encode('ascii','ignore')
+
+				if not self.grupo.diretorioDoi=='':
+					doiPath = self.caminhoDoDOI(urlDOI)
+					print "- Armazenando DOI armazenado no cache: " + doiPath
+					file = open(doiPath, "w")
+					file.write(rawDOIhtml)
+					file.close()
+				return rawDOIhtml
+			except Exception, e:
+				print '[AVISO] Tentativa '+str(tentativa)+': DOI não está disponível na internet: ', urlDOI
+				if tentativa<TENTATIVAS_POR_DOI:
+					time.sleep(min(ESPERA_INICIAL_DOI * 2**(tentativa-1), ESPERA_MAXIMA_DOI))
+		return None
+
+
 	def html2texto(self, rawDOIhtml):
 		# First we remove inline JavaScript/CSS:
 		cleaned = re.sub(r"(?is)<(script|style).*?>.*?(</\1>)", "", rawDOIhtml.strip())
@@ -530,31 +556,3 @@ class AnalisadorDePublicacoes:
 
 		cleaned = re.sub(r"\s+\n", "\n", cleaned)
 		return cleaned.strip()
-
-
-	def procurarParser(self, urlDOI):
-			idDoi=urlDOI[18:25]
-			x=self.parserFile
-			nos = x.documentElement
-			fields=[]
-		    	filhos1 = [no for no in nos.childNodes if no.nodeType == \
-				  x.ELEMENT_NODE]
-		    	for pai in filhos1:	
-				if pai.hasAttribute('idDoi'):
-					atr= pai.getAttributeNode('idDoi')
-					if atr.value==idDoi:
-						fields.append(atr.value)
-						filhos2 = [no for no in pai.childNodes if no.nodeType == \
-							      x.ELEMENT_NODE]
-						for filho in filhos2:
-							fields.append(self.node2Text(filho))
-						return fields
-
-
-	def node2Text(self,node):
-	    text = ''
-	    for child in node.childNodes:
-		if child.nodeType is child.TEXT_NODE:
-		    text += child.data
-		return text
-					
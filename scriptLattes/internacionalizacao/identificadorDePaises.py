@@ -0,0 +1,126 @@
+#!/usr/bin/python
+# encoding: utf-8
+# filename: identificadorDePaises.py
+#
+#  scriptLattes V8
+#  Copyright 2005-2013: Jesús P. Mena-Chalco e Roberto M. Cesar-Jr.
+#  http://scriptlattes.sourceforge.net/
+#
+#
+#  Este programa é um software livre; você pode redistribui-lo e/ou
+#  modifica-lo dentro dos termos da Licença Pública Geral GNU como
+#  publicada pela Fundação do Software Livre (FSF); na versão 2 da
+#  Licença, ou (na sua opinião) qualquer versão.
+#
+#  Este programa é distribuído na esperança que possa ser util,
+#  mas SEM NENHUMA GARANTIA; sem uma garantia implicita de ADEQUAÇÂO a qualquer
+#  MERCADO ou APLICAÇÃO EM PARTICULAR. Veja a
+#  Licença Pública Geral GNU para maiores detalhes.
+#
+#  Você deve ter recebido uma cópia da Licença Pública Geral GNU
+#  junto com este programa, se não, escreva para a Fundação do Software
+#  Livre(FSF) Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import re
+import unicodedata
+from HTMLParserNew import HTMLParser
+
+# ---------------------------------------------------------------------------- #
+# Identificação dos países citados no texto (já normalizado) de uma publicação.
+# Os nomes dos países são normalizados uma única vez e reunidos numa expressão
+# regular em forma de árvore de prefixos (trie), compilada uma única vez: uma
+# passada sobre o documento devolve todos os nomes que ocorrem nele. Somente
+# para esses nomes são avaliadas as regras (prefixo + nome + posfixo) de cada
+# editora, cujas expressões também são compiladas uma única vez.
+# ---------------------------------------------------------------------------- #
+
+def normalizarNomeDePais(nomeDePais):
+	nomeDePais = nomeDePais.lower()
+	nomeDePais = HTMLParser().unescape(nomeDePais.decode("utf8", "ignore"))
+	return unicodedata.normalize('NFKD',unicode(nomeDePais)).encode('ascii','ignore')
+
+
+def expressaoDaArvore(arvore):
+	# arvore: caractere -> subárvore ('' indica o fim de um nome). Os nomes mais
+	# longos são preferidos (o grupo opcional é guloso)
+	alternativas = []
+	for c in sorted(arvore.keys()):
+		if not c=='':
+			alternativas.append(re.escape(c) + expressaoDaArvore(arvore[c]))
+	if len(alternativas)==0:
+		return ''
+	if len(alternativas)==1:
+		expressao = alternativas[0]
+	else:
+		expressao = '(?:' + '|'.join(alternativas) + ')'
+	if '' in arvore:
+		expressao = '(?:' + expressao + ')?'
+	return expressao
+
+
+class IdentificadorDePaises:
+
+	def __init__(self, paises):
+		# paises: nome do país -> nomes alternativos (a ordem de paises.keys() é mantida no resultado)
+		self.paises = []            # [(país, [nomes normalizados])]
+		self.prefixos = {}          # nome normalizado -> nomes normalizados que são prefixos dele (inclusive)
+		self.padroes = {}           # (prefixo, nome, posfixo) -> expressão compilada
+		arvore = {}
+
+		for pais in paises.keys():
+			nomes = []
+			for nome in [pais] + paises[pais]:
+				nome = normalizarNomeDePais(nome)
+				if len(nome)>0:
+					nomes.append(nome)
+			self.paises.append((pais, nomes))
+
+			for nome in nomes:
+				no = arvore
+				for c in nome:
+					no = no.setdefault(c, {})
+				no[''] = {}
+
+		todosOsNomes = set([])
+		for (pais, nomes) in self.paises:
+			todosOsNomes.update(nomes)
+		for nome in todosOsNomes:
+			self.prefixos[nome] = [nome[:i] for i in range(1, len(nome)+1) if nome[:i] in todosOsNomes]
+
+		# em cada posição a captura devolve o nome mais longo que começa nela
+		self.padraoDeNomes = re.compile('(?=(' + expressaoDaArvore(arvore) + '))')
+
+
+	def nomesNoDocumento(self, doihtml):
+		# nomes normalizados que ocorrem (como subcadeias) no documento
+		nomes = set([])
+		for ocorrencia in self.padraoDeNomes.finditer(doihtml):
+			nomes.update(self.prefixos[ocorrencia.group(1)])
+		return nomes
+
+
+	def casar(self, doihtml, nome, regras):
+		for (prefixo, posfixo) in regras:
+			chave = (prefixo, nome, posfixo)
+			padrao = self.padroes.get(chave)
+			if padrao is None:
+				padrao = re.compile(prefixo + re.escape(nome) + posfixo)
+				self.padroes[chave] = padrao
+			if padrao.search(doihtml):
+				return True
+		return False
+
+
+	def identificar(self, doihtml, regras):
+		# doihtml: documento já normalizado (em minúsculas)
+		# regras: [(prefixo, posfixo)]; um nome é aceito se casar com alguma das regras
+		nomesPresentes = self.nomesNoDocumento(doihtml)
+		listaDePaisesIdentificados = []
+		for (pais, nomes) in self.paises:
+			# o nome em ingles (nome original) e depois os nomes alternativos
+			for nome in nomes:
+				if nome in nomesPresentes and self.casar(doihtml, nome, regras):
+					listaDePaisesIdentificados.append(pais)
+					break
+		return listaDePaisesIdentificados
@@ -0,0 +1,96 @@
+#!/usr/bin/python
+# encoding: utf-8
+# filename: regrasDasEditoras.py
+#
+#  scriptLattes V8
+#  Copyright 2005-2013: Jesús P. Mena-Chalco e Roberto M. Cesar-Jr.
+#  http://scriptlattes.sourceforge.net/
+#
+#
+#  Este programa é um software livre; você pode redistribui-lo e/ou
+#  modifica-lo dentro dos termos da Licença Pública Geral GNU como
+#  publicada pela Fundação do Software Livre (FSF); na versão 2 da
+#  Licença, ou (na sua opinião) qualquer versão.
+#
+#  Este programa é distribuído na esperança que possa ser util,
+#  mas SEM NENHUMA GARANTIA; sem uma garantia implicita de ADEQUAÇÂO a qualquer
+#  MERCADO ou APLICAÇÃO EM PARTICULAR. Veja a
+#  Licença Pública Geral GNU para maiores detalhes.
+#
+#  Você deve ter recebido uma cópia da Licença Pública Geral GNU
+#  junto com este programa, se não, escreva para a Fundação do Software
+#  Livre(FSF) Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import re
+import os.path
+import xml.dom.minidom
+
+from genericParser import *
+from parser101007 import *
+from parser101590 import *
+from parser101021 import *
+
+# ---------------------------------------------------------------------------- #
+# Regras de extração das afiliações nas páginas dos DOIs, indexadas pelo prefixo
+# do DOI (editora). As regras de parserFileConfig.xml são lidas uma única vez e
+# os casos particulares (parsers específicos) são registrados na mesma tabela;
+# as regras do XML têm precedência.
+# ---------------------------------------------------------------------------- #
+
+ARQUIVO_DE_REGRAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parserFileConfig.xml')
+
+
+class RegraDeEditora:
+
+	def __init__(self, campos, construtor, origem):
+		# campos: [idDoi, tag, tipo, nome, prefixo, posfixo]
+		# construtor: campos -> parser (HTMLParser) que acumula em 'data' o texto das afiliações
+		self.idDoi = campos[0]
+		self.campos = campos
+		self.construtor = construtor
+		self.origem = origem
+		# prefixo e posfixo (usados por IdentificadorDePaises) são validados no carregamento
+		re.compile(campos[4] or '')
+		re.compile(campos[5] or '')
+
+
+	def criarParser(self):
+		return self.construtor(self.campos)
+
+
+def textoDoNo(no):
+	texto = ''
+	for filho in no.childNodes:
+		if filho.nodeType == filho.TEXT_NODE:
+			texto += filho.data
+	return texto
+
+
+def registrarRegra(regras, campos, construtor, origem):
+	if campos[0] in regras:
+		return
+	try:
+		regras[campos[0]] = RegraDeEditora(campos, construtor, origem)
+	except re.error, e:
+		print "[AVISO] Regra invalida para o DOI "+campos[0]+": "+str(e)
+
+
+def carregarRegrasDasEditoras(arquivo=ARQUIVO_DE_REGRAS):
+	regras = {}     # idDoi -> RegraDeEditora
+
+	documento = xml.dom.minidom.parse(arquivo)
+	for no in documento.documentElement.childNodes:
+		if no.nodeType == no.ELEMENT_NODE and no.hasAttribute('idDoi'):
+			campos = [no.getAttribute('idDoi')]
+			for filho in no.childNodes:
+				if filho.nodeType == filho.ELEMENT_NODE:
+					campos.append(textoDoNo(filho))
+			if len(campos)==6:
+				registrarRegra(regras, campos, genericParser, 'xml')
+
+	registrarRegra(regras, ["10.1134",'','','','authoraddress=.*\+','.*&contentid'], lambda campos: parser101007(), 'parser101007')
+	registrarRegra(regras, ["10.1590",'','','',',.*,\s*','[\s*|,|;|-|\.|\'|\"]'], lambda campos: parser101590(), 'parser101590')
+	#registrarRegra(regras, ["10.1007",'','','','authoraddress=.*\+','.*&contentid'], lambda campos: parser101007(), 'parser101007')
+	#registrarRegra(regras, ["10.1021",'','','',',.*,\s*','[\s*|,|;|-|\.|\'|\"]'], lambda campos: parser101021(), 'parser101021')
+	return regras
@@ -29,6 +29,9 @@ import sets
 import datetime
 import time
 import os
+import hashlib
+import cPickle
+import cStringIO
 
 from parserLattes import *
 from parserLattesXML import *
@@ -36,6 +39,44 @@ from htmlentitydefs import name2codepoint
 from charts.geolocalizador import *
 from baixaLattes import *
 
+# atributos do CV Lattes copiados do parser para o membro
+ATRIBUTOS_DO_CV = [
+	'nomeCompleto', 'bolsaProdutividade', 'enderecoProfissional', 'sexo', 'nomeEmCitacoesBibliograficas',
+	'atualizacaoCV', 'textoResumo', 'foto',
+
+	'listaIDLattesColaboradores', 'listaFormacaoAcademica', 'listaProjetoDePesquisa', 'listaAreaDeAtuacao',
+	'listaIdioma', 'listaPremioOuTitulo',
+
+	# Produção bibliográfica
+	'listaArtigoEmPeriodico', 'listaLivroPublicado', 'listaCapituloDeLivroPublicado', 'listaTextoEmJornalDeNoticia',
+	'listaTrabalhoCompletoEmCongresso', 'listaResumoExpandidoEmCongresso', 'listaResumoEmCongresso',
+	'listaArtigoAceito', 'listaApresentacaoDeTrabalho', 'listaOutroTipoDeProducaoBibliografica',
+
+	# Produção técnica
+	'listaSoftwareComPatente', 'listaSoftwareSemPatente', 'listaProdutoTecnologico', 'listaProcessoOuTecnica',
+	'listaTrabalhoTecnico', 'listaOutroTipoDeProducaoTecnica',
+
+	# Patentes e registros
+	'listaPatente', 'listaProgramaComputador', 'listaDesenhoIndustrial',
+
+	# Produção artística
+	'listaProducaoArtistica',
+
+	# Orientações em andamento
+	'listaOASupervisaoDePosDoutorado', 'listaOATeseDeDoutorado', 'listaOADissertacaoDeMestrado',
+	'listaOAMonografiaDeEspecializacao', 'listaOATCC', 'listaOAIniciacaoCientifica', 'listaOAOutroTipoDeOrientacao',
+
+	# Orientações concluídas
+	'listaOCSupervisaoDePosDoutorado', 'listaOCTeseDeDoutorado', 'listaOCDissertacaoDeMestrado',
+	'listaOCMonografiaDeEspecializacao', 'listaOCTCC', 'listaOCIniciacaoCientifica', 'listaOCOutroTipoDeOrientacao',
+
+	# Eventos
+	'listaParticipacaoEmEvento', 'listaOrganizacaoDeEvento',
+]
+
+# atributos do perfil (identificação e endereço) de pessoas que não são membros do grupo
+ATRIBUTOS_DO_PERFIL = ['nomeCompleto', 'enderecoProfissional', 'foto', 'atualizacaoCV']
+
 class Membro:
 	idLattes = None # ID Lattes
 	idMembro = None
@@ -64,6 +105,8 @@ class Membro:
 	itemsDesdeOAno = '' # periodo global
 	itemsAteOAno = ''   # periodo global
 	diretorioCache = '' # diretorio de armazento de CVs (útil para extensas listas de CVs)
+	usarTidy = 1 # CV HTML processado com tidy antes do HTMLParser
+	cvLattesHTML = None # CV baixado previamente (quando não existe diretorio de cache)
 
 	listaFormacaoAcademica = []
 	listaProjetoDePesquisa = []
@@ -133,7 +176,7 @@ class Membro:
 	rotuloCorBG = ''
 
 	###def __init__(self, idMembro, identificador, nome, periodo, rotulo, itemsDesdeOAno, itemsAteOAno, xml=''):
-	def __init__(self, idMembro, identificador, nome, periodo, rotulo, itemsDesdeOAno, itemsAteOAno, diretorioCache):
+	def __init__(self, idMembro, identificador, nome, periodo, rotulo, itemsDesdeOAno, itemsAteOAno, diretorioCache, usarTidy=1):
 		self.idMembro = idMembro
 		self.idLattes = identificador
 		self.nomeInicial = nome
@@ -154,6 +197,7 @@ class Membro:
 		self.itemsAteOAno = itemsAteOAno
 		self.criarListaDePeriodos(self.periodo)
 		self.diretorioCache = diretorioCache
+		self.usarTidy = usarTidy
 
 
 	
@@ -184,6 +228,27 @@ class Membro:
 					print "[AVISO IMPORTANTE] CV Lattes: "+self.idLattes+". Membro: "+self.nomeInicial.encode('utf8')+"\n"
 		
 
+	def baixarCVLattes(self, atualizar=False):
+		# baixamos o CV (caso não esteja no cache ou se 'atualizar') para ser processado depois por carregarDadosCVLattes
+		cvPath = self.diretorioCache+'/'+self.idLattes
+
+		if 'xml' in cvPath or '0000000000000000'==self.idLattes:
+			return
+		if os.path.exists(cvPath) and not atualizar:
+			return
+
+		cvLattesHTML = baixaCVLattes(self.idLattes)
+		if not self.diretorioCache=='':
+			# o arquivo anterior só é substituído depois do download completo
+			file = open(cvPath+'.tmp', 'w')
+			file.write(cvLattesHTML)
+			file.close()
+			os.rename(cvPath+'.tmp', cvPath)
+			print " (*) O CV está sendo armazenado no Cache: "+cvPath
+		else:
+			self.cvLattesHTML = cvLattesHTML
+
+
 	def carregarDadosCVLattes(self):
 		cvPath = self.diretorioCache+'/'+self.idLattes
 
@@ -192,10 +257,7 @@ class Membro:
 			cvLattesXML = arquivoX.read()
 			arquivoX.close()
 
-			extended_chars= u''.join(unichr(c) for c in xrange(127, 65536, 1)) # srange(r"[\0x80-\0x7FF]")
-			special_chars = ' -'''
-			cvLattesXML   = cvLattesXML.decode('iso-8859-1','replace')+extended_chars+special_chars
-			parser        = ParserLattesXML(self.idMembro, cvLattesXML)
+			parser = ParserLattesXML(self.idMembro, decodificarCVLattes(cvLattesXML))
 
 			self.idLattes = parser.idLattes
 			self.url      = parser.url
@@ -208,100 +270,70 @@ class Membro:
 			return 
 
 		else:
-			if os.path.exists(cvPath):
-				arquivoH = open(cvPath)
-				cvLattesHTML = arquivoH.read()
-				if self.idMembro!='':
-					print "(*) Utilizando CV armazenado no cache: "+cvPath
-			else:
-				cvLattesHTML = baixaCVLattes(self.idLattes)
-				if not self.diretorioCache=='':
-					file = open(cvPath, 'w')
-					file.write(cvLattesHTML)
-					file.close()
-					print " (*) O CV está sendo armazenado no Cache"
-
-			extended_chars= u''.join(unichr(c) for c in xrange(127, 65536, 1)) # srange(r"[\0x80-\0x7FF]")
-			special_chars = ' -'''
-			#cvLattesHTML  = cvLattesHTML.decode('ascii','replace')+extended_chars+special_chars                                          # Wed Jul 25 16:47:39 BRT 2012
-			cvLattesHTML  = cvLattesHTML.decode('iso-8859-1','replace')+extended_chars+special_chars
-			parser        = ParserLattes(self.idMembro, cvLattesHTML)
-			
-			p = re.compile('[a-zA-Z]+');
-			if p.match(self.idLattes):
-			  self.identificador10 = self.idLattes
-			  self.idLattes = parser.identificador16
-			  self.url = 'http://lattes.cnpq.br/'+self.idLattes
-			
+			cvLattesHTML = self.obterCVLattesHTML()
+			try:
+				self.atribuirDadosDoCV(carregarCVLattesHTML(self.idMembro, cvLattesHTML, self.diretorioCache, self.usarTidy))
+			finally:
+				fecharCVLattesHTML(cvLattesHTML)
+			return
+
+		self.atribuirDadosDoCV(dadosDoCVLattes(parser))
+
+
+	def obterCVLattesHTML(self):
+		# CV do cache, baixado previamente (baixarCVLattes sem cache) ou baixado agora.
+		# O CV do cache é devolvido como arquivo aberto (ver fecharCVLattesHTML): sem tidy
+		# o parser o lê diretamente em blocos.
+		cvPath = self.diretorioCache+'/'+self.idLattes
+		if os.path.exists(cvPath):
+			cvLattesHTML = open(cvPath)
+			if self.idMembro!='':
+				print "(*) Utilizando CV armazenado no cache: "+cvPath
+		elif self.cvLattesHTML is not None:
+			cvLattesHTML = self.cvLattesHTML
+			self.cvLattesHTML = None
+		else:
+			cvLattesHTML = baixaCVLattes(self.idLattes)
+			if not self.diretorioCache=='':
+				file = open(cvPath, 'w')
+				file.write(cvLattesHTML)
+				file.close()
+				print " (*) O CV está sendo armazenado no Cache"
+		return cvLattesHTML
+
+
+	def carregarPerfilCVLattes(self):
+		# somente identificação e endereço (ver Grupo.carregarPerfisCVLattes)
+		cvLattesHTML = self.obterCVLattesHTML()
+		try:
+			self.atribuirPerfilDoCV(carregarPerfilCVLattesHTML(cvLattesHTML, self.usarTidy))
+		finally:
+			fecharCVLattesHTML(cvLattesHTML)
+
+
+	def atribuirPerfilDoCV(self, perfil):
+		p = re.compile('[a-zA-Z]+');
+		if perfil.get('identificador16') is not None and p.match(self.idLattes):
+		  self.identificador10 = self.idLattes
+		  self.idLattes = perfil['identificador16']
+		  self.url = 'http://lattes.cnpq.br/'+self.idLattes
+		for atributo in ATRIBUTOS_DO_PERFIL:
+			setattr(self, atributo, perfil[atributo])
+
+
+	def atribuirDadosDoCV(self, dados):
+		# dados: dicionario gerado por dadosDoCVLattes (possivelmente em outro processo)
+		p = re.compile('[a-zA-Z]+');
+		if dados.get('identificador16') is not None and p.match(self.idLattes):
+		  self.identificador10 = self.idLattes
+		  self.idLattes = dados['identificador16']
+		  self.url = 'http://lattes.cnpq.br/'+self.idLattes
+
 		# -----------------------------------------------------------------------------------------
 		# Obtemos todos os dados do CV Lattes
-		self.nomeCompleto                 = parser.nomeCompleto
-		self.bolsaProdutividade           = parser.bolsaProdutividade
-		self.enderecoProfissional         = parser.enderecoProfissional
-		self.sexo                         = parser.sexo
-		self.nomeEmCitacoesBibliograficas = parser.nomeEmCitacoesBibliograficas
-		self.atualizacaoCV                = parser.atualizacaoCV
-		self.textoResumo                  = parser.textoResumo
-		self.foto                         = parser.foto
-
-		self.listaIDLattesColaboradores = parser.listaIDLattesColaboradores
-		self.listaFormacaoAcademica     = parser.listaFormacaoAcademica
-		self.listaProjetoDePesquisa     = parser.listaProjetoDePesquisa
-		self.listaAreaDeAtuacao         = parser.listaAreaDeAtuacao
-		self.listaIdioma                = parser.listaIdioma
-		self.listaPremioOuTitulo        = parser.listaPremioOuTitulo
+		for atributo in ATRIBUTOS_DO_CV:
+			setattr(self, atributo, dados[atributo])
 		self.listaIDLattesColaboradoresUnica = sets.Set(self.listaIDLattesColaboradores)
-		
-		# Produção bibliográfica
-		self.listaArtigoEmPeriodico           = parser.listaArtigoEmPeriodico
-		self.listaLivroPublicado              = parser.listaLivroPublicado
-		self.listaCapituloDeLivroPublicado    = parser.listaCapituloDeLivroPublicado
-		self.listaTextoEmJornalDeNoticia      = parser.listaTextoEmJornalDeNoticia
-		self.listaTrabalhoCompletoEmCongresso = parser.listaTrabalhoCompletoEmCongresso
-		self.listaResumoExpandidoEmCongresso  = parser.listaResumoExpandidoEmCongresso
-		self.listaResumoEmCongresso           = parser.listaResumoEmCongresso
-		self.listaArtigoAceito                = parser.listaArtigoAceito
-		self.listaApresentacaoDeTrabalho      = parser.listaApresentacaoDeTrabalho
-		self.listaOutroTipoDeProducaoBibliografica = parser.listaOutroTipoDeProducaoBibliografica
-
-		# Produção técnica
-		self.listaSoftwareComPatente          = parser.listaSoftwareComPatente
-		self.listaSoftwareSemPatente          = parser.listaSoftwareSemPatente
-		self.listaProdutoTecnologico          = parser.listaProdutoTecnologico
-		self.listaProcessoOuTecnica           = parser.listaProcessoOuTecnica
-		self.listaTrabalhoTecnico             = parser.listaTrabalhoTecnico
-		self.listaOutroTipoDeProducaoTecnica  = parser.listaOutroTipoDeProducaoTecnica
-
-		# Patentes e registros	
-		self.listaPatente          			  = parser.listaPatente
-		self.listaProgramaComputador          = parser.listaProgramaComputador
-		self.listaDesenhoIndustrial           = parser.listaDesenhoIndustrial
-				
-		# Produção artística
-		self.listaProducaoArtistica = parser.listaProducaoArtistica
-
-		# Orientações em andamento
-		self.listaOASupervisaoDePosDoutorado  = parser.listaOASupervisaoDePosDoutorado
-		self.listaOATeseDeDoutorado           = parser.listaOATeseDeDoutorado
-		self.listaOADissertacaoDeMestrado     = parser.listaOADissertacaoDeMestrado
-		self.listaOAMonografiaDeEspecializacao= parser.listaOAMonografiaDeEspecializacao
-		self.listaOATCC                       = parser.listaOATCC
-		self.listaOAIniciacaoCientifica       = parser.listaOAIniciacaoCientifica
-		self.listaOAOutroTipoDeOrientacao     = parser.listaOAOutroTipoDeOrientacao
-
-		# Orientações concluídas
-		self.listaOCSupervisaoDePosDoutorado  = parser.listaOCSupervisaoDePosDoutorado
-		self.listaOCTeseDeDoutorado           = parser.listaOCTeseDeDoutorado
-		self.listaOCDissertacaoDeMestrado     = parser.listaOCDissertacaoDeMestrado
-		self.listaOCMonografiaDeEspecializacao= parser.listaOCMonografiaDeEspecializacao
-		self.listaOCTCC                       = parser.listaOCTCC
-		self.listaOCIniciacaoCientifica       = parser.listaOCIniciacaoCientifica
-		self.listaOCOutroTipoDeOrientacao     = parser.listaOCOutroTipoDeOrientacao
-
-		# Eventos
-		self.listaParticipacaoEmEvento        = parser.listaParticipacaoEmEvento
-		self.listaOrganizacaoDeEvento         = parser.listaOrganizacaoDeEvento
-
 		# -----------------------------------------------------------------------------------------
 
 
@@ -618,6 +650,110 @@ class Membro:
 
 		return s
 
+# ---------------------------------------------------------------------------- #
+# Nas funções abaixo cvLattesHTML é o CV (string) ou o arquivo do cache já aberto.
+def processarCVLattesHTML(idMembro, cvLattesHTML, usarTidy=1, somenteIdentificacao=False):
+	if not usarTidy:
+		# o CV é decodificado e entregue ao parser em blocos (o arquivo do cache é lido diretamente)
+		if isinstance(cvLattesHTML, basestring):
+			cvLattesHTML = cStringIO.StringIO(cvLattesHTML)
+		return ParserLattes(idMembro, cvLattesHTML, usarTidy=False, somenteIdentificacao=somenteIdentificacao)
+	if not isinstance(cvLattesHTML, basestring):
+		cvLattesHTML = cvLattesHTML.read()
+	return ParserLattes(idMembro, decodificarCVLattes(cvLattesHTML), somenteIdentificacao=somenteIdentificacao)
+
+def fecharCVLattesHTML(cvLattesHTML):
+	if not isinstance(cvLattesHTML, basestring):
+		cvLattesHTML.close()
+
+def dadosDoCVLattes(parser):
+	# registro compacto (e serializavel com pickle) dos dados extraidos do CV
+	dados = dict((atributo, getattr(parser, atributo)) for atributo in ATRIBUTOS_DO_CV)
+	dados['identificador16'] = getattr(parser, 'identificador16', None)
+	return dados
+
+def perfilDoCVLattes(dados):
+	perfil = dict((atributo, dados[atributo]) for atributo in ATRIBUTOS_DO_PERFIL)
+	perfil['identificador16'] = dados.get('identificador16')
+	return perfil
+
+def carregarPerfilCVLattesHTML(cvLattesHTML, usarTidy=1):
+	# somente a identificação é lida (sem tidy, a leitura termina antes do restante do CV)
+	return perfilDoCVLattes(dadosDoCVLattes(processarCVLattesHTML('', cvLattesHTML, usarTidy, somenteIdentificacao=True)))
+
+def carregarPerfilCVLattesEmCache(tarefa):
+	# executado nos processos de Grupo.carregarPerfisCVLattes; somente o perfil é devolvido ao processo principal
+	(idLattes, cvPath, usarTidy) = tarefa
+	cvLattesHTML = open(cvPath)
+	try:
+		return (idLattes, carregarPerfilCVLattesHTML(cvLattesHTML, usarTidy))
+	finally:
+		cvLattesHTML.close()
+
+def processarCVLattesEmCache(tarefa):
+	# executado nos processos de Grupo.processarCVsLattesEmCache
+	(idMembro, cvPath, diretorioCache, usarTidy) = tarefa
+	cvLattesHTML = open(cvPath)
+	try:
+		return (idMembro, carregarCVLattesHTML(idMembro, cvLattesHTML, diretorioCache, usarTidy))
+	finally:
+		cvLattesHTML.close()
+
+# ---------------------------------------------------------------------------- #
+# Cache de CVs processados: o registro de dadosDoCVLattes é armazenado em
+# <diretorioCache>/processados/, indexado pelo hash do CV (HTML), pelo idMembro
+# (presente nos items do CV), pela versão do parser e pelo uso do tidy.
+def carregarCVLattesHTML(idMembro, cvLattesHTML, diretorioCache, usarTidy=1):
+	arquivo = caminhoDoCVProcessado(idMembro, cvLattesHTML, diretorioCache, usarTidy)
+	if arquivo is not None and os.path.exists(arquivo):
+		dados = lerCVProcessado(arquivo)
+		if dados is not None:
+			return dados
+
+	dados = dadosDoCVLattes(processarCVLattesHTML(idMembro, cvLattesHTML, usarTidy))
+	if arquivo is not None:
+		salvarCVProcessado(arquivo, dados)
+	return dados
+
+def caminhoDoCVProcessado(idMembro, cvLattesHTML, diretorioCache, usarTidy=1):
+	if diretorioCache=='':
+		return None
+	versao = VERSAO_DO_PARSER if usarTidy else VERSAO_DO_PARSER+'-sem-tidy'
+	chave = hashlib.sha1(versao+'|'+str(idMembro)+'|')
+	if isinstance(cvLattesHTML, basestring):
+		chave.update(cvLattesHTML)
+	else:
+		# arquivo do cache: lido em blocos e reposicionado no inicio para o parser
+		for bloco in iter(lambda: cvLattesHTML.read(TAMANHO_DO_BLOCO), ''):
+			chave.update(bloco)
+		cvLattesHTML.seek(0)
+	chave = chave.hexdigest()
+	return os.path.join(diretorioCache, 'processados', chave)
+
+def lerCVProcessado(arquivo):
+	try:
+		arquivoP = open(arquivo, 'rb')
+		(versao, dados) = cPickle.load(arquivoP)
+		arquivoP.close()
+	except Exception:
+		return None
+	if not versao==VERSAO_DO_PARSER:
+		return None
+	return dados
+
+def salvarCVProcessado(arquivo, dados):
+	try:
+		diretorio = os.path.dirname(arquivo)
+		if not os.path.exists(diretorio):
+			os.makedirs(diretorio)
+		temporario = arquivo+'.'+str(os.getpid())
+		arquivoP = open(temporario, 'wb')
+		cPickle.dump((VERSAO_DO_PARSER, dados), arquivoP, cPickle.HIGHEST_PROTOCOL)
+		arquivoP.close()
+		os.rename(temporario, arquivo)
+	except Exception, e:
+		print "[AVISO] Nao foi possivel armazenar o CV processado no cache: "+str(e)
+
 # ---------------------------------------------------------------------------- #
 # http://wiki.python.org/moin/EscapingHtml
 def htmlentitydecode(s):                                                                               
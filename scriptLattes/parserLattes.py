@@ -26,6 +26,7 @@
 import HTMLParser
 import re
 import string
+import codecs
 from tidylib import tidy_document
 from htmlentitydefs import name2codepoint
 
@@ -67,6 +68,126 @@ from orientacoes.orientacaoConcluida import *
 from eventos.organizacaoDeEvento import *
 from eventos.participacaoEmEvento import *
 
+# versão do resultado do parser (usada no cache de CVs processados).
+# Deve ser alterada sempre que mudarem os dados extraídos dos CVs.
+VERSAO_DO_PARSER = '2'
+
+# contornamos alguns erros do HTML da Plataforma Lattes (substituições feitas numa única passada)
+CORRECOES_DO_HTML = {'<![CDATA[': '', ']]>': '', '<x<': '&lt;x&lt;', '<X<': '&lt;X&lt;'}
+padraoDeCorrecoesDoHTML = re.compile('|'.join(re.escape(c) for c in CORRECOES_DO_HTML))
+TAMANHO_MAXIMO_DE_CORRECAO = max(len(c) for c in CORRECOES_DO_HTML)
+
+# tamanho dos blocos lidos (e entregues ao HTMLParser) na leitura sem tidy
+TAMANHO_DO_BLOCO = 65536
+# no modo somenteIdentificacao (o cabeçalho e a identificação ocupam poucos KB)
+TAMANHO_DO_BLOCO_DA_IDENTIFICACAO = 4096
+
+# ---------------------------------------------------------------------------- #
+# Reconhecimento das seções do CV (handle_data). Cada texto é procurado uma
+# única vez num dicionário, em vez de ser comparado com todos os cabeçalhos.
+
+# cabeçalhos das seções (h1): texto -> indicador da seção atual
+SECOES_DO_CV = {
+	u'Identificação': 'achouIdentificacao',
+	u'Endereço': 'achouEndereco',
+	u'Formação acadêmica/titulação': 'achouFormacaoAcademica',
+	u'Atuação Profissional': 'achouAtuacaoProfissional',
+	u'Projetos de pesquisa': 'achouProjetoDePesquisa',
+	u'Membro de corpo editorial': 'achouMembroDeCorpoEditorial',
+	u'Revisor de periódico': 'achouRevisorDePeriodico',
+	u'Áreas de atuação': 'achouAreaDeAtuacao',
+	u'Idiomas': 'achouIdioma',
+	u'Prêmios e títulos': 'achouPremioOuTitulo',
+	u'Produções': 'achouProducoes',
+	u'Bancas': 'achouBancas',
+	u'Eventos': 'achouEventos',
+	u'Orientações': 'achouOrientacoes',
+	u'Patentes e registros': 'achouPatenteRegistro',
+	u'Outras informações relevantes': 'achouOutrasInformacoesRelevantes',
+}
+
+# seções lidas no modo somenteIdentificacao (o cabeçalho do CV vem antes delas); a leitura
+# termina no cabeçalho da seção seguinte
+SECOES_DA_IDENTIFICACAO = frozenset(['achouIdentificacao', 'achouEndereco'])
+
+# grupos de indicadores mutuamente exclusivos (apenas uma subseção atual por grupo)
+PATENTES_E_REGISTROS = ('achouPatente', 'achouProgramaComputador', 'achouDesenhoIndustrial')
+TIPOS_DE_PRODUCAO = ('achouProducaoEmCTA', 'achouProducaoTecnica', 'achouProducaoArtisticaCultural')
+PRODUCOES_BIBLIOGRAFICAS = ('achouArtigoEmPeriodico', 'achouLivroPublicado', 'achouCapituloDeLivroPublicado',
+	'achouTextoEmJornalDeNoticia', 'achouTrabalhoCompletoEmCongresso', 'achouResumoExpandidoEmCongresso',
+	'achouResumoEmCongresso', 'achouArtigoAceito', 'achouApresentacaoDeTrabalho', 'achouOutroTipoDeProducaoBibliografica')
+PRODUCOES_TECNICAS = ('achouSoftwareComPatente', 'achouSoftwareSemPatente', 'achouProdutoTecnologico',
+	'achouProcessoOuTecnica', 'achouTrabalhoTecnico', 'achouOutroTipoDeProducaoTecnica')
+EVENTOS = ('achouParticipacaoEmEvento', 'achouOrganizacaoDeEvento')
+SITUACOES_DE_ORIENTACAO = ('achouOrientacoesEmAndamento', 'achouOrientacoesConcluidas')
+TIPOS_DE_ORIENTACAO = ('achouSupervisaoDePosDoutorado', 'achouTeseDeDoutorado', 'achouDissertacaoDeMestrado',
+	'achouMonografiaDeEspecializacao', 'achouTCC', 'achouIniciacaoCientifica', 'achouOutroTipoDeOrientacao')
+
+# subseções: texto -> [(indicadores que devem estar ativos, grupo, indicador selecionado, salvarItem)]
+SUBSECOES_DO_CV = {}
+
+def registrarSubsecoes(condicoes, grupo, salvarItem, subsecoes):
+	for (texto, indicador) in subsecoes:
+		SUBSECOES_DO_CV.setdefault(texto, []).append((condicoes, grupo, indicador, salvarItem))
+
+registrarSubsecoes(('achouIdentificacao',), (), None, [
+	(u'Nome em citações bibliográficas', 'achouNomeEmCitacoes'),
+	(u'Sexo', 'achouSexo')])
+registrarSubsecoes(('achouEndereco',), (), None, [
+	(u'Endereço Profissional', 'achouEnderecoProfissional')])
+registrarSubsecoes(('achouPatenteRegistro',), PATENTES_E_REGISTROS, 1, [
+	(u'Patente', 'achouPatente'),
+	(u'Programa de computador', 'achouProgramaComputador'),
+	(u'Desenho industrial', 'achouDesenhoIndustrial')])
+registrarSubsecoes(('achouProducoes',), TIPOS_DE_PRODUCAO, None, [
+	(u'Produção bibliográfica', 'achouProducaoEmCTA'),
+	(u'Produção técnica', 'achouProducaoTecnica'),
+	(u'Produção artística/cultural', 'achouProducaoArtisticaCultural')])
+registrarSubsecoes(('achouProducoes',), TIPOS_DE_PRODUCAO, 0, [
+	(u'Demais trabalhos', None)])
+registrarSubsecoes(('achouProducoes', 'achouProducaoEmCTA'), PRODUCOES_BIBLIOGRAFICAS, 1, [
+	(u'Artigos completos publicados em periódicos', 'achouArtigoEmPeriodico'),
+	(u'Livros publicados/organizados ou edições', 'achouLivroPublicado'),
+	(u'Capítulos de livros publicados', 'achouCapituloDeLivroPublicado'),
+	(u'Textos em jornais de notícias/revistas', 'achouTextoEmJornalDeNoticia'),
+	(u'Trabalhos completos publicados em anais de congressos', 'achouTrabalhoCompletoEmCongresso'),
+	(u'Resumos expandidos publicados em anais de congressos', 'achouResumoExpandidoEmCongresso'),
+	# u'Resumos publicados em anais de congressos': ver handle_data (o texto pode conter outras palavras)
+	(u'Artigos aceitos para publicação', 'achouArtigoAceito'),
+	(u'Apresentações de Trabalho', 'achouApresentacaoDeTrabalho'),
+	(u'Outras produções bibliográficas', 'achouOutroTipoDeProducaoBibliografica')])
+registrarSubsecoes(('achouProducoes', 'achouProducaoTecnica'), PRODUCOES_TECNICAS, 1, [
+	(u'Programas de computador com registro de patente', 'achouSoftwareComPatente'),
+	(u'Programas de computador sem registro de patente', 'achouSoftwareSemPatente'),
+	(u'Produtos tecnológicos', 'achouProdutoTecnologico'),
+	(u'Processos ou técnicas', 'achouProcessoOuTecnica'),
+	(u'Trabalhos técnicos', 'achouTrabalhoTecnico'),
+	(u'Demais tipos de produção técnica', 'achouOutroTipoDeProducaoTecnica')])
+registrarSubsecoes(('achouProducoes', 'achouProducaoArtisticaCultural'), (), 1, [
+	# separar as listas de producoes artisticas por tipos
+	(u'Outras produções artísticas/culturais', 'achouOutraProducaoArtisticaCultural'),
+	(u'Artes Cênicas', 'achouOutraProducaoArtisticaCultural'),
+	(u'Música', 'achouOutraProducaoArtisticaCultural')])
+registrarSubsecoes(('achouBancas',), (), 0, [
+	(u'Participação em bancas de trabalhos de conclusão', None)])
+registrarSubsecoes(('achouEventos',), EVENTOS, 1, [
+	(u'Participação em eventos, congressos, exposições e feiras', 'achouParticipacaoEmEvento'),
+	(u'Organização de eventos, congressos, exposições e feiras', 'achouOrganizacaoDeEvento')])
+registrarSubsecoes(('achouOrientacoes',), SITUACOES_DE_ORIENTACAO, None, [
+	(u'Orientações e supervisões em andamento', 'achouOrientacoesEmAndamento'),
+	(u'Orientações e supervisões concluídas', 'achouOrientacoesConcluidas')])
+registrarSubsecoes(('achouOrientacoes',), TIPOS_DE_ORIENTACAO, 1, [
+	(u'Supervisão de pós-doutorado', 'achouSupervisaoDePosDoutorado'),
+	(u'Tese de doutorado', 'achouTeseDeDoutorado'),
+	(u'Dissertação de mestrado', 'achouDissertacaoDeMestrado'),
+	(u'Monografia de conclusão de curso de aperfeiçoamento/especialização', 'achouMonografiaDeEspecializacao'),
+	(u'Trabalho de conclusão de curso de graduação', 'achouTCC'),
+	# u'Iniciação científica': ver handle_data (o texto pode conter outras palavras)
+	(u'Iniciação Científica', 'achouIniciacaoCientifica'),
+	(u'Orientações de outra natureza', 'achouOutroTipoDeOrientacao')])
+
+# tags tratadas em handle_starttag
+TAGS_DE_INICIO = frozenset(['h1', 'h2', 'li', 'p', 'br', 'img', 'span', 'div', 'a'])
 
 class ParserLattes(HTMLParser):
 	
@@ -118,6 +239,9 @@ class ParserLattes(HTMLParser):
 	
 	recuperarIdentificador16 = None
 
+	somenteIdentificacao = 0
+	identificacaoConcluida = 0
+
 
 	achouGrupo = None
 	achouEnderecoProfissional = None
@@ -233,15 +357,20 @@ class ParserLattes(HTMLParser):
 	complemento = ''
 
 	# ------------------------------------------------------------------------ #
-	def __init__(self, idMembro, cvLattesHTML):
+	def __init__(self, idMembro, cvLattesHTML, usarTidy=True, somenteIdentificacao=False):
+		# cvLattesHTML: CV decodificado (unicode) ou, sem tidy, um arquivo aberto (ISO-8859-1)
+		# somenteIdentificacao: lê apenas o cabeçalho (nome, foto, identificador16, atualização) e as
+		# seções de identificação e endereço; o restante do CV não é lido (nenhuma produção é criada)
 		HTMLParser.__init__(self)
 
 		# inicializacao obrigatoria
 		self.idMembro = idMembro
+		self.somenteIdentificacao = somenteIdentificacao
+		self.identificacaoConcluida = 0
 		self.sexo = 'Masculino'
 		self.nomeCompleto = u'[Nome-nao-identificado]'
 
-		self.item = ''
+		self.item = BufferDeItem()
 		self.issn = ''
 		self.listaIDLattesColaboradores = []
 		self.listaFormacaoAcademica = []
@@ -304,11 +433,12 @@ class ParserLattes(HTMLParser):
 		self.idOrientando = ''
 		self.complemento = ''
 
+		if not usarTidy:
+			self.alimentarEmBlocos(cvLattesHTML)
+			return
+
 		# contornamos alguns erros do HTML da Plataforma Lattes
-		cvLattesHTML = cvLattesHTML.replace("<![CDATA[","")
-		cvLattesHTML = cvLattesHTML.replace("]]>","")
-		cvLattesHTML = cvLattesHTML.replace("<x<","&lt;x&lt;")
-		cvLattesHTML = cvLattesHTML.replace("<X<","&lt;X&lt;")
+		cvLattesHTML = corrigirHTML(cvLattesHTML)
 
 		# feed it!
 		cvLattesHTML, errors = tidy_document(cvLattesHTML, options={'numeric-entities':1})
@@ -319,7 +449,56 @@ class ParserLattes(HTMLParser):
 		# options = dict(output_xhtml=1, add_xml_decl=1, indent=1, tidy_mark=0)
 		# cvLattesHTML = str(tidy.parseString(cvLattesHTML, **options)).decode("utf8")
 
-		self.feed(cvLattesHTML)
+		self.alimentar(cvLattesHTML)
+
+	def alimentar(self, cvLattesHTML):
+		if not self.somenteIdentificacao:
+			self.feed(cvLattesHTML)
+			return
+
+		# o documento é entregue em blocos (terminados antes de um '<') até o fim da identificação
+		inicio = 0
+		while inicio<len(cvLattesHTML) and not self.identificacaoConcluida:
+			fim = cvLattesHTML.find('<', inicio+TAMANHO_DO_BLOCO_DA_IDENTIFICACAO)
+			if fim==-1:
+				fim = len(cvLattesHTML)
+			self.feed(cvLattesHTML[inicio:fim])
+			inicio = fim
+
+	def alimentarEmBlocos(self, cvLattesHTML):
+		# leitura numa única passada, sem tidy: o HTMLParser recebe o CV em blocos já corrigidos,
+		# sem cópias do documento completo. Os eventos (handle_starttag, handle_endtag e handle_data)
+		# são idênticos aos obtidos entregando o documento corrigido de uma só vez.
+		tamanho = TAMANHO_DO_BLOCO_DA_IDENTIFICACAO if self.somenteIdentificacao else TAMANHO_DO_BLOCO
+		if isinstance(cvLattesHTML, basestring):
+			blocos = (cvLattesHTML[i:i+tamanho] for i in xrange(0, len(cvLattesHTML), tamanho))
+		else:
+			decodificador = codecs.getincrementaldecoder('iso-8859-1')('replace')
+			blocos = iter(lambda: decodificador.decode(cvLattesHTML.read(tamanho)), u'')
+
+		pendente = u''   # texto ainda não corrigido
+		restante = u''   # texto corrigido ainda não entregue ao HTMLParser
+		for bloco in blocos:
+			texto = pendente + bloco
+			# os ultimos caracteres podem ser o inicio de uma correção: ficam para o próximo bloco
+			corte = max(len(texto) - TAMANHO_MAXIMO_DE_CORRECAO + 1, 0)
+			for m in padraoDeCorrecoesDoHTML.finditer(texto):
+				if m.start() < corte < m.end():
+					corte = m.end()
+			restante += corrigirHTML(texto[:corte])
+			pendente = texto[corte:]
+
+			# o HTMLParser emite imediatamente o texto recebido (handle_data); para não partir os
+			# textos entregamos o bloco somente até o último '<'
+			fim = restante.rfind('<')
+			if fim>0:
+				self.feed(restante[:fim])
+				restante = restante[fim:]
+
+			if self.identificacaoConcluida:
+				return
+
+		self.feed(restante + corrigirHTML(pendente))
 
 	# ------------------------------------------------------------------------ #
 	
@@ -338,66 +517,59 @@ class ParserLattes(HTMLParser):
 	    self.issn = issn[0:4]+'-'+issn[4:8]
 	
 	def handle_starttag(self, tag, attributes):
+		if not tag in TAGS_DE_INICIO or self.identificacaoConcluida:
+			return
+		atributos = dict(attributes)
 
-		if tag=='h2':
-			for name, value in attributes:
-				if name=='class' and value=='nome':
-					self.salvarNome = 1
-					self.item = ''
-					break
+		if tag=='h2' and atributos.get('class')=='nome':
+			self.salvarNome = 1
+			self.item.limpar()
 		
 		if tag=='li':
 		    self.recuperarIdentificador16 = 1
 		    	      
-		if tag=='p':
-			for name, value in attributes:
-				if name=='class' and value=='resumo':
-					self.salvarTextoResumo = 1
-					self.item = ''
-					break
+		if tag=='p' and atributos.get('class')=='resumo':
+			self.salvarTextoResumo = 1
+			self.item.limpar()
 
 		if (tag=='br' or tag=='img') and self.salvarNome:
-			self.nomeCompleto = stripBlanks(self.item)
-			self.item = ''
+			self.nomeCompleto = self.item.normalizado()
+			self.item.limpar()
 			self.salvarNome = 0
 			self.salvarBolsaProdutividade = 1
 
 		if tag=='span' and self.salvarBolsaProdutividade:
-			self.item = ''
+			self.item.limpar()
 
 		if tag=='div':
 			self.citado = 0
 			
-			for name, value in attributes:
-			    if name == 'cvuri':
-			        self.parse_issn(value)
-			        
-			
-			for name, value in attributes:
-				if name=='class' and value=='title-wrapper':
-					self.umaUnidade = 1	
-					break
+			if 'cvuri' in atributos:
+				self.parse_issn(atributos['cvuri'])
+
+			if atributos.get('class')=='title-wrapper':
+				self.umaUnidade = 1
 
 			for name, value in attributes:
 				if name=='class' and value=='layout-cell-pad-5':
 					if self.achouNomeEmCitacoes:
 						self.salvarNomeEmCitacoes = 1
-						self.item = ''
+						self.item.limpar()
 
 					if self.achouSexo:
 						self.salvarSexo = 1
-						self.item = ''
+						self.item.limpar()
 
 					if self.achouEnderecoProfissional:
 						self.salvarEnderecoProfissional = 1
-						self.item = ''
+						self.item.limpar()
 
 					if self.salvarParte1:
 						self.salvarParte1 = 0
 						self.salvarParte2 = 1
 				
 				if name=='class' and value=='layout-cell-pad-5 text-align-right':
-					self.item = ''
+					self.item.limpar()
 					if self.achouFormacaoAcademica or self.achouAtuacaoProfissional or self.achouProjetoDePesquisa or self.achouMembroDeCorpoEditorial or self.achouRevisorDePeriodico or self.achouAreaDeAtuacao or self.achouIdioma or self.achouPremioOuTitulo or self.salvarItem: 
 						self.salvarParte1 = 1
 						self.salvarParte2 = 0
@@ -415,59 +587,31 @@ class ParserLattes(HTMLParser):
 		if tag=='h1' and self.umaUnidade: 
 			self.procurarCabecalho = 1
 
-			self.achouIdentificacao = 0
-			self.achouEndereco = 0
-			self.achouFormacaoAcademica = 0
-			self.achouAtuacaoProfissional = 0
-			self.achouProjetoDePesquisa = 0
-			self.achouMembroDeCorpoEditorial = 0
-			self.achouRevisorDePeriodico = 0
-			self.achouAreaDeAtuacao = 0
-			self.achouIdioma = 0
-			self.achouPremioOuTitulo = 0
-			self.achouProducoes = 0
-			#self.achouProducaoEmCTA = 0
-			#self.achouProducaoTecnica = 0
-			#self.achouProducaoArtisticaCultural = 0
-			self.achouBancas = 0
-			self.achouEventos = 0
-			self.achouOrientacoes = 0
-			self.achouOutrasInformacoesRelevantes = 0
+			for secao in SECOES_DO_CV.itervalues():
+				setattr(self, secao, 0)
 			self.salvarItem = 0
-			self.achouPatenteRegistro = 0
 
 		if tag=='img':
-			if self.salvarFoto: 
-				for name, value in attributes:
-					if name=='src' and u'servletrecuperafoto' in value:
-						self.foto = value
-						self.salvarFoto = 0
-						break
-
-			if self.salvarItem:
-				for name, value in attributes:
-					if name=='src' and u'ico_relevante' in value:
-						self.relevante = 1
-						break
-			    
-				"""for name,value in attributes:
-					if name=='data-issn':
-						if len(value) == 8:
-						    self.issn = value[0:4]+'-'+value[4:8]
-						break
-			    """ 
-			
-			
-			
+			src = atributos.get('src') or ''
+			if self.salvarFoto and u'servletrecuperafoto' in src:
+				self.foto = src
+				self.salvarFoto = 0
+
+			if self.salvarItem and u'ico_relevante' in src:
+				self.relevante = 1
+
+			"""for name,value in attributes:
+				if name=='data-issn':
+					if len(value) == 8:
+					    self.issn = value[0:4]+'-'+value[4:8]
+					break
+			"""
 
 		if tag=='br':
-			self.item = self.item + ' '
+			self.item.acrescentar(' ')
 		
-		if tag=='span':
-			if self.achouProducaoEmCTA:
-				for name, value in attributes:
-					if name=='class' and value==u'informacao-artigo':
-						self.spanInformacaoArtigo = 1
+		if tag=='span' and self.achouProducaoEmCTA and atributos.get('class')==u'informacao-artigo':
+			self.spanInformacaoArtigo = 1
 		
 		if tag=='a':
 			if self.salvarItem: # and self.achouArtigoEmPeriodico:
@@ -486,21 +630,24 @@ class ParserLattes(HTMLParser):
 
 	# ------------------------------------------------------------------------ #
 	def handle_endtag(self, tag):
+		if self.identificacaoConcluida:
+			return
+
 		# Informações do pesquisador (pre-cabecalho)
 		if tag=='h2':
 			if self.salvarNome:
- 				self.nomeCompleto = stripBlanks(self.item)
+ 				self.nomeCompleto = self.item.normalizado()
 				self.salvarNome = 0
 			if self.salvarBolsaProdutividade:
 				self.salvarBolsaProdutividade = 0
 
 		if tag=='p':
 			if self.salvarTextoResumo:
-				self.textoResumo = stripBlanks(self.item)
+				self.textoResumo = self.item.normalizado()
 				self.salvarTextoResumo = 0
 
 		if tag=='span' and self.salvarBolsaProdutividade:
-			self.bolsaProdutividade = stripBlanks(self.item)
+			self.bolsaProdutividade = self.item.normalizado()
 			self.bolsaProdutividade = re.sub('Bolsista de Produtividade em Pesquisa do CNPq - ','', self.bolsaProdutividade)
 			self.bolsaProdutividade = self.bolsaProdutividade.strip('()')
 			self.salvarBolsaProdutividade = 0
@@ -516,24 +663,24 @@ class ParserLattes(HTMLParser):
 
 		if tag=='div': 
 			if self.salvarNomeEmCitacoes:
-				self.nomeEmCitacoesBibliograficas = stripBlanks(self.item)
+				self.nomeEmCitacoesBibliograficas = self.item.normalizado()
 				self.salvarNomeEmCitacoes = 0
 				self.achouNomeEmCitacoes = 0
 			if self.salvarSexo:
-				self.sexo = stripBlanks(self.item)
+				self.sexo = self.item.normalizado()
 				self.salvarSexo = 0
 				self.achouSexo = 0
 			if self.salvarEnderecoProfissional:
-				self.enderecoProfissional = stripBlanks(self.item)
+				self.enderecoProfissional = self.item.normalizado()
 				self.enderecoProfissional = re.sub("\'", '', self.enderecoProfissional)
 				self.enderecoProfissional = re.sub("\"", '', self.enderecoProfissional)
 				self.salvarEnderecoProfissional = 0
 				self.achouEnderecoProfissional = 0
 			
 			if (self.salvarParte1 and not self.salvarParte2) or (self.salvarParte2 and not self.salvarParte1) :
-				if len(stripBlanks(self.item))>0:
-					self.partesDoItem.append(stripBlanks(self.item)) # acrescentamos cada celula da linha em uma lista!
-					self.item = ''
+				if len(self.item.normalizado())>0:
+					self.partesDoItem.append(self.item.normalizado()) # acrescentamos cada celula da linha em uma lista!
+					self.item.limpar()
 
 				if self.salvarParte2:
 					self.salvarParte1 = 0
@@ -739,9 +886,21 @@ class ParserLattes(HTMLParser):
 
 
 	# ------------------------------------------------------------------------ #
+	def selecionarSubsecao(self, grupo, indicador, salvarItem):
+		# desativa os indicadores do grupo e ativa o da subseção encontrada
+		for g in grupo:
+			setattr(self, g, 0)
+		if indicador is not None:
+			setattr(self, indicador, 1)
+		if salvarItem is not None:
+			self.salvarItem = salvarItem
+
 	def handle_data(self, dado):
+		if self.identificacaoConcluida:
+			return
+
 		if not self.spanInformacaoArtigo:
-			self.item = self.item + htmlentitydecode(dado)
+			self.item.acrescentar(htmlentitydecode(dado))
 
 		dado = stripBlanks(dado)
 			
@@ -752,372 +911,23 @@ class ParserLattes(HTMLParser):
 				self.salvarAtualizacaoCV = 0
 
 		if self.procurarCabecalho:
-			if u'Identificação'==dado:
-				self.achouIdentificacao = 1
-			if u'Endereço'==dado:
-				self.achouEndereco = 1
-			if u'Formação acadêmica/titulação'==dado:
-				self.achouFormacaoAcademica = 1
-			if u'Atuação Profissional'==dado:
-				self.achouAtuacaoProfissional = 1
-			if u'Projetos de pesquisa'==dado:
-				self.achouProjetoDePesquisa = 1
-			if u'Membro de corpo editorial'==dado:
-				self.achouMembroDeCorpoEditorial = 1
-			if u'Revisor de periódico'==dado:
-				self.achouRevisorDePeriodico = 1
-			if u'Áreas de atuação'==dado:
-				self.achouAreaDeAtuacao = 1
-			if u'Idiomas'==dado:
-				self.achouIdioma = 1
-			if u'Prêmios e títulos'==dado:
-				self.achouPremioOuTitulo = 1
-			if u'Produções'==dado:  # !---
-				self.achouProducoes = 1
-				#self.achouProducaoEmCTA = 1
-			#if u'Produção técnica'==dado:
-			#	self.achouProducaoTecnica = 1
-			#if u'Produção artística/cultural'==dado:
-			#	self.achouProducaoArtisticaCultural = 1
-			if u'Bancas'==dado:
-				self.achouBancas = 1
-			if u'Eventos'==dado:
-				self.achouEventos = 1
-			if u'Orientações'==dado:
-				self.achouOrientacoes = 1
-			if u'Patentes e registros'== dado:
-				self.achouPatenteRegistro = 1
-				#print "0==>>>>ACHOU PATENTE e REGISTRO"	
-			if u'Outras informações relevantes'==dado:
-				self.achouOutrasInformacoesRelevantes = 1
-			self.umaUnidade = 0	
-		if self.achouIdentificacao:
-			if u'Nome em citações bibliográficas'==dado:
-				self.achouNomeEmCitacoes = 1
-			if u'Sexo'==dado:
-				self.achouSexo = 1
-
-		if self.achouEndereco:
-			if u'Endereço Profissional'==dado:
-				self.achouEnderecoProfissional = 1
-
-		if self.achouPatenteRegistro:
-			if u'Patente'==dado:
-				self.salvarItem = 1
-				self.achouPatente = 1
-				self.achouProgramaComputador = 0
-				self.achouDesenhoIndustrial = 0					
-				#print "1==>>>>ACHOU PATENTE e REGISTRO"				
-			if u'Programa de computador'==dado:
-				self.salvarItem = 1
-				self.achouPatente = 0
-				self.achouProgramaComputador = 1
-				self.achouDesenhoIndustrial = 0	
-				#print "2==>>>>ACHOU PATENTE e REGISTRO"
-			if u'Desenho industrial'==dado:
-				self.salvarItem = 1
-				self.achouPatente = 0
-				self.achouProgramaComputador = 0
-				self.achouDesenhoIndustrial = 1			
-			
-		if self.achouProducoes:
-			if u'Produção bibliográfica'==dado:
-				self.achouProducaoEmCTA = 1
-				self.achouProducaoTecnica = 0
-				self.achouProducaoArtisticaCultural= 0
-			if u'Produção técnica'==dado:
-				self.achouProducaoEmCTA = 0
-				self.achouProducaoTecnica = 1
-				self.achouProducaoArtisticaCultural= 0
-			if u'Produção artística/cultural'==dado:
-				self.achouProducaoEmCTA = 0
-				self.achouProducaoTecnica = 0
-				self.achouProducaoArtisticaCultural= 1
-			
-			if u'Demais trabalhos'==dado:
-				self.salvarItem = 0
-				self.achouProducaoEmCTA = 0
-				self.achouProducaoTecnica = 0
-				self.achouProducaoArtisticaCultural= 0
-
-
-			if self.achouProducaoEmCTA:
-				if u'Artigos completos publicados em periódicos'==dado:
-					self.salvarItem = 1
-					self.achouArtigoEmPeriodico = 1
-					self.achouLivroPublicado = 0
-					self.achouCapituloDeLivroPublicado = 0
-					self.achouTextoEmJornalDeNoticia = 0
-					self.achouTrabalhoCompletoEmCongresso = 0
-					self.achouResumoExpandidoEmCongresso = 0
-					self.achouResumoEmCongresso = 0
-					self.achouArtigoAceito = 0
-					self.achouApresentacaoDeTrabalho = 0
-					self.achouOutroTipoDeProducaoBibliografica = 0
-				if u'Livros publicados/organizados ou edições'==dado:
-					self.salvarItem = 1
-					self.achouArtigoEmPeriodico = 0
-					self.achouLivroPublicado = 1
-					self.achouCapituloDeLivroPublicado = 0
-					self.achouTextoEmJornalDeNoticia = 0
-					self.achouTrabalhoCompletoEmCongresso = 0
-					self.achouResumoExpandidoEmCongresso = 0
-					self.achouResumoEmCongresso = 0
-					self.achouArtigoAceito = 0
-					self.achouApresentacaoDeTrabalho = 0
-					self.achouOutroTipoDeProducaoBibliografica = 0
-				if u'Capítulos de livros publicados'==dado:
-					self.salvarItem = 1
-					self.achouArtigoEmPeriodico = 0
-					self.achouLivroPublicado = 0
-					self.achouCapituloDeLivroPublicado = 1
-					self.achouTextoEmJornalDeNoticia = 0
-					self.achouTrabalhoCompletoEmCongresso = 0
-					self.achouResumoExpandidoEmCongresso = 0
-					self.achouResumoEmCongresso = 0
-					self.achouArtigoAceito = 0
-					self.achouApresentacaoDeTrabalho = 0
-					self.achouOutroTipoDeProducaoBibliografica = 0
-				if u'Textos em jornais de notícias/revistas'==dado:
-					self.salvarItem = 1
-					self.achouArtigoEmPeriodico = 0
-					self.achouLivroPublicado = 0
-					self.achouCapituloDeLivroPublicado = 0
-					self.achouTextoEmJornalDeNoticia = 1
-					self.achouTrabalhoCompletoEmCongresso = 0
-					self.achouResumoExpandidoEmCongresso = 0
-					self.achouResumoEmCongresso = 0
-					self.achouArtigoAceito = 0
-					self.achouApresentacaoDeTrabalho = 0
-					self.achouOutroTipoDeProducaoBibliografica = 0
-				if u'Trabalhos completos publicados em anais de congressos'==dado:
-					self.salvarItem = 1
-					self.achouArtigoEmPeriodico = 0
-					self.achouLivroPublicado = 0
-					self.achouCapituloDeLivroPublicado = 0
-					self.achouTextoEmJornalDeNoticia = 0
-					self.achouTrabalhoCompletoEmCongresso = 1
-					self.achouResumoExpandidoEmCongresso = 0
-					self.achouResumoEmCongresso = 0
-					self.achouArtigoAceito = 0
-					self.achouApresentacaoDeTrabalho = 0
-					self.achouOutroTipoDeProducaoBibliografica = 0
-				if u'Resumos expandidos publicados em anais de congressos'==dado:
-					self.salvarItem = 1
-					self.achouArtigoEmPeriodico = 0
-					self.achouLivroPublicado = 0
-					self.achouCapituloDeLivroPublicado = 0
-					self.achouTextoEmJornalDeNoticia = 0
-					self.achouTrabalhoCompletoEmCongresso = 0
-					self.achouResumoExpandidoEmCongresso = 1
-					self.achouResumoEmCongresso = 0
-					self.achouArtigoAceito = 0
-					self.achouApresentacaoDeTrabalho = 0
-					self.achouOutroTipoDeProducaoBibliografica = 0
-				if u'Resumos publicados em anais de congressos' in dado:
-					self.salvarItem = 1
-					self.achouArtigoEmPeriodico = 0
-					self.achouLivroPublicado = 0
-					self.achouCapituloDeLivroPublicado = 0
-					self.achouTextoEmJornalDeNoticia = 0
-					self.achouTrabalhoCompletoEmCongresso = 0
-					self.achouResumoExpandidoEmCongresso = 0
-					self.achouResumoEmCongresso = 1
-					self.achouArtigoAceito = 0
-					self.achouApresentacaoDeTrabalho = 0
-					self.achouOutroTipoDeProducaoBibliografica = 0
-				if u'Artigos aceitos para publicação'==dado:
-					self.salvarItem = 1
-					self.achouArtigoEmPeriodico = 0
-					self.achouLivroPublicado = 0
-					self.achouCapituloDeLivroPublicado = 0
-					self.achouTextoEmJornalDeNoticia = 0
-					self.achouTrabalhoCompletoEmCongresso = 0
-					self.achouResumoExpandidoEmCongresso = 0
-					self.achouResumoEmCongresso = 0
-					self.achouArtigoAceito = 1
-					self.achouApresentacaoDeTrabalho = 0
-					self.achouOutroTipoDeProducaoBibliografica = 0
-				if u'Apresentações de Trabalho'==dado:
-					self.salvarItem = 1
-					self.achouArtigoEmPeriodico = 0
-					self.achouLivroPublicado = 0
-					self.achouCapituloDeLivroPublicado = 0
-					self.achouTextoEmJornalDeNoticia = 0
-					self.achouTrabalhoCompletoEmCongresso = 0
-					self.achouResumoExpandidoEmCongresso = 0
-					self.achouResumoEmCongresso = 0
-					self.achouArtigoAceito = 0
-					self.achouApresentacaoDeTrabalho = 1
-					self.achouOutroTipoDeProducaoBibliografica = 0
-				if u'Outras produções bibliográficas'==dado:
-				#if u'Demais tipos de produção bibliográfica'==dado:
-					self.salvarItem = 1
-					self.achouArtigoEmPeriodico = 0
-					self.achouLivroPublicado = 0
-					self.achouCapituloDeLivroPublicado = 0
-					self.achouTextoEmJornalDeNoticia = 0
-					self.achouTrabalhoCompletoEmCongresso = 0
-					self.achouResumoExpandidoEmCongresso = 0
-					self.achouResumoEmCongresso = 0
-					self.achouArtigoAceito = 0
-					self.achouApresentacaoDeTrabalho = 0
-					self.achouOutroTipoDeProducaoBibliografica = 1
-
-
-			if self.achouProducaoTecnica:
-				#if u'Softwares com registro de patente'==dado:
-				if u'Programas de computador com registro de patente'==dado:
-					self.salvarItem = 1
-					self.achouSoftwareComPatente = 1
-					self.achouSoftwareSemPatente = 0
-					self.achouProdutoTecnologico = 0
-					self.achouProcessoOuTecnica = 0
-					self.achouTrabalhoTecnico = 0
-					self.achouOutroTipoDeProducaoTecnica = 0
-				if u'Programas de computador sem registro de patente'==dado:
-					self.salvarItem = 1
-					self.achouSoftwareComPatente = 0
-					self.achouSoftwareSemPatente = 1
-					self.achouProdutoTecnologico = 0
-					self.achouProcessoOuTecnica = 0
-					self.achouTrabalhoTecnico = 0
-					self.achouOutroTipoDeProducaoTecnica = 0
-				if u'Produtos tecnológicos'==dado:
-					self.salvarItem = 1
-					self.achouSoftwareComPatente = 0
-					self.achouSoftwareSemPatente = 0
-					self.achouProdutoTecnologico = 1
-					self.achouProcessoOuTecnica = 0
-					self.achouTrabalhoTecnico = 0
-					self.achouOutroTipoDeProducaoTecnica = 0
-				if u'Processos ou técnicas'==dado:
-					self.salvarItem = 1
-					self.achouSoftwareComPatente = 0
-					self.achouSoftwareSemPatente = 0
-					self.achouProdutoTecnologico = 0
-					self.achouProcessoOuTecnica = 1
-					self.achouTrabalhoTecnico = 0
-					self.achouOutroTipoDeProducaoTecnica = 0
-				if u'Trabalhos técnicos'==dado:
-					self.salvarItem = 1
-					self.achouSoftwareComPatente = 0
-					self.achouSoftwareSemPatente = 0
-					self.achouProdutoTecnologico = 0
-					self.achouProcessoOuTecnica = 0
-					self.achouTrabalhoTecnico = 1
-					self.achouOutroTipoDeProducaoTecnica = 0
-				if u'Demais tipos de produção técnica'==dado:
-					self.salvarItem = 1
-					self.achouSoftwareComPatente = 0
-					self.achouSoftwareSemPatente = 0
-					self.achouProdutoTecnologico = 0
-					self.achouProcessoOuTecnica = 0
-					self.achouTrabalhoTecnico = 0
-					self.achouOutroTipoDeProducaoTecnica = 1
-				#if u'Demais trabalhos'==dado:
-				#	self.salvarItem = 0
-				#	self.achouSoftwareComPatente = 0
-				#	self.achouSoftwareSemPatente = 0
-				#	self.achouProdutoTecnologico = 0
-				#	self.achouProcessoOuTecnica = 0
-				#	self.achouTrabalhoTecnico = 0
-				#	self.achouOutroTipoDeProducaoTecnica = 0
-    
-			if self.achouProducaoArtisticaCultural:
-				#if u'Produção artística/cultural'==dado:
-				if u'Outras produções artísticas/culturais'==dado or u'Artes Cênicas'==dado or u'Música'==dado:
-					# separar as listas de producoes artisticas por tipos 
-					self.salvarItem = 1
-					self.achouOutraProducaoArtisticaCultural = 1
-			
-		if self.achouBancas:
-			if u'Participação em bancas de trabalhos de conclusão'==dado:
-				self.salvarItem = 0
-
-		if self.achouEventos:
-			if u'Participação em eventos, congressos, exposições e feiras'==dado:
-				self.salvarItem = 1
-				self.achouParticipacaoEmEvento  = 1
-				self.achouOrganizacaoDeEvento = 0
-			if u'Organização de eventos, congressos, exposições e feiras'==dado:
-				self.salvarItem = 1
-				self.achouParticipacaoEmEvento  = 0
-				self.achouOrganizacaoDeEvento = 1
-
-		if self.achouOrientacoes:
-			if u'Orientações e supervisões em andamento'==dado:
-				self.achouOrientacoesEmAndamento  = 1
-				self.achouOrientacoesConcluidas = 0
-			if u'Orientações e supervisões concluídas'==dado:
-				self.achouOrientacoesEmAndamento  = 0
-				self.achouOrientacoesConcluidas = 1
-
-			# Tipos de orientações (em andamento ou concluídas)
-			if u'Supervisão de pós-doutorado'==dado:
-				self.salvarItem = 1
-				self.achouSupervisaoDePosDoutorado = 1
-				self.achouTeseDeDoutorado = 0
-				self.achouDissertacaoDeMestrado = 0
-				self.achouMonografiaDeEspecializacao = 0
-				self.achouTCC = 0
-				self.achouIniciacaoCientifica = 0
-				self.achouOutroTipoDeOrientacao = 0
-			if u'Tese de doutorado'==dado:
-				self.salvarItem = 1
-				self.achouSupervisaoDePosDoutorado = 0
-				self.achouTeseDeDoutorado = 1
-				self.achouDissertacaoDeMestrado = 0
-				self.achouMonografiaDeEspecializacao = 0
-				self.achouTCC = 0
-				self.achouIniciacaoCientifica = 0
-				self.achouOutroTipoDeOrientacao = 0
-			if u'Dissertação de mestrado'==dado:
-				self.salvarItem = 1
-				self.achouSupervisaoDePosDoutorado = 0
-				self.achouTeseDeDoutorado = 0
-				self.achouDissertacaoDeMestrado = 1
-				self.achouMonografiaDeEspecializacao = 0
-				self.achouTCC = 0
-				self.achouIniciacaoCientifica = 0
-				self.achouOutroTipoDeOrientacao = 0
-			if u'Monografia de conclusão de curso de aperfeiçoamento/especialização'==dado:
-				self.salvarItem = 1
-				self.achouSupervisaoDePosDoutorado = 0
-				self.achouTeseDeDoutorado = 0
-				self.achouDissertacaoDeMestrado = 0
-				self.achouMonografiaDeEspecializacao = 1
-				self.achouTCC = 0
-				self.achouIniciacaoCientifica = 0
-				self.achouOutroTipoDeOrientacao = 0
-			if u'Trabalho de conclusão de curso de graduação'==dado:
-				self.salvarItem = 1
-				self.achouSupervisaoDePosDoutorado = 0
-				self.achouTeseDeDoutorado = 0
-				self.achouDissertacaoDeMestrado = 0
-				self.achouMonografiaDeEspecializacao = 0
-				self.achouTCC = 1
-				self.achouIniciacaoCientifica = 0
-				self.achouOutroTipoDeOrientacao = 0
-			if u'Iniciação científica' in dado or u'Iniciação Científica'==dado:
-				self.salvarItem = 1
-				self.achouSupervisaoDePosDoutorado = 0
-				self.achouTeseDeDoutorado = 0
-				self.achouDissertacaoDeMestrado = 0
-				self.achouMonografiaDeEspecializacao = 0
-				self.achouTCC = 0
-				self.achouIniciacaoCientifica = 1
-				self.achouOutroTipoDeOrientacao = 0
-			if u'Orientações de outra natureza'==dado:
-				self.salvarItem = 1
-				self.achouSupervisaoDePosDoutorado = 0
-				self.achouTeseDeDoutorado = 0
-				self.achouDissertacaoDeMestrado = 0
-				self.achouMonografiaDeEspecializacao = 0
-				self.achouTCC = 0
-				self.achouIniciacaoCientifica = 0
-				self.achouOutroTipoDeOrientacao = 1
+			secao = SECOES_DO_CV.get(dado)
+			if secao is not None:
+				if self.somenteIdentificacao and not secao in SECOES_DA_IDENTIFICACAO:
+					self.identificacaoConcluida = 1
+					return
+				setattr(self, secao, 1)
+			self.umaUnidade = 0
 
+		for (condicoes, grupo, indicador, salvarItem) in SUBSECOES_DO_CV.get(dado, ()):
+			if all(getattr(self, c) for c in condicoes):
+				self.selecionarSubsecao(grupo, indicador, salvarItem)
+
+		if self.achouProducoes and self.achouProducaoEmCTA and u'Resumos publicados em anais de congressos' in dado:
+			self.selecionarSubsecao(PRODUCOES_BIBLIOGRAFICAS, 'achouResumoEmCongresso', 1)
+
+		if self.achouOrientacoes and u'Iniciação científica' in dado:
+			self.selecionarSubsecao(TIPOS_DE_ORIENTACAO, 'achouIniciacaoCientifica', 1)
 
 		if self.achouOutrasInformacoesRelevantes:
 			self.salvarItem = 0
@@ -1129,16 +939,44 @@ class ParserLattes(HTMLParser):
 
 		if self.achouProjetoDePesquisa:
 			if u'Projeto certificado pelo(a) coordenador(a)' in dado or u'Projeto certificado pela empresa' in dado:
-				self.item = ''
+				self.item.limpar()
 				self.salvarParte3 = 0
 
 
 
 # ---------------------------------------------------------------------------- #
+class BufferDeItem:
+	# textos do item atual: acumulados em uma lista e normalizados (stripBlanks) uma única vez
+	def __init__(self):
+		self.partes = []
+		self.texto = u''
+
+	def acrescentar(self, parte):
+		self.partes.append(parte)
+		self.texto = None
+
+	def limpar(self):
+		self.partes = []
+		self.texto = u''
+
+	def normalizado(self):
+		if self.texto is None:
+			conteudo = u''.join(self.partes)
+			self.partes = [conteudo]
+			self.texto = stripBlanks(conteudo)
+		return self.texto
+
 def stripBlanks(s):
 	return re.sub('\s+', ' ', s).strip()
 
-def htmlentitydecode(s):                                                                               
-	return re.sub('&(%s);' % '|'.join(name2codepoint),                                                 
-		lambda m: unichr(name2codepoint[m.group(1)]), s)   
+def corrigirHTML(cvLattesHTML):
+	return padraoDeCorrecoesDoHTML.sub(lambda m: CORRECOES_DO_HTML[m.group(0)], cvLattesHTML)
+
+def decodificarCVLattes(cvLattes):
+	# os CVs (HTML e XML) da Plataforma Lattes estão em ISO-8859-1
+	return cvLattes.decode('iso-8859-1','replace')
+
+padraoDeEntidades = re.compile('&(%s);' % '|'.join(name2codepoint))
+def htmlentitydecode(s):
+	return padraoDeEntidades.sub(lambda m: unichr(name2codepoint[m.group(1)]), s)   
 
@@ -24,10 +24,14 @@
 
 import re
 import sys
+import os
+import hashlib
+import cPickle
 
 from scriptLattes import *
 import fileinput
 from scriptLattes.util import compararCadeias, buscarArquivo
+from scriptLattes.indiceDeSimilaridade import IndiceDeBigramas, normalizarCadeia
 from qualis_extractor import *
 
 class Qualis:
@@ -41,6 +45,14 @@ class Qualis:
 	
 
 	def __init__(self, grupo):
+		self.indicesDeNomes = {}	# tipo ('P' ou 'C') -> IndiceDeBigramas das chaves de periodicos/congressos
+		self.nomesSimilares = {}	# (tipo, nome normalizado) -> chave similar (ou None)
+		self.memoria = {}		# ('ISSN', issn), ('P', revista), ('C', evento[, sigla]) -> resultado da busca
+		self.consultasAMemoria = 0
+		self.acertosDaMemoria = 0
+		self.arquivoDeMemoria = ''
+		self.arquivoDeCongressos = ''
+		self.arquivoDeDados = ''
 
 		self.anoInicio = int(grupo.obterParametro('global-itens_desde_o_ano'))
 		self.anoFim = int(grupo.obterParametro('global-itens_ate_o_ano'))
@@ -49,18 +61,24 @@ class Qualis:
 			#self.periodicos = self.carregarQualis(grupo.obterParametro('global-arquivo_qualis_de_periodicos'))
 			#qualis extractor -> extrai qualis diretamente da busca online do qualis
 			self.extrair_qualis_online = grupo.obterParametro('global-extrair_qualis_online')
-			self.qextractor = qualis_extractor(self.extrair_qualis_online)
+			self.arquivoDeDados = grupo.obterParametro('global-arquivo_dados_qualis')
+			self.qextractor = qualis_extractor(self.extrair_qualis_online, self.arquivoDeDados)
 			
 			if self.extrair_qualis_online == 0:
 				print "\n**************************************************\n"
 				self.qextractor.load_data()
 				arqareas = grupo.obterParametro('global-arquivo_areas_qualis')
 				self.qextractor.parse_areas_file(arqareas)
-				self.qextractor.extract_qualis()
-				self.periodicos = self.qextractor.publicacao
+				self.qextractor.extract_qualis(int(grupo.obterParametro('global-numero_de_conexoes_qualis') or 1))
+				self.periodicos = self.qextractor.get_publicacoes()
 				self.qextractor.save_data()
 				
 			self.congressos = self.carregarQualis(grupo.obterParametro('global-arquivo_qualis_de_congressos'))
+			self.indicesDeNomes['P'] = IndiceDeBigramas(self.periodicos.keys())
+			self.indicesDeNomes['C'] = IndiceDeBigramas(self.congressos.keys())
+
+			if grupo.obterParametro('global-armazenar_memoria_qualis'):
+				self.carregarMemoria(grupo.obterParametro('global-arquivo_qualis_de_congressos'))
 	
 
 	def qualisPorAno(self, membro):
@@ -159,48 +177,60 @@ class Qualis:
 
 
 	def buscaQualis(self, tipo, nome):
-		dist  = 0
-		indice = 0
-		# Percorrer lista de periodicos tentando casar com nome usando funcao compararCadeias(str1, str2) de scriptLattes.py
+		# Casamento exato; senão buscamos o nome mais similar (compararCadeias) entre os candidatos do índice
 		if tipo=='P':
 			if self.periodicos.get(nome)!=None:
 				return self.periodicos.get(nome) , ''	# Retorna Qualis do nome exato encontrado - Casamento perfeito
-			else:
-				chaves = self.periodicos.keys()
-				for i in range(0,len(chaves)):
-					distI = compararCadeias( nome, chaves[i], qualis=True)
-					if distI>dist: # comparamos: nome com cada nome de periodico
-						indice = i
-						dist = distI
-				if indice>0:
-						return self.periodicos.get(chaves[indice]) , chaves[indice]	# Retorna Qualis de nome similar
+			similar = self.buscarNomeSimilar(tipo, nome, self.periodicos)
+			if similar is not None:
+				return self.periodicos.get(similar) , similar	# Retorna Qualis de nome similar
 			return None,None
 		else:
 			if self.congressos.get(nome)!=None:
 				return self.congressos.get(nome) , '' # Retorna Qualis do nome exato encontrado - Casamento perfeito
-			else:
-				chaves = self.congressos.keys()
-				for i in range(0,len(chaves)):
-					distI = compararCadeias( nome, chaves[i], qualis=True)
-					if distI>dist: # comparamos: nome com cada nome de evento
-						indice = i
-						dist = distI
-				if indice>0:
-					return self.congressos.get(chaves[indice]) , chaves[indice]	# Retorna Qualis de nome similar
+			similar = self.buscarNomeSimilar(tipo, nome, self.congressos)
+			if similar is not None:
+				return self.congressos.get(similar) , similar	# Retorna Qualis de nome similar
 		#return 'Qualis nao identificado', ''
 		return 'Qualis nao identificado', nome
 
 
+	def buscarNomeSimilar(self, tipo, nome, dicionario):
+		# o resultado depende apenas do nome normalizado: é memorizado durante toda a execução
+		chaveDoCache = (tipo, normalizarCadeia(nome))
+		if chaveDoCache in self.nomesSimilares:
+			return self.nomesSimilares[chaveDoCache]
+
+		indice = self.indicesDeNomes.get(tipo)
+		if indice is None or not len(indice)==len(dicionario):
+			indice = IndiceDeBigramas(dicionario.keys())
+			self.indicesDeNomes[tipo] = indice
+
+		similar = None
+		dist = 0
+		for posicao in indice.candidatos(nome):
+			distI = compararCadeias( nome, indice.chaves[posicao], qualis=True)
+			if distI>dist: # comparamos: nome com cada nome de periodico/evento candidato
+				similar = indice.chaves[posicao]
+				dist = distI
+
+		self.nomesSimilares[chaveDoCache] = similar
+		return similar
+
 
 	def analisarPublicacoes(self, membro, grupo):
 		# Percorrer lista de publicacoes buscando e contabilizando os qualis
+		# (os resultados de cada ISSN/nome são memorizados e compartilhados entre os membros)
 		for pub in membro.listaArtigoEmPeriodico:
 			#qualis, similar = self.buscaQualis('P', pub.revista)
 			#pub.qualis = qualis
-			if pub.issn != '' and self.qextractor.get_qualis_by_issn(pub.issn):			
-				pub.qualis = self.qextractor.get_qualis_by_issn(pub.issn)
+			qualisDoIssn = None
+			if pub.issn != '':
+				qualisDoIssn = self.consultarMemoria(('ISSN', pub.issn), self.qextractor.get_qualis_by_issn, pub.issn)
+			if qualisDoIssn:
+				pub.qualis = qualisDoIssn
 			elif not self.extrair_qualis_online:
-				qualis, similar = self.buscaQualis('P', pub.revista)
+				qualis, similar = self.consultarMemoria(('P', pub.revista), self.buscaQualis, 'P', pub.revista)
 				pub.qualis = qualis
 				pub.qualissimilar = similar
 			else:
@@ -209,23 +239,103 @@ class Qualis:
 		
 		if (not grupo.obterParametro('global-arquivo_qualis_de_congressos')==''):
 			for pub in membro.listaTrabalhoCompletoEmCongresso:
-				qualis, similar = self.buscaQualis('C', pub.nomeDoEvento)
-				if qualis=='Qualis nao identificado':
-					if self.congressos.get(pub.sigla)!=None:
-						qualis = self.congressos.get(pub.sigla) # Retorna Qualis da sigla com nome do evento
-						similar = pub.sigla
-					else:				
-						qualis = 'Qualis nao identificado'
-						similar = pub.nomeDoEvento
+				qualis, similar = self.consultarMemoria(('C', pub.nomeDoEvento, pub.sigla), self.buscaQualisDeEvento, pub.nomeDoEvento, pub.sigla)
 				pub.qualis = qualis
 				pub.qualissimilar = similar
 
 			for pub in membro.listaResumoExpandidoEmCongresso:
-				qualis, similar = self.buscaQualis('C', pub.nomeDoEvento)
+				qualis, similar = self.consultarMemoria(('C', pub.nomeDoEvento), self.buscaQualis, 'C', pub.nomeDoEvento)
 				pub.qualis = qualis
 				pub.qualissimilar = similar
 
 
+	def resolverIssns(self, grupo):
+		# os ISSNs de todos os membros que ainda não estão na base são consultados de uma vez (em paralelo),
+		# antes de analisarPublicacoes; se todos estiverem na base nenhuma sessão é aberta
+		if not self.extrair_qualis_online:
+			return
+		issns = []
+		for membro in grupo.listaDeMembros:
+			for pub in membro.listaArtigoEmPeriodico:
+				if pub.issn != '' and not ('ISSN', pub.issn) in self.memoria:
+					issns.append(pub.issn)
+		self.qextractor.resolve_issns(issns, int(grupo.obterParametro('global-numero_de_conexoes_qualis') or 1))
+
+
+	def buscaQualisDeEvento(self, nomeDoEvento, sigla):
+		qualis, similar = self.buscaQualis('C', nomeDoEvento)
+		if qualis=='Qualis nao identificado':
+			if self.congressos.get(sigla)!=None:
+				qualis = self.congressos.get(sigla) # Retorna Qualis da sigla com nome do evento
+				similar = sigla
+			else:				
+				qualis = 'Qualis nao identificado'
+				similar = nomeDoEvento
+		return qualis, similar
+
+
+	def consultarMemoria(self, chave, busca, *argumentos):
+		self.consultasAMemoria += 1
+		if chave in self.memoria:
+			self.acertosDaMemoria += 1
+			return self.memoria[chave]
+		resultado = busca(*argumentos)
+		self.memoria[chave] = resultado
+		return resultado
+
+
+	def assinaturaDosDados(self, arquivoDeCongressos):
+		# a memória só é reaproveitada se os dados Qualis (CSV de congressos e base do extrator) não mudaram.
+		# A base do extrator é regravada a cada execução (save_data), portanto é considerado o seu conteúdo
+		assinatura = [str(self.extrair_qualis_online), str(len(self.periodicos)), str(len(self.congressos))]
+		if not arquivoDeCongressos=='' and os.path.exists(arquivoDeCongressos):
+			estado = os.stat(arquivoDeCongressos)
+			assinatura += [arquivoDeCongressos, str(estado.st_size), str(estado.st_mtime)]
+		assinatura += [self.arquivoDeDados, self.qextractor.store.signature()]
+		return hashlib.sha1('|'.join(assinatura)).hexdigest()
+
+
+	def carregarMemoria(self, arquivoDeCongressos):
+		# a memória é armazenada junto ao CSV de congressos (ou no diretorio atual)
+		if not arquivoDeCongressos=='':
+			arquivoDeCongressos = buscarArquivo(arquivoDeCongressos)
+		self.arquivoDeMemoria = os.path.join(os.path.dirname(arquivoDeCongressos), 'qualis-memoria.pickle')
+		self.arquivoDeCongressos = arquivoDeCongressos
+
+		if os.path.exists(self.arquivoDeMemoria):
+			try:
+				arquivo = open(self.arquivoDeMemoria, 'rb')
+				(assinatura, memoria) = cPickle.load(arquivo)
+				arquivo.close()
+				if assinatura==self.assinaturaDosDados(arquivoDeCongressos):
+					self.memoria = memoria
+					print "[QUALIS]: "+str(len(memoria))+" resultados recuperados de "+self.arquivoDeMemoria
+			except Exception, e:
+				print "[AVISO] Nao foi possivel ler a memoria Qualis: "+str(e)
+
+
+	def salvarMemoria(self):
+		if self.arquivoDeMemoria=='':
+			return
+		memoria = self.memoria
+		if self.extrair_qualis_online:
+			# os resultados das consultas online por ISSN não são armazenados: na próxima execução
+			# a validade (update_time) dos dados de cada ISSN é verificada novamente pelo extrator
+			memoria = dict((chave, valor) for (chave, valor) in self.memoria.iteritems() if not chave[0]=='ISSN')
+		try:
+			arquivo = open(self.arquivoDeMemoria, 'wb')
+			# assinatura dos dados ao final da execução (no modo online a base é atualizada durante a execução)
+			cPickle.dump((self.assinaturaDosDados(self.arquivoDeCongressos), memoria), arquivo, cPickle.HIGHEST_PROTOCOL)
+			arquivo.close()
+		except Exception, e:
+			print "[AVISO] Nao foi possivel armazenar a memoria Qualis: "+str(e)
+
+
+	def imprimirEstatisticasDaMemoria(self):
+		taxa = 100.0*self.acertosDaMemoria/self.consultasAMemoria if self.consultasAMemoria>0 else 0.0
+		print "[QUALIS]: %d consultas, %d acertos da memoria (%.1f%%)" % (self.consultasAMemoria, self.acertosDaMemoria, taxa)
+
+
 	def inicializaListaQualis(self, lista):
 		lista['A1'] = 0
 		lista['A2'] = 0
@@ -15,10 +15,16 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-import urllib2, requests
+import requests
 from BeautifulSoup import BeautifulSoup
 import codecs
 import pickle
+import sqlite3
+import os
+import time
+import random
+import threading
+import Queue
 from HTMLParser import HTMLParser
 import datetime
 
@@ -36,33 +42,223 @@ def getvalue(attrs):
             return attr[1]
     return None
 
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+URL_BASE = 'http://qualis.capes.gov.br/webqualis/'
+FORM_HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+AREA_SEARCH = 'consultaPublicaClassificacaoForm=consultaPublicaClassificacaoForm&consultaPublicaClassificacaoForm%%3AsomAreaAvaliacao=%d&consultaPublicaClassificacaoForm%%3AsomEstrato=org.jboss.seam.ui.NoSelectionConverter.noSelectionValue&consultaPublicaClassificacaoForm%%3AbtnPesquisarTituloPorArea=Pesquisar&javax.faces.ViewState=j_id2'
+AREA_PAGE = 'AJAXREQUEST=_viewRoot&consultaPublicaClassificacaoForm=consultaPublicaClassificacaoForm&consultaPublicaClassificacaoForm%%3AsomAreaAvaliacao=%d&consultaPublicaClassificacaoForm%%3AsomEstrato=org.jboss.seam.ui.NoSelectionConverter.noSelectionValue&javax.faces.ViewState=j_id3&ajaxSingle=consultaPublicaClassificacaoForm%%3AscrollerArea&consultaPublicaClassificacaoForm%%3AscrollerArea=%d&AJAX%%3AEVENTS_COUNT=1&'
+
+ISSN_SEARCH = 'consultaPublicaClassificacaoForm=consultaPublicaClassificacaoForm&consultaPublicaClassificacaoForm%%3Aissn=%s&consultaPublicaClassificacaoForm%%3AbtnPesquisarISSN=Pesquisar&javax.faces.ViewState=j_id2'
+
+#retries of a request: waits BACKOFF_BASE, 2*BACKOFF_BASE, 4*BACKOFF_BASE... (at most BACKOFF_MAX seconds)
+MAX_TRIES = 6
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+TIMEOUT = 60
+
+def post_with_backoff(session, url, data):
+    """
+    POST 'data' (already urlencoded) using the keep-alive connection of the session
+    Return:
+        the content of the response
+    """
+    for i in range(0, MAX_TRIES):
+        try:
+            response = session.post(url, data=data, headers=FORM_HEADERS, timeout=TIMEOUT)
+            response.raise_for_status()
+            return response.content
+        except requests.RequestException as err:
+            if i == MAX_TRIES-1:
+                raise
+            wait = min(BACKOFF_BASE * 2**i, BACKOFF_MAX) * (1 + random.random())/2
+            print '[AVISO] Erro na requisicao qualis (%s). Tentando novamente em %.1f segs.' % (err, wait)
+            time.sleep(wait)
+
+def open_session(url_base=URL_BASE):
+    """
+    Sao necessarias duas requisicoes iniciais para que se chegue a pagina
+    que exibe a avaliacao dos artigos.
+    Return:
+        (session, url of the search form)
+    """
+    session = requests.Session()
+    session.get(url_base+'principal.seam', timeout=TIMEOUT)
+    jid = session.cookies.get('JSESSIONID')
+    print 'Iniciando sessão qualis...\n ID da Sessão: ',jid
+    session.get(url_base + "publico/pesquisaPublicaClassificacao.seam;jsessionid=" + jid + "?conversationPropagation=begin", timeout=TIMEOUT)
+    return session, url_base + "publico/pesquisaPublicaClassificacao.seam;jsessionid=" + jid
+
+def normalize_title(title):
+    return title.strip().lower()
+
+class qualis_store(object):
+    """
+    Qualis data stored in SQLite, indexed by ISSN and by normalized title.
+    Each row is one (issn, title, area) classification; the areas table
+    keeps the date of the last extraction of each area.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.conn = sqlite3.connect(filename)
+        self.conn.text_factory = unicode
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS qualis (
+                issn TEXT NOT NULL,
+                title TEXT NOT NULL,
+                normalized_title TEXT NOT NULL,
+                area TEXT NOT NULL,
+                stratum TEXT NOT NULL,
+                updated TEXT NOT NULL,
+                PRIMARY KEY (issn, title, area));
+            CREATE INDEX IF NOT EXISTS qualis_issn ON qualis (issn);
+            CREATE INDEX IF NOT EXISTS qualis_normalized_title ON qualis (normalized_title);
+            CREATE TABLE IF NOT EXISTS areas (
+                code INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                last_update TEXT);
+        ''')
+
+    def is_empty(self):
+        return self.conn.execute('SELECT COUNT(*) FROM qualis').fetchone()[0] == 0
+
+    def upsert(self, rows, updated):
+        """
+        Insert or replace classifications
+        Args:
+            rows: list of (issn, title, area, stratum)
+            updated: datetime of the extraction
+        """
+        updated = updated.strftime(DATE_FORMAT)
+        self.conn.executemany('INSERT OR REPLACE INTO qualis VALUES (?, ?, ?, ?, ?, ?)',
+            [(issn, title, normalize_title(title), area, stratum, updated) for (issn, title, area, stratum) in rows])
+        self.conn.commit()
+
+    def to_qualis(self, cursor):
+        qualis = {}
+        for area, stratum in cursor:
+            qualis[area] = stratum
+        if len(qualis) == 0:
+            return None
+        return qualis
+
+    def get_by_issn(self, issn, since=None):
+        """
+        Return:
+            {'area': 'stratum'} of the ISSN (only rows updated after 'since', if given) or None
+        """
+        if since == None:
+            return self.to_qualis(self.conn.execute('SELECT area, stratum FROM qualis WHERE issn = ?', (issn,)))
+        return self.to_qualis(self.conn.execute('SELECT area, stratum FROM qualis WHERE issn = ? AND updated >= ?',
+            (issn, since.strftime(DATE_FORMAT))))
+
+    def get_by_title(self, title):
+        return self.to_qualis(self.conn.execute('SELECT area, stratum FROM qualis WHERE normalized_title = ?',
+            (normalize_title(title),)))
+
+    def get_publications(self):
+        """
+        Return:
+            {'title': {'area': 'stratum'}} with every stored publication
+        """
+        publications = {}
+        for title, area, stratum in self.conn.execute('SELECT title, area, stratum FROM qualis'):
+            publications.setdefault(title, {})[area] = stratum
+        return publications
+
+    def get_areas(self):
+        areas = []
+        last_update = {}
+        for code, name, updated in self.conn.execute('SELECT code, name, last_update FROM areas ORDER BY code'):
+            areas.append((code, name))
+            if updated != None:
+                last_update[code] = datetime.datetime.strptime(updated, DATE_FORMAT)
+        return areas, last_update
+
+    def save_areas(self, areas, last_update):
+        #areas without a date in 'last_update' keep the stored one
+        self.conn.executemany('INSERT OR REPLACE INTO areas VALUES (?, ?, COALESCE(?, (SELECT last_update FROM areas WHERE code = ?)))',
+            [(code, name, last_update[code].strftime(DATE_FORMAT) if code in last_update else None, code) for (code, name) in areas])
+        self.conn.commit()
+
+    def signature(self):
+        """
+        Return:
+            string that changes only when the stored classifications or area dates change
+            (rewriting the same data does not change it, unlike the file modification time)
+        """
+        count, last_updated = self.conn.execute('SELECT COUNT(*), MAX(updated) FROM qualis').fetchone()
+        areas = self.conn.execute('SELECT code, last_update FROM areas ORDER BY code').fetchall()
+        return '%d|%s|%s' % (count, last_updated, ','.join('%s:%s' % (code, updated) for (code, updated) in areas))
+
+    def set_area_updated(self, area, updated):
+        self.conn.execute('INSERT OR REPLACE INTO areas VALUES (?, ?, ?)', (area[0], area[1], updated.strftime(DATE_FORMAT)))
+        self.conn.commit()
+
+    def import_pickle(self, filename):
+        """
+        Import the (issn, publicacao, areas, areas_last_update) pickle written by older versions
+        """
+        f = open(filename, 'r')
+        (issn, publicacao, areas, areas_last_update) = pickle.load(f)
+        f.close()
+        #titles with the same ISSN share the same dict
+        issn_by_qualis = {}
+        for i, qualis in issn.items():
+            issn_by_qualis[id(qualis)] = i
+        rows = []
+        for title, qualis in publicacao.items():
+            for area, stratum in qualis.items():
+                rows.append((issn_by_qualis.get(id(qualis), ''), title, area, stratum))
+        if len(areas_last_update) > 0:
+            updated = max(areas_last_update.values())
+        else:
+            updated = datetime.datetime.now()
+        self.upsert(rows, updated)
+        self.save_areas(areas, areas_last_update)
+
+
 class qualis_extractor(object):
     #Constructor
-    def __init__(self,online):
+    def __init__(self,online,store='qualis.sqlite',url_base=URL_BASE):
         self.online = online #extrair online ou offline ?
-        self.publicacao = {} #{'nome pub',[ ('Nome area','A1') ]}
-        self.issn = {} #{'issn','nome pub'}
+        self.url_base = url_base
+        self.store = qualis_store(store) #qualis indexado por issn e titulo
         self.areas = []
         self.areas_to_extract = []
         self.areas_last_update = {}
         self.dtnow = datetime.datetime.now()
         self.update_time = 15
-        self.init_session()
+        self.session = None #aberta somente quando for necessario consultar o site do qualis
+        self.issns_not_found = set() #issns consultados em resolve_issns sem resultado
         
                 
     def parseContent(self, html):
         """
-        Process a html page containing qualis data
+        Process a html page containing qualis data and store it
         Args:
             html: the document to be parsed.
-            data: a list of lists containing the data parsed from the tables
         Return:
             1 if more pages exist
             0 if not
         """
+        rows, more = self.parse_page(html)
+        if rows != None:
+            self.store.upsert(rows, self.dtnow)
+        return more
+
+    def parse_page(self, html):
+        """
+        Process a html page containing qualis data
+        Args:
+            html: the document to be parsed.
+        Return:
+            (rows, more): rows is a list of (issn, title, area, stratum), or None
+            if the page has no table; more is 1 if more pages exist, 0 if not
+        """
         parsedhtml = BeautifulSoup(html)
         if parsedhtml == None:
-            return
+            return None, None
         
         tmp = parsedhtml.body
         table = None
@@ -76,8 +272,9 @@ class qualis_extractor(object):
         if tmp != None: tmp = tmp.find('tbody') #get the body of the table
         if tmp != None: #get all rows
             tmp = tmp.findAll('tr')
-        else:   return None
+        else:   return None, None
         #extract each line from all rows and add to a matrix with the values of the table
+        rows = []
         for i in tmp:
             line = []
             for j in i.findAll('td'):
@@ -95,29 +292,14 @@ class qualis_extractor(object):
             if titulo_qualis == '':
                 continue
             
+            rows.append((issn_qualis, titulo_qualis, area_qualis, extrato_qualis))
             
-            qualis = None
-            
-            if issn_qualis != '':
-                qualis = self.issn.get(issn_qualis)
-                
-            if qualis == None:
-                qualis = {}
-            
-            qualis[area_qualis] = extrato_qualis
-            
-            if issn_qualis != None:
-                self.issn[issn_qualis] = qualis
-            
-            self.publicacao[titulo_qualis] = qualis            
-            
-            #print issn_qualis,':',qualis
-            
+            #print issn_qualis,':',extrato_qualis
             
         if html.find('{\'page\': \'last\'}') != -1:
-            return 1
+            return rows, 1
             
-        return 0
+        return rows, 0
     
     def getAreas(self,html):
         self.areas = []
@@ -134,27 +316,15 @@ class qualis_extractor(object):
         
     def init_session(self):
         """
-        Sao necessarias tres requisicoes iniciais para que se chegue a pagina
-        que exibe a avaliacao dos artigos.
+        Open the session used by the lookups by ISSN (and, offline, get the list of areas).
+        Called only when the site must be accessed.
         """
-        urlBase = "http://qualis.capes.gov.br/webqualis/"
-        acessoInicial = requests.get(urlBase+'principal.seam')
-        jid = acessoInicial.cookies['JSESSIONID']
-        print 'Iniciando sessão qualis...\n ID da Sessão: ',jid
-        url1 = urlBase + "publico/pesquisaPublicaClassificacao.seam;jsessionid=" + jid + "?conversationPropagation=begin"
-        req1 = urllib2.Request(url1)
-        arq1 = urllib2.urlopen(req1)
-        
-        
-        self.url2 = urlBase + "publico/pesquisaPublicaClassificacao.seam;jsessionid=" + jid
+        self.session, self.url2 = open_session(self.url_base)
         
         if not self.online:
-            req2 = urllib2.Request(self.url2, 'AJAXREQUEST=_viewRoot&consultaPublicaClassificacaoForm=consultaPublicaClassificacaoForm&consultaPublicaClassificacaoForm%3Aissn=&javax.faces.ViewState=j_id2&consultaPublicaClassificacaoForm%3Aj_id192=consultaPublicaClassificacaoForm%3Aj_id192')
-            arq2 = urllib2.urlopen(req2)
             #get all the areas of qualis
-            self.getAreas(arq2.read())
-            req3 = urllib2.Request(self.url2, 'consultaPublicaClassificacaoForm=consultaPublicaClassificacaoForm&consultaPublicaClassificacaoForm%3AsomAreaAvaliacao=0&consultaPublicaClassificacaoForm%3AsomEstrato=org.jboss.seam.ui.NoSelectionConverter.noSelectionValue&consultaPublicaClassificacaoForm%3AbtnPesquisarTituloPorArea=Pesquisar&javax.faces.ViewState=j_id2')
-            arq3 = urllib2.urlopen (req3)
+            self.getAreas(post_with_backoff(self.session, self.url2, 'AJAXREQUEST=_viewRoot&consultaPublicaClassificacaoForm=consultaPublicaClassificacaoForm&consultaPublicaClassificacaoForm%3Aissn=&javax.faces.ViewState=j_id2&consultaPublicaClassificacaoForm%3Aj_id192=consultaPublicaClassificacaoForm%3Aj_id192'))
+            post_with_backoff(self.session, self.url2, AREA_SEARCH % (0))
         
     def parse_areas_file(self,afile):
         f = open(afile,'r')
@@ -177,65 +347,100 @@ class qualis_extractor(object):
         return False
         
             
-    def extract_qualis(self): 
-        #extract all the areas
+    def extract_area(self, session, url, area, results):
+        """
+        Extract every page of an area (runs in the worker threads). The
+        pages are parsed here but only stored by the thread of extract_qualis.
+        """
+        post_with_backoff(session, url, AREA_SEARCH % (area))
+        scroller = 1
+        more = 1
+        while more == 1:
+            rows, more = self.parse_page(post_with_backoff(session, url, AREA_PAGE % (area, scroller)))
+            if rows != None:
+                results.put(('rows', area, rows))
+            scroller += 1
+    
+    def extract_qualis(self, workers=4):
+        """
+        Extract the outdated areas in parallel. Each worker thread opens its
+        own session (keep-alive) and extracts one area at a time; the pages
+        are written to the store, as they arrive, by this thread only.
+        Args:
+            workers: number of simultaneous sessions
+        """
+        tasks = Queue.Queue()
         for area in self.areas_to_extract:
             if not self.should_update_area(area):
-                print 'Qualis da area %s atualizado!' % (self.areas[area][1])
+                print 'Qualis da area %s atualizado!' % (self.get_area_name(area))
                 continue
-                
-            self.areas_last_update[area] = self.dtnow
-            scroller = 1
-            more = 1
-            reqn = urllib2.Request(self.url2, 'consultaPublicaClassificacaoForm=consultaPublicaClassificacaoForm&consultaPublicaClassificacaoForm%3AsomAreaAvaliacao=' + str(area) + '&consultaPublicaClassificacaoForm%3AsomEstrato=org.jboss.seam.ui.NoSelectionConverter.noSelectionValue&consultaPublicaClassificacaoForm%3AbtnPesquisarTituloPorArea=Pesquisar&javax.faces.ViewState=j_id2')
-            
-            arqn = urllib2.urlopen(reqn)
-            data = []
-            print 'Qualis da area %s desatualizado!' % (self.areas[area][1])
-            print 'Extraindo qualis da area: %d - %s' % self.areas[area]
-            while more == 1:
-                reqn = urllib2.Request(self.url2, 'AJAXREQUEST=_viewRoot&consultaPublicaClassificacaoForm=consultaPublicaClassificacaoForm&consultaPublicaClassificacaoForm%3AsomAreaAvaliacao=' + str(area) + '&consultaPublicaClassificacaoForm%3AsomEstrato=org.jboss.seam.ui.NoSelectionConverter.noSelectionValue&javax.faces.ViewState=j_id3&ajaxSingle=consultaPublicaClassificacaoForm%3AscrollerArea&consultaPublicaClassificacaoForm%3AscrollerArea=' + str(scroller) + '&AJAX%3AEVENTS_COUNT=1&')
-                
-                #arqn = urllib2.urlopen (reqn)
-                ntries = 10
-                for i in range(0,ntries):
-                    try:
-                        arqn = urllib2.urlopen(reqn)
-                        break # success
-                    except urllib2.URLError as err:
-                        print "Error occurried. Trying again."
-                        continue
-                        #if not isinstance(err.reason, socket.timeout):
-                        #    raise "Non timeout error occurried while loading page." # propagate non-timeout errors
-                        #else: # all ntries failed 
-                        #    raise err # re-raise the last timeout error
-                    if i == 10:
-                        print "ja tentou 10 vezes!"
-                        break
-            
-                htmln = arqn.read()
-                more = self.parseContent(htmln)
-                scroller += 1
+            if self.session == None:
+                self.init_session()
+            print 'Qualis da area %s desatualizado!' % (self.get_area_name(area))
+            tasks.put(area)
+        
+        results = Queue.Queue()
+        def worker():
+            session = None
+            while True:
+                try:
+                    area = tasks.get_nowait()
+                except Queue.Empty:
+                    break
+                try:
+                    if session == None:
+                        session, url = open_session(self.url_base)
+                    print 'Extraindo qualis da area: %d - %s' % (area, self.get_area_name(area))
+                    self.extract_area(session, url, area, results)
+                    results.put(('done', area, None))
+                except Exception as err:
+                    results.put(('error', area, err))
+                    session = None
+            results.put(('end', None, None))
+        
+        threads = [threading.Thread(target=worker) for i in range(0, min(workers, tasks.qsize()))]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        
+        finished = 0
+        while finished < len(threads):
+            (message, area, value) = results.get()
+            if message == 'rows':
+                self.store.upsert(value, self.dtnow)
+            elif message == 'done':
+                self.areas_last_update[area] = self.dtnow
+                self.store.set_area_updated((area, self.get_area_name(area)), self.dtnow)
+            elif message == 'error':
+                print '[AVISO] Nao foi possivel extrair o qualis da area %d - %s: %s' % (area, self.get_area_name(area), value)
+            else:
+                finished += 1
+        for t in threads:
+            t.join()
             
            
     def load_data(self):
+        """
+        Load the areas and their last update from the store. The
+        classifications stay on disk and are looked up on demand.
+        """
         try:
-            f = open('data','r')
-            data = pickle.load(f)
-            self.issn = data[0]
-            self.publicacao = data[1]
-            self.areas = data[2]
-            self.areas_last_update = data[3]
-            f.close()
+            if self.store.is_empty() and os.path.isfile('data'):
+                print 'Importando dados qualis do arquivo data...'
+                self.store.import_pickle('data')
+            areas, self.areas_last_update = self.store.get_areas()
+            if len(areas) > 0 and len(self.areas) == 0:
+                self.areas = areas
             return True
-        except:
+        except Exception as err:
+            print '[AVISO] Não foi possível carregar os dados qualis:', err
             return False
     
     def save_data(self): 
-        f = open('data','w')
-        data = (self.issn,self.publicacao,self.areas,self.areas_last_update)
-        pickle.dump(data,f)
-        f.close()
+        self.store.save_areas(self.areas,self.areas_last_update)
+    
+    def get_publicacoes(self):
+        return self.store.get_publications()
     
     def get_area_by_name(self,name):
         for i in self.areas:
@@ -248,34 +453,87 @@ class qualis_extractor(object):
             if i[0] == cod:
                 return i
     
+    def get_area_name(self,cod):
+        area = self.get_area_by_cod(cod)
+        if area == None:
+            return str(cod)
+        return area[1]
+    
+    
+    def resolve_issns(self, issns, workers=4):
+        """
+        Look up, in a single concurrent batch, the ISSNs missing from the store
+        (or outdated). No session is opened if every ISSN is already stored.
+        Args:
+            issns: the ISSNs needed by the group
+            workers: number of simultaneous sessions
+        """
+        since = self.dtnow - datetime.timedelta(days=self.update_time)
+        tasks = Queue.Queue()
+        for issn in set(issns):
+            if self.store.get_by_issn(issn, since) == None:
+                tasks.put(issn)
+        print 'Qualis: %d ISSNs a consultar no site (%d encontrados na base)' % (tasks.qsize(), len(set(issns))-tasks.qsize())
+        
+        results = Queue.Queue()
+        def worker():
+            session = None
+            while True:
+                try:
+                    issn = tasks.get_nowait()
+                except Queue.Empty:
+                    break
+                try:
+                    if session == None:
+                        session, url = open_session(self.url_base)
+                    rows, more = self.parse_page(post_with_backoff(session, url, ISSN_SEARCH % (issn)))
+                    results.put(('rows', issn, rows))
+                except Exception as err:
+                    results.put(('error', issn, err))
+                    session = None
+            results.put(('end', None, None))
+        
+        threads = [threading.Thread(target=worker) for i in range(0, min(workers, tasks.qsize()))]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        
+        finished = 0
+        while finished < len(threads):
+            (message, issn, value) = results.get()
+            if message == 'rows':
+                if value:
+                    self.store.upsert(value, self.dtnow)
+                else:
+                    self.issns_not_found.add(issn)
+            elif message == 'error':
+                print '[AVISO] Nao foi possivel consultar o qualis do issn %s: %s' % (issn, value)
+            else:
+                finished += 1
+        for t in threads:
+            t.join()
     
     #get a qualis by issn        
     def get_qualis_by_issn(self,issn):
         if self.online:
             print 'Extraindo qualis online a partir do issn %s...' % (issn)
-            if self.issn.get(issn) != None:
-                return self.issn.get(issn)
-            req = urllib2.Request(self.url2,'consultaPublicaClassificacaoForm=consultaPublicaClassificacaoForm&consultaPublicaClassificacaoForm%3Aissn='+issn+'&consultaPublicaClassificacaoForm%3AbtnPesquisarISSN=Pesquisar&javax.faces.ViewState=j_id2') 
-            for i in range(0,10):
-                try:
-                    arqn = urllib2.urlopen(req)
-                    break # success
-                except urllib2.URLError as err:
-                    print "Error occurried. Trying again."
-                    continue
-                    if i == 10:
-                        print "ja tentou 10 vezes!"
-                        break
-            
-            html = arqn.read()
-            
-            self.parseContent(html)
+            since = self.dtnow - datetime.timedelta(days=self.update_time)
+            qualis = self.store.get_by_issn(issn, since)
+            if qualis != None:
+                return qualis
+            if issn in self.issns_not_found:
+                #not returned by the site in resolve_issns: keep the stored (outdated) rows, if any
+                return self.store.get_by_issn(issn)
+            if self.session == None:
+                self.init_session()
+            self.parseContent(post_with_backoff(self.session, self.url2, ISSN_SEARCH % (issn)))
                 
         print 'Extraindo qualis offline a partir do issn',issn,'...'
-        return self.issn.get(issn)
+        return self.store.get_by_issn(issn)
     #get a qualis by the name
     def get_qualis_by_name(self,name):
-        qualis = self.publicacoes.get(name)
+        qualis = self.store.get_by_title(name)
+        if qualis != None: return qualis
         
         '''if qualis != None: return qualis,1
         else:
@@ -108,26 +108,73 @@ def copiarArquivos(dir):
     print "Arquivos salvos em: >>'%s'<<" % os.path.abspath(dir)
 
 # ---------------------------------------------------------------------------- #
-def compararCadeias(str1, str2, qualis=False):
-    str1 = str1.strip().lower()
-    str2 = str2.strip().lower()
+class ComparadorDeCadeias:
+    # compararCadeias com as cadeias normalizadas uma única vez (cache) e com um filtro
+    # pelo comprimento que descarta, sem calcular Levenshtein, os pares que não podem ter
+    # distancia <= 5 (|len1-len2| > 5) ou ratio >= 0.80 (2*min(len1,len2)/(len1+len2) < 0.80)
+
+    def __init__(self):
+        self.normalizadas = {}
+        self.comparacoes = 0
+        self.acertosDoCache = 0
+        self.rejeitadasPeloComprimento = 0
+        self.contidas = 0
+        self.chamadasLevenshtein = 0
+
+    def normalizar(self, cadeia):
+        normalizada = self.normalizadas.get(cadeia)
+        if normalizada is None:
+            normalizada = cadeia.strip().lower()
+            self.normalizadas[cadeia] = normalizada
+        else:
+            self.acertosDoCache += 1
+        return normalizada
+
+    def comparar(self, str1, str2, qualis=False):
+        self.comparacoes += 1
+        str1 = self.normalizar(str1)
+        str2 = self.normalizar(str2)
+        len1 = len(str1)
+        len2 = len(str2)
+
+        if len1 == 0 or len2 == 0:
+            return 0
+
+        if len1 >= 20 and len2 >= 20 and (str1 in str2 or str2 in str1):
+            self.contidas += 1
+            return 1
+
+        if len1 < 10 or len2 < 10:
+            return 0
 
-    if len(str1) == 0 or len(str2) == 0:
+        if qualis:
+            if 2.0 * min(len1, len2) / (len1 + len2) < 0.80:
+                self.rejeitadasPeloComprimento += 1
+                return 0
+            self.chamadasLevenshtein += 1
+            dist = Levenshtein.ratio(str1, str2)
+            if dist >= 0.80:
+                # return 1
+                return dist
+
+        else:
+            if abs(len1 - len2) > 5:
+                self.rejeitadasPeloComprimento += 1
+                return 0
+            self.chamadasLevenshtein += 1
+            if Levenshtein.distance(str1, str2) <= 5:
+                return 1
         return 0
 
-    if len(str1) >= 20 and len(str2) >= 20 and (str1 in str2 or str2 in str1):
-        return 1
+    def estatisticas(self):
+        return "%d comparacoes, %d cadeias normalizadas (%d acertos do cache), %d rejeitadas pelo comprimento, %d contidas, %d chamadas a Levenshtein" % \
+            (self.comparacoes, len(self.normalizadas), self.acertosDoCache, self.rejeitadasPeloComprimento, self.contidas, self.chamadasLevenshtein)
 
-    if qualis:
-        dist = Levenshtein.ratio(str1, str2)
-        if len(str1) >= 10 and len(str2) >= 10 and dist >= 0.80:
-            # return 1
-            return dist
 
-    else:
-        if len(str1) >= 10 and len(str2) >= 10 and Levenshtein.distance(str1, str2) <= 5:
-            return 1
-    return 0
+comparadorDeCadeias = ComparadorDeCadeias()
+
+def compararCadeias(str1, str2, qualis=False):
+    return comparadorDeCadeias.comparar(str1, str2, qualis)
 
 
 def criarDiretorio(dir):
@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# encoding: utf-8
+# filename: benchmark_parserLattes.py
+#
+#  Tempo de processamento dos CVs Lattes sintéticos de test_membro.py (não é
+#  executado pelo unittest). Os números citados nos commits do parser foram
+#  obtidos com este script, antes e depois de cada alteração.
+#
+#  Execução (a partir do diretório raiz): python tests/benchmark_parserLattes.py
+#  A memória máxima (RSS) é medida processando cada CV em um novo processo.
+#
+
+import os
+import sys
+import time
+import resource
+import subprocess
+import HTMLParser
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scriptLattes'))
+
+import membro
+import parserLattes
+from test_membro import cvSintetico
+
+
+def medir(funcao, repeticoes=5):
+	# melhor tempo (segs) entre as repetições
+	melhor = None
+	for i in range(repeticoes):
+		inicio = time.time()
+		funcao()
+		tempo = time.time()-inicio
+		if melhor is None or tempo < melhor:
+			melhor = tempo
+	return melhor
+
+
+def medirProcessamentoDoCV():
+	# decodificação e leitura completa (com tidy) de CVs de tamanhos diferentes
+	print '[CV completo, com tidy]'
+	for numeroDeItens in [10, 300, 1000]:
+		cvLattesHTML = cvSintetico(numeroDeItens)
+		tempo = medir(lambda: membro.processarCVLattesHTML('1', cvLattesHTML))
+		print '- %4d items (%4d KB): %7.1f ms' % (numeroDeItens, len(cvLattesHTML)/1024, tempo*1000)
+
+
+def medirMemoriaDoCV():
+	# memória máxima do processo que processa um único CV (0 items: somente a importação dos módulos)
+	print '[CV completo, com tidy: memoria maxima do processo]'
+	for numeroDeItens in [0, 10, 300, 1000]:
+		saida = subprocess.check_output([sys.executable, os.path.abspath(__file__), 'memoria', str(numeroDeItens)])
+		print '- %4d items: %7.1f MB' % (numeroDeItens, int(saida.split()[-1])/1024.0)
+
+
+def processarUmCV(numeroDeItens):
+	# executado no processo filho de medirMemoriaDoCV
+	if numeroDeItens>0:
+		membro.processarCVLattesHTML('1', cvSintetico(numeroDeItens))
+	print resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # KB
+
+
+class ColetorDeTextos(HTMLParser.HTMLParser):
+	def __init__(self):
+		HTMLParser.HTMLParser.__init__(self)
+		self.textos = []
+
+	def handle_data(self, dado):
+		self.textos.append(dado)
+
+
+def medirTextosDoCV():
+	# handle_data para cada texto do CV (cabeçalhos de seções e items), isolado do tidy e do HTMLParser
+	coletor = ColetorDeTextos()
+	coletor.feed(cvSintetico(300).decode('iso-8859-1'))
+	textos = coletor.textos * 10
+	print '[handle_data]'
+	for (descricao, secoes) in [('na ordem do CV', []), ('dentro das produções e orientações', ['achouProducoes', 'achouProducaoEmCTA', 'achouOrientacoes', 'achouEventos'])]:
+		parser = parserLattes.ParserLattes('1', u'<html></html>')
+
+		def lerTextos():
+			for texto in textos:
+				parser.item = parser.item.__class__()
+				for secao in secoes:
+					setattr(parser, secao, 1)
+				parser.handle_data(texto)
+
+		tempo = medir(lerTextos, 20)
+		print '- %d textos %s: %.1f us por texto' % (len(textos), descricao, tempo/len(textos)*1e6)
+
+
+def medirSecaoLonga():
+	# texto acumulado em self.item ao longo de uma seção que não o reinicia entre as produções
+	print '[seção longa]'
+	for numeroDeEntradas in [1000, 5000]:
+		textos = [u'AUTOR, A.; TAL, F. Título da produção número %d. Revista X, v. 1, p. 1-10, 2010.' % i for i in range(numeroDeEntradas)]
+
+		def lerSecao():
+			parser = parserLattes.ParserLattes('1', u'<html></html>')
+			for texto in textos:
+				parser.handle_data(texto)
+				parser.handle_starttag('br', [])
+
+		tempo = medir(lerSecao, 3)
+		print '- %d entradas: %.1f ms' % (numeroDeEntradas, tempo*1000)
+
+
+if __name__ == '__main__':
+	if len(sys.argv)==3 and sys.argv[1]=='memoria':
+		processarUmCV(int(sys.argv[2]))
+		sys.exit(0)
+	medirProcessamentoDoCV()
+	medirMemoriaDoCV()
+	medirTextosDoCV()
+	medirSecaoLonga()
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# encoding: utf-8
+# filename: test_analisadorDePublicacoes.py
+#
+#  Download dos DOIs contra um servidor local: DOIs indisponíveis são requisitados
+#  TENTATIVAS_POR_DOI vezes, requisições a uma mesma editora respeitam o intervalo
+#  do LimitadorPorEditora e as páginas baixadas chegam a obterDadosAtravesDeDOI.
+#
+#  Execução (a partir do diretório raiz): python -m unittest discover -s tests
+#
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import BaseHTTPServer
+import SocketServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scriptLattes'))
+
+from internacionalizacao import analisadorDePublicacoes as analisador
+
+
+PAGINAS = {
+	'/10.9990/artigo.1': '<html><body><p>Department of Physics, University of Porto, Portugal</p></body></html>',
+	'/10.9990/artigo.2': '<html><body><p>Institute of Mathematics, University of Tokyo, Japan</p></body></html>',
+	'/10.9991/artigo.3': '<html><body><p>Instituto de Computacao, Unicamp, Brasil</p></body></html>',
+}
+INDISPONIVEL = '/10.9992/indisponivel'
+
+
+class EditorasFalsas(BaseHTTPServer.BaseHTTPRequestHandler):
+	requisicoes = {} # caminho -> [instante de cada requisição]
+	trava = threading.Lock()
+
+	def log_message(self, *args):
+		pass
+
+	def do_GET(self):
+		with EditorasFalsas.trava:
+			EditorasFalsas.requisicoes.setdefault(self.path, []).append(time.time())
+		if self.path in PAGINAS:
+			codigo, html = 200, PAGINAS[self.path]
+		else:
+			codigo, html = 500, '<html>Erro interno</html>'
+		self.send_response(codigo)
+		self.send_header('Content-Type', 'text/html; charset=utf-8')
+		self.send_header('Content-Length', str(len(html)))
+		self.end_headers()
+		self.wfile.write(html)
+
+
+class ServidorFalso(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+
+
+class GrupoFalso:
+	def __init__(self, diretorioDoi):
+		self.diretorioDoi = diretorioDoi
+
+
+class TestDownloadDeDOIs(unittest.TestCase):
+	INTERVALO = 0.3
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.espera = analisador.ESPERA_INICIAL_DOI
+		self.limitador = analisador.limitadorPorEditora
+		analisador.ESPERA_INICIAL_DOI = 0.01
+		analisador.limitadorPorEditora = analisador.LimitadorPorEditora(self.INTERVALO)
+		EditorasFalsas.requisicoes = {}
+		self.servidor = ServidorFalso(('127.0.0.1', 0), EditorasFalsas)
+		threading.Thread(target=self.servidor.serve_forever).start()
+
+	def tearDown(self):
+		self.servidor.shutdown()
+		self.servidor.server_close()
+		analisador.ESPERA_INICIAL_DOI = self.espera
+		analisador.limitadorPorEditora = self.limitador
+		shutil.rmtree(self.dir)
+
+	def url(self, caminho):
+		return 'http://127.0.0.1:%d%s' % (self.servidor.server_address[1], caminho)
+
+	def baixar(self, diretorioDoi):
+		analisadorDePublicacoes = analisador.AnalisadorDePublicacoes(GrupoFalso(diretorioDoi))
+		analisadorDePublicacoes.baixarDOIs([self.url(c) for c in sorted(PAGINAS)+[INDISPONIVEL]], 4)
+		return analisadorDePublicacoes
+
+	def testDOIIndisponivelEhTentadoNovamente(self):
+		analisadorDePublicacoes = self.baixar('')
+		self.assertEqual(len(EditorasFalsas.requisicoes[INDISPONIVEL]), analisador.TENTATIVAS_POR_DOI)
+		self.assertEqual(analisadorDePublicacoes.documentosBaixados[self.url(INDISPONIVEL)], None)
+		for caminho in PAGINAS:
+			self.assertEqual(len(EditorasFalsas.requisicoes[caminho]), 1)
+
+		# o DOI indisponível não é baixado outra vez
+		self.assertEqual(analisadorDePublicacoes.obterDadosAtravesDeDOI(self.url(INDISPONIVEL)), [])
+		self.assertEqual(len(EditorasFalsas.requisicoes[INDISPONIVEL]), analisador.TENTATIVAS_POR_DOI)
+
+	def testIntervaloEntreRequisicoesAUmaMesmaEditora(self):
+		self.baixar('')
+		instantes = {}
+		for caminho, requisicoes in EditorasFalsas.requisicoes.items():
+			instantes.setdefault(analisador.prefixoDoDOI(caminho), []).extend(requisicoes)
+		for prefixo in instantes:
+			instantes[prefixo].sort()
+			for anterior, seguinte in zip(instantes[prefixo], instantes[prefixo][1:]):
+				self.assertTrue(seguinte-anterior >= self.INTERVALO*0.9, '%s: %.3f segs' % (prefixo, seguinte-anterior))
+
+		# editoras diferentes não esperam umas pelas outras
+		self.assertTrue(abs(instantes['10.9991'][0]-instantes['10.9990'][0]) < self.INTERVALO)
+
+	def testPaginasBaixadasChegamAoAnalisador(self):
+		analisadorDePublicacoes = self.baixar('')
+		dados = analisadorDePublicacoes.obterDadosAtravesDeDOI(self.url('/10.9990/artigo.2'))
+		self.assertEqual(dados, ['Institute of Mathematics, University of Tokyo, Japan'])
+		self.assertEqual(len(EditorasFalsas.requisicoes['/10.9990/artigo.2']), 1)
+		self.assertFalse(self.url('/10.9990/artigo.2') in analisadorDePublicacoes.documentosBaixados)
+
+	def testPaginasBaixadasSaoArmazenadasNoCache(self):
+		self.baixar(self.dir)
+		self.assertEqual(len(os.listdir(self.dir)), len(PAGINAS))
+
+		# em uma nova execução as páginas vêm do cache
+		analisadorDePublicacoes = self.baixar(self.dir)
+		self.assertEqual(len(EditorasFalsas.requisicoes['/10.9991/artigo.3']), 1)
+		dados = analisadorDePublicacoes.obterDadosAtravesDeDOI(self.url('/10.9991/artigo.3'))
+		self.assertEqual(dados, ['Instituto de Computacao, Unicamp, Brasil'])
+
+
+if __name__ == '__main__':
+	unittest.main()
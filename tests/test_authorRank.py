@@ -0,0 +1,43 @@
+#!/usr/bin/python
+# encoding: utf-8
+# filename: test_authorRank.py
+#
+#  AuthorRank: o processo iterativo termina ao atingir a tolerância ou o número
+#  máximo de iterações (sem convergência).
+#
+#  Execução (a partir do diretório raiz): python -m unittest discover -s tests
+#
+
+import os
+import sys
+import unittest
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scriptLattes'))
+
+from authorRank import AuthorRank
+
+
+MATRIZ = numpy.array([[0, 1, 0], [0.5, 0, 0.5], [1, 0, 0]])
+
+
+class TestAuthorRank(unittest.TestCase):
+
+	def testConvergencia(self):
+		authorRank = AuthorRank(MATRIZ, 1000)
+		self.assertTrue(authorRank.convergiu)
+		self.assertTrue(authorRank.iteracoes < 1000)
+
+		# ponto fixo: vectorRank = (1-d) + d * M^T vectorRank
+		vectorRank = authorRank.vectorRank.astype(numpy.float64)
+		self.assertTrue(numpy.allclose(vectorRank, 0.15 + 0.85*MATRIZ.T.dot(vectorRank), atol=1e-5))
+
+	def testSemConvergenciaNoLimiteDeIteracoes(self):
+		authorRank = AuthorRank(MATRIZ, 3)
+		self.assertFalse(authorRank.convergiu)
+		self.assertEqual(authorRank.iteracoes, 3)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# encoding: utf-8
+# filename: test_geradorDePaginasWeb.py
+#
+#  Modo incremental: páginas sem alteração não são reescritas em uma nova execução
+#  (a data de processamento do rodapé é desconsiderada na comparação).
+#
+#  Execução (a partir do diretório raiz): python -m unittest discover -s tests
+#
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scriptLattes'))
+
+from geradorDePaginasWeb import GeradorDePaginasWeb
+
+
+class GrupoFalso:
+	def __init__(self, modoIncremental):
+		self.parametros = {'global-modo_incremental': modoIncremental, 'global-itens_desde_o_ano': '',
+		                   'global-itens_ate_o_ano': '', 'global-email_do_admin': 'admin@exemplo.br',
+		                   'global-google_analytics_key': ''}
+
+	def obterParametro(self, parametro):
+		return self.parametros[parametro]
+
+
+class Gerador(GeradorDePaginasWeb):
+	def __init__(self, grupo, dir):
+		self.grupo = grupo
+		self.dir = dir
+		self.version = 'V8.10'
+		self.html2 = '</html>'
+		self.paginasAlteradas = 0
+		self.paginasSemAlteracao = 0
+
+	def gerarPaginas(self, texto):
+		for nome in ['index.html', 'PB0-0.html', 'OC0-0.html']:
+			self.salvarPagina(nome, u'<html><body>'+texto+u' '+nome+self.paginaBottom())
+
+
+class TestModoIncremental(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def executar(self, modoIncremental, texto):
+		gerador = Gerador(GrupoFalso(modoIncremental), self.dir)
+		gerador.gerarPaginas(texto)
+		return gerador
+
+	def testPaginasSemAlteracaoNaoSaoReescritas(self):
+		self.executar(1, u'Produções')
+		antes = dict((nome, os.path.getmtime(os.path.join(self.dir, nome))) for nome in os.listdir(self.dir))
+		time.sleep(1.1) # a data de processamento muda de um segundo para o outro
+
+		gerador = self.executar(1, u'Produções')
+		self.assertEqual(gerador.paginasSemAlteracao, 3)
+		self.assertEqual(gerador.paginasAlteradas, 0)
+		for nome in antes:
+			self.assertEqual(os.path.getmtime(os.path.join(self.dir, nome)), antes[nome])
+
+	def testPaginasAlteradasSaoReescritas(self):
+		self.executar(1, u'Produções')
+		gerador = self.executar(1, u'Novas produções')
+		self.assertEqual(gerador.paginasAlteradas, 3)
+		self.assertEqual(gerador.paginasSemAlteracao, 0)
+
+	def testSemModoIncrementalTodasAsPaginasSaoEscritas(self):
+		self.executar(0, u'Produções')
+		gerador = self.executar(0, u'Produções')
+		self.assertEqual(gerador.paginasAlteradas, 3)
+
+
+if __name__ == '__main__':
+	unittest.main()
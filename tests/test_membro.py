@@ -0,0 +1,229 @@
+#!/usr/bin/python
+# encoding: utf-8
+# filename: test_membro.py
+#
+#  Processamento do CV Lattes com e sem tidy: os dados extraídos (dadosDoCVLattes)
+#  devem ser os mesmos, seja o CV entregue como string ou como arquivo do cache.
+#  Os dados de um CV com todas as seções são comparados com os obtidos pelo parser
+#  anterior às tabelas SECOES_DO_CV e SUBSECOES_DO_CV (dados/dadosDoCVCompleto.json).
+#  Os testes com tidy são ignorados se a libtidy não estiver instalada.
+#
+#  Execução (a partir do diretório raiz): python -m unittest discover -s tests
+#
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scriptLattes'))
+
+import membro
+from tidylib import tidy_document
+
+try:
+	tidy_document(u'<html></html>')
+	TIDY_DISPONIVEL = True
+except OSError:
+	TIDY_DISPONIVEL = False
+
+ARQUIVO_DOS_DADOS_DO_CV_COMPLETO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dados', 'dadosDoCVCompleto.json')
+
+
+CABECALHO = u'''<html><body><div class="infpessoa"><h2 class="nome">Fulano de Tal<br/><span>(Bolsista de Produtividade em Pesquisa do CNPq - Nível 1A)</span></h2>
+<ul><li>Endereço para acessar este CV: http://lattes.cnpq.br/1234567890123456</li></ul>
+<img src="http://servicosweb.cnpq.br/wspessoa/servletrecuperafoto?tipo=1&id=K123"/>
+<span>Última atualização do currículo em 01/02/2013</span></div>
+<p class="resumo">Resumo do pesquisador, com <![CDATA[trechos em CDATA]]> e símbolos <x<.</p>
+<div class="title-wrapper"><h1>Identificação</h1><div class="layout-cell-pad-5 text-align-right"><b>Nome</b></div><div class="layout-cell-pad-5">Fulano de Tal</div>
+<div class="layout-cell-pad-5 text-align-right"><b>Nome em citações bibliográficas</b></div><div class="layout-cell-pad-5">TAL, F.</div>
+<div class="layout-cell-pad-5 text-align-right"><b>Sexo</b></div><div class="layout-cell-pad-5">Masculino</div></div>
+<div class="title-wrapper"><h1>Endereço</h1><div class="layout-cell-pad-5 text-align-right"><b>Endereço Profissional</b></div><div class="layout-cell-pad-5">Universidade de São Paulo, Instituto de Matemática. Rua do Matão 1010 São Paulo - SP - Brasil</div></div>
+<div class="title-wrapper"><h1>Formação acadêmica/titulação</h1><div class="layout-cell-pad-5 text-align-right"><b>2000 - 2004</b></div><div class="layout-cell-pad-5">Doutorado em Computação. Universidade de São Paulo.</div></div>
+<div class="title-wrapper"><h1>Produções</h1><b>Produção bibliográfica</b><b>Artigos completos publicados em periódicos</b>
+'''
+ITEM = u'''<div class="layout-cell-pad-5 text-align-right"><b>%d.</b></div><div class="layout-cell-pad-5"><span class="informacao-artigo">2010</span>AUTOR, A.; TAL, F. Um título qualquer de artigo número %d. Revista X, v. %d, p. 1-10, 2010.<a href="http://dx.doi.org/10.1000/%d">doi</a></div>
+'''
+ORIENTACOES = u'</div><div class="title-wrapper"><h1>Orientações</h1><b>Orientações e supervisões concluídas</b><b>Tese de doutorado</b>'
+FIM = u'</div></body></html>'
+
+
+def cvSintetico(numeroDeItens):
+	itens = [ITEM % (i, i, i, i) for i in range(1, numeroDeItens+1)]
+	return (CABECALHO + u''.join(itens) + ORIENTACOES + u''.join(itens[:3]) + FIM).encode('iso-8859-1')
+
+
+# CV com todas as seções e subseções reconhecidas pelo parser (após a identificação e o endereço
+# de CABECALHO): [(seção, [subseções])]; cada subseção é uma lista de cabeçalhos (<b>) seguida de dois items
+SECOES_DO_CV_COMPLETO = [
+	(u'Formação acadêmica/titulação', [[]]),
+	(u'Atuação Profissional', [[]]),
+	(u'Projetos de pesquisa', [[]]),
+	(u'Membro de corpo editorial', [[]]),
+	(u'Revisor de periódico', [[]]),
+	(u'Áreas de atuação', [[]]),
+	(u'Idiomas', [[]]),
+	(u'Prêmios e títulos', [[]]),
+	(u'Produções', [
+		[u'Produção bibliográfica', u'Artigos completos publicados em periódicos'],
+		[u'Livros publicados/organizados ou edições'],
+		[u'Capítulos de livros publicados'],
+		[u'Textos em jornais de notícias/revistas'],
+		[u'Trabalhos completos publicados em anais de congressos'],
+		[u'Resumos expandidos publicados em anais de congressos'],
+		[u'Resumos publicados em anais de congressos (resumos)'],
+		[u'Artigos aceitos para publicação'],
+		[u'Apresentações de Trabalho'],
+		[u'Outras produções bibliográficas'],
+		[u'Produção técnica', u'Programas de computador com registro de patente'],
+		[u'Programas de computador sem registro de patente'],
+		[u'Produtos tecnológicos'],
+		[u'Processos ou técnicas'],
+		[u'Trabalhos técnicos'],
+		[u'Demais tipos de produção técnica'],
+		[u'Produção artística/cultural', u'Música'],
+		[u'Artes Cênicas'],
+		[u'Outras produções artísticas/culturais'],
+		[u'Demais trabalhos']]),
+	(u'Patentes e registros', [[u'Patente'], [u'Programa de computador'], [u'Desenho industrial']]),
+	(u'Bancas', [[u'Participação em bancas de trabalhos de conclusão']]),
+	(u'Eventos', [
+		[u'Participação em eventos, congressos, exposições e feiras'],
+		[u'Organização de eventos, congressos, exposições e feiras']]),
+	(u'Orientações', [
+		[u'Orientações e supervisões em andamento', u'Dissertação de mestrado'],
+		[u'Iniciação científica (em andamento)'],
+		[u'Orientações e supervisões concluídas', u'Supervisão de pós-doutorado'],
+		[u'Tese de doutorado'],
+		[u'Dissertação de mestrado'],
+		[u'Monografia de conclusão de curso de aperfeiçoamento/especialização'],
+		[u'Trabalho de conclusão de curso de graduação'],
+		[u'Iniciação Científica'],
+		[u'Orientações de outra natureza']]),
+	(u'Outras informações relevantes', [[]]),
+]
+
+
+def cvCompleto():
+	html = CABECALHO.split(u'<div class="title-wrapper"><h1>Formação')[0]
+	numero = 0
+	for (secao, subsecoes) in SECOES_DO_CV_COMPLETO:
+		html += u'<div class="title-wrapper"><h1>%s</h1>' % (secao)
+		for cabecalhos in subsecoes:
+			html += u''.join(u'<b>%s</b>' % (c) for c in cabecalhos)
+			for i in range(2):
+				numero += 1
+				html += ITEM % (i+1, numero, numero, numero)
+		html += u'</div>\n'
+	return (html + u'</body></html>').encode('iso-8859-1')
+
+
+def comparavel(valor):
+	# os items do CV são objetos: comparamos os seus atributos
+	if isinstance(valor, (list, tuple)):
+		return [comparavel(v) for v in valor]
+	if isinstance(valor, dict):
+		return dict((k, comparavel(v)) for k, v in valor.items())
+	if isinstance(valor, (set, frozenset)):
+		return sorted(comparavel(v) for v in valor)
+	if hasattr(valor, '__dict__'):
+		return (valor.__class__.__name__, comparavel(vars(valor)))
+	return valor
+
+
+class ArquivoContado(file):
+	# arquivo que conta os bytes lidos
+	lidos = 0
+
+	def read(self, *args):
+		dados = file.read(self, *args)
+		self.lidos += len(dados)
+		return dados
+
+
+class TestProcessamentoDoCV(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.cvLattesHTML = cvSintetico(300) # maior que um bloco da leitura sem tidy
+		self.cvPath = os.path.join(self.dir, '1234567890123456')
+		arquivo = open(self.cvPath, 'w')
+		arquivo.write(self.cvLattesHTML)
+		arquivo.close()
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def dados(self, cvLattesHTML, usarTidy, somenteIdentificacao=False):
+		return comparavel(membro.dadosDoCVLattes(membro.processarCVLattesHTML('1', cvLattesHTML, usarTidy, somenteIdentificacao)))
+
+	@unittest.skipUnless(TIDY_DISPONIVEL, 'libtidy nao instalada')
+	def testComESemTidyOsDadosSaoIguais(self):
+		comTidy = self.dados(self.cvLattesHTML, 1)
+		semTidy = self.dados(self.cvLattesHTML, 0)
+		self.assertEqual(len(comTidy['listaArtigoEmPeriodico']), 300)
+		self.assertEqual(len(comTidy['listaOCTeseDeDoutorado']), 3)
+		self.assertEqual(len(comTidy['listaFormacaoAcademica']), 1)
+		self.assertEqual(comTidy['nomeCompleto'], u'Fulano de Tal')
+		for atributo in comTidy:
+			self.assertEqual(comTidy[atributo], semTidy[atributo], atributo)
+
+	@unittest.skipUnless(TIDY_DISPONIVEL, 'libtidy nao instalada')
+	def testArquivoDoCacheEhLidoDiretamente(self):
+		for usarTidy in [1, 0]:
+			arquivo = open(self.cvPath)
+			dadosDoArquivo = self.dados(arquivo, usarTidy)
+			arquivo.close()
+			self.assertEqual(dadosDoArquivo, self.dados(self.cvLattesHTML, usarTidy))
+
+	@unittest.skipUnless(TIDY_DISPONIVEL, 'libtidy nao instalada')
+	def testSomenteIdentificacao(self):
+		arquivo = open(self.cvPath)
+		perfil = membro.perfilDoCVLattes(membro.dadosDoCVLattes(membro.processarCVLattesHTML('', arquivo, 0, somenteIdentificacao=True)))
+		arquivo.close()
+		self.assertEqual(comparavel(perfil), comparavel(membro.perfilDoCVLattes(membro.dadosDoCVLattes(membro.processarCVLattesHTML('', self.cvLattesHTML, 1)))))
+
+	def testPerfilNaoLeORestanteDoCV(self):
+		arquivo = ArquivoContado(self.cvPath)
+		perfil = membro.carregarPerfilCVLattesHTML(arquivo, 0)
+		arquivo.close()
+		self.assertEqual(perfil['nomeCompleto'], u'Fulano de Tal')
+		self.assertTrue(arquivo.lidos < len(self.cvLattesHTML)/10, arquivo.lidos)
+
+	def testCVProcessadoEhIndexadoPeloConteudo(self):
+		arquivo = open(self.cvPath)
+		caminho = membro.caminhoDoCVProcessado('1', arquivo, self.dir, 0)
+		self.assertEqual(arquivo.tell(), 0) # o arquivo volta ao inicio para o parser
+		self.assertEqual(caminho, membro.caminhoDoCVProcessado('1', self.cvLattesHTML, self.dir, 0))
+
+		dados = membro.carregarCVLattesHTML('1', arquivo, self.dir, 0)
+		arquivo.close()
+		self.assertTrue(os.path.exists(caminho))
+		self.assertEqual(comparavel(membro.lerCVProcessado(caminho)), comparavel(dados))
+		self.assertEqual(comparavel(dados), self.dados(self.cvLattesHTML, 0))
+
+
+class TestRegressaoDoParser(unittest.TestCase):
+
+	def testDadosDoCVCompleto(self):
+		# os dados (normalizados pelo JSON) não devem mudar em relação ao parser anterior
+		dados = comparavel(membro.dadosDoCVLattes(membro.processarCVLattesHTML('1', cvCompleto(), 0)))
+		arquivo = open(ARQUIVO_DOS_DADOS_DO_CV_COMPLETO)
+		esperados = json.load(arquivo)
+		arquivo.close()
+		dados = json.loads(json.dumps(dados))
+		self.assertEqual(sorted(dados.keys()), sorted(esperados.keys()))
+		for atributo in esperados:
+			self.assertEqual(dados[atributo], esperados[atributo], atributo)
+
+	@unittest.skipUnless(TIDY_DISPONIVEL, 'libtidy nao instalada')
+	def testDadosDoCVCompletoComTidy(self):
+		self.assertEqual(comparavel(membro.dadosDoCVLattes(membro.processarCVLattesHTML('1', cvCompleto(), 1))),
+		                 comparavel(membro.dadosDoCVLattes(membro.processarCVLattesHTML('1', cvCompleto(), 0))))
+
+
+if __name__ == '__main__':
+	unittest.main()
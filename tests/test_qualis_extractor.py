@@ -0,0 +1,182 @@
+#!/usr/bin/python
+# encoding: utf-8
+# filename: test_qualis_extractor.py
+#
+#  Extração do Qualis contra um servidor local que imita o WebQualis: as áreas são
+#  extraídas em paralelo, páginas com erro são requisitadas novamente e as
+#  classificações são gravadas na base SQLite.
+#
+#  Execução (a partir do diretório raiz): python -m unittest discover -s tests
+#
+
+import os
+import sys
+import datetime
+import shutil
+import tempfile
+import threading
+import unittest
+import urlparse
+import BaseHTTPServer
+import SocketServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scriptLattes'))
+
+from qualis import qualis_extractor as extrator
+
+
+AREAS = {1: 'CIENCIA DA COMPUTACAO', 2: 'FISICA', 3: 'QUIMICA'}
+
+# páginas de cada área: (issn, titulo, estrato)
+PAGINAS = {
+	1: [[('1111-1111', 'Revista de Computacao', 'A1'), ('2222-2222', 'Journal of Algorithms', 'B1')],
+	    [('3333-3333', 'Computacao Aplicada', 'B2')]],
+	2: [[('1111-1111', 'Revista de Computacao', 'B3'), ('4444-4444', 'Fisica Hoje', 'A2')]],
+	3: [[('5555-5555', 'Quimica Nova', 'A1')]],
+}
+
+
+def paginaDeResultados(linhas, maisPaginas):
+	html = '<html><body><table class="rich-table"><tbody>'
+	for (issn, titulo, estrato, area) in linhas:
+		html += '<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td></tr>' % (issn, titulo, estrato, area)
+	html += '</tbody></table>'
+	if maisPaginas:
+		html += "<span onclick=\"{'page': 'last'}\">&raquo;&raquo;</span>"
+	return html + '</body></html>'
+
+
+class WebQualisFalso(BaseHTTPServer.BaseHTTPRequestHandler):
+	# por requisição (area, pagina): quantas vezes responder com erro antes de acertar
+	falhas = {}
+	requisicoes = {}
+	trava = threading.Lock()
+
+	def log_message(self, *args):
+		pass
+
+	def responder(self, codigo, html='', cabecalhos={}):
+		self.send_response(codigo)
+		self.send_header('Content-Type', 'text/html')
+		self.send_header('Content-Length', str(len(html)))
+		for nome, valor in cabecalhos.items():
+			self.send_header(nome, valor)
+		self.end_headers()
+		self.wfile.write(html)
+
+	def do_GET(self):
+		if self.path.endswith('principal.seam'):
+			self.responder(200, '<html></html>', {'Set-Cookie': 'JSESSIONID=sessao%d; Path=/' % (id(self))})
+		else:
+			self.responder(200, '<html></html>')
+
+	def do_POST(self):
+		dados = urlparse.parse_qs(self.rfile.read(int(self.headers['Content-Length'])))
+		area = int(dados.get('consultaPublicaClassificacaoForm:somAreaAvaliacao', ['0'])[0])
+
+		if 'consultaPublicaClassificacaoForm:j_id192' in dados:
+			opcoes = ''.join('<option value="%d">%s</option>' % (codigo, nome) for codigo, nome in sorted(AREAS.items()))
+			self.responder(200, '<html><body><select>%s</select></body></html>' % (opcoes))
+		elif 'consultaPublicaClassificacaoForm:issn' in dados and 'consultaPublicaClassificacaoForm:btnPesquisarISSN' in dados:
+			issn = dados['consultaPublicaClassificacaoForm:issn'][0]
+			linhas = [(i, t, e, AREAS[a]) for a in PAGINAS for pagina in PAGINAS[a] for (i, t, e) in pagina if i == issn]
+			self.responder(200, paginaDeResultados(linhas, False))
+		elif 'consultaPublicaClassificacaoForm:scrollerArea' in dados:
+			pagina = int(dados['consultaPublicaClassificacaoForm:scrollerArea'][0])
+			with WebQualisFalso.trava:
+				WebQualisFalso.requisicoes[(area, pagina)] = WebQualisFalso.requisicoes.get((area, pagina), 0) + 1
+				falhar = WebQualisFalso.falhas.get((area, pagina), 0) >= WebQualisFalso.requisicoes[(area, pagina)]
+			if falhar:
+				self.responder(500, '<html>Erro interno</html>')
+			else:
+				linhas = [(i, t, e, AREAS[area]) for (i, t, e) in PAGINAS[area][pagina-1]]
+				self.responder(200, paginaDeResultados(linhas, pagina < len(PAGINAS[area])))
+		else:
+			self.responder(200, '<html></html>')
+
+
+class ServidorFalso(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+
+
+class TestExtracaoDoQualis(unittest.TestCase):
+
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.backoff = extrator.BACKOFF_BASE
+		extrator.BACKOFF_BASE = 0.01
+		WebQualisFalso.falhas = {}
+		WebQualisFalso.requisicoes = {}
+		self.servidor = ServidorFalso(('127.0.0.1', 0), WebQualisFalso)
+		threading.Thread(target=self.servidor.serve_forever).start()
+		self.urlBase = 'http://127.0.0.1:%d/webqualis/' % (self.servidor.server_address[1])
+
+	def tearDown(self):
+		self.servidor.shutdown()
+		self.servidor.server_close()
+		extrator.BACKOFF_BASE = self.backoff
+		shutil.rmtree(self.dir)
+
+	def extrair(self, areas):
+		qualis = extrator.qualis_extractor(0, os.path.join(self.dir, 'qualis.sqlite'), self.urlBase)
+		qualis.load_data()
+		qualis.areas_to_extract = areas
+		qualis.extract_qualis(workers=2)
+		qualis.save_data()
+		return qualis
+
+	def testAreasSaoGravadasNaBase(self):
+		WebQualisFalso.falhas = {(1, 2): 1} # a segunda página da área 1 falha uma vez
+		qualis = self.extrair([1, 2])
+
+		self.assertEqual(WebQualisFalso.requisicoes[(1, 1)], 1)
+		self.assertEqual(WebQualisFalso.requisicoes[(1, 2)], 2)
+		self.assertEqual(qualis.get_publicacoes(), {
+			'Revista de Computacao': {'CIENCIA DA COMPUTACAO': 'A1', 'FISICA': 'B3'},
+			'Journal of Algorithms': {'CIENCIA DA COMPUTACAO': 'B1'},
+			'Computacao Aplicada': {'CIENCIA DA COMPUTACAO': 'B2'},
+			'Fisica Hoje': {'FISICA': 'A2'}})
+		self.assertEqual(qualis.store.get_by_issn('1111-1111'), {'CIENCIA DA COMPUTACAO': 'A1', 'FISICA': 'B3'})
+		self.assertEqual(qualis.store.get_by_title(' journal of algorithms '), {'CIENCIA DA COMPUTACAO': 'B1'})
+
+		areas, ultimaAtualizacao = qualis.store.get_areas()
+		self.assertEqual(areas, sorted(AREAS.items()))
+		self.assertEqual(sorted(ultimaAtualizacao.keys()), [1, 2])
+
+	def testAreasAtualizadasNaoSaoExtraidasNovamente(self):
+		self.extrair([1, 2])
+		requisicoes = dict(WebQualisFalso.requisicoes)
+		self.extrair([1, 2])
+		self.assertEqual(WebQualisFalso.requisicoes, requisicoes)
+
+	def testAreaComErroNaoEhMarcadaComoAtualizada(self):
+		WebQualisFalso.falhas = {(3, 1): extrator.MAX_TRIES} # a área 3 falha em todas as tentativas
+		qualis = self.extrair([2, 3])
+
+		self.assertEqual(WebQualisFalso.requisicoes[(3, 1)], extrator.MAX_TRIES)
+		self.assertEqual(qualis.store.get_by_issn('5555-5555'), None)
+		self.assertEqual(qualis.store.get_by_issn('4444-4444'), {'FISICA': 'A2'})
+		self.assertEqual(sorted(qualis.store.get_areas()[1].keys()), [2])
+
+	def testConsultaDeISSNs(self):
+		qualis = extrator.qualis_extractor(1, os.path.join(self.dir, 'qualis.sqlite'), self.urlBase)
+		qualis.resolve_issns(['4444-4444', '5555-5555', '9999-9999'], workers=2)
+
+		self.assertEqual(qualis.store.get_by_issn('4444-4444'), {'FISICA': 'A2'})
+		self.assertEqual(qualis.store.get_by_issn('5555-5555'), {'QUIMICA': 'A1'})
+		self.assertEqual(qualis.issns_not_found, set(['9999-9999']))
+
+	def testISSNDesatualizadoNaoEncontradoNoSite(self):
+		qualis = extrator.qualis_extractor(1, os.path.join(self.dir, 'qualis.sqlite'), self.urlBase)
+		qualis.store.upsert([('8888-8888', 'Revista Antiga', 'FISICA', 'B1')], qualis.dtnow - datetime.timedelta(days=qualis.update_time+1))
+		qualis.resolve_issns(['8888-8888'], workers=1)
+
+		# com ou sem a consulta em lote, a classificação armazenada é devolvida
+		self.assertEqual(qualis.issns_not_found, set(['8888-8888']))
+		self.assertEqual(qualis.get_qualis_by_issn('8888-8888'), {'FISICA': 'B1'})
+		self.assertEqual(qualis.session, None)
+
+
+if __name__ == '__main__':
+	unittest.main()